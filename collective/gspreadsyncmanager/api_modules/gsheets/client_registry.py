@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Global dependencies
+import json
+import hashlib
+import threading
+
+# Google spreadsheet dependencies
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+from httplib2 import Http
+
+# API
+from apiclient import discovery
+
+# Sync metrics
+from collective.gspreadsyncmanager.metrics import create_response_hook
+
+#
+# Process-wide registry of authenticated API clients.
+# Clients are keyed by a hash of the authentication settings, so they are
+# only rebuilt when the key or the scopes change in the control panel.
+#
+_lock = threading.RLock()
+_json_keys = {}
+_credentials = {}
+_gspread_clients = {}
+
+# httplib2 connections cannot be shared between threads,
+# so Drive services are kept per thread
+_thread_local = threading.local()
+
+
+def get_settings_hash(api_settings):
+    settings = [api_settings.get('json_key', None), api_settings.get('scope', None)]
+    payload = json.dumps(settings, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def get_json_key(api_settings):
+    settings_hash = get_settings_hash(api_settings)
+    with _lock:
+        if settings_hash not in _json_keys:
+            _json_keys[settings_hash] = json.loads(api_settings['json_key'])
+        return _json_keys[settings_hash]
+
+def get_credentials(api_settings):
+    settings_hash = get_settings_hash(api_settings)
+    with _lock:
+        if settings_hash not in _credentials:
+            _credentials[settings_hash] = ServiceAccountCredentials.from_json_keyfile_dict(get_json_key(api_settings), api_settings['scope'])
+        return _credentials[settings_hash]
+
+def get_gspread_client(api_settings):
+    settings_hash = get_settings_hash(api_settings)
+    with _lock:
+        client = _gspread_clients.get(settings_hash, None)
+        if client is None:
+            client = gspread.authorize(get_credentials(api_settings))
+            # Counts the Sheets API calls and bytes of the client session
+            client.session.hooks['response'].append(create_response_hook("sheets"))
+            _gspread_clients[settings_hash] = client
+        else:
+            # Only refreshes the access token when it is expired
+            client.login()
+        return client
+
+def get_drive_service(api_settings):
+    settings_hash = get_settings_hash(api_settings)
+    drive_services = getattr(_thread_local, 'drive_services', None)
+    if drive_services is None:
+        drive_services = _thread_local.drive_services = {}
+
+    if settings_hash not in drive_services:
+        # The authorized http refreshes the access token when it expires
+        http = get_credentials(api_settings).authorize(Http())
+        drive_services[settings_hash] = discovery.build('drive', 'v3', http=http, cache_discovery=False)
+
+    return drive_services[settings_hash]
+
+def clear_clients():
+    with _lock:
+        _json_keys.clear()
+        _credentials.clear()
+        _gspread_clients.clear()
+    _thread_local.drive_services = {}
@@ -23,10 +23,17 @@ except ImportError:
 
 # Product dependencies
 from collective.gspreadsyncmanager.error_handling.error import raise_error
-from collective.gspreadsyncmanager.utils import clean_whitespaces, phonenumber_to_id
+from collective.gspreadsyncmanager.api_modules.gsheets.client_registry import get_json_key, get_credentials, get_gspread_client, get_drive_service
+from collective.gspreadsyncmanager.api_modules.gsheets.records import create_record_type, create_row_extractor
+from collective.gspreadsyncmanager.api_modules.gsheets.spreadsheet_cache import get_spreadsheet_cache, DEFAULT_TTL
+from collective.gspreadsyncmanager.api_modules.gsheets.sheet_reader import fetch_worksheet_values, iter_row_windows, FETCH_MODE_COLUMNS, DEFAULT_WINDOW_SIZE, DEFAULT_PARALLEL_WINDOWS
+from collective.gspreadsyncmanager.logging.logging import logger
+from collective.gspreadsyncmanager.metrics import time_phase, count_api_call
+from collective.gspreadsyncmanager.utils import clean_whitespaces, phonenumber_to_id, generate_row_fingerprint
 
 # Google spreadsheet dependencies
 import gspread
+from gspread.utils import extract_id_from_url
 
 # API
 from oauth2client.service_account import ServiceAccountCredentials
@@ -37,6 +44,7 @@ from apiclient.http import MediaFileUpload, MediaIoBaseDownload
 
 import os, io
 import json
+import threading
 
 class APIConnection(object):
 
@@ -65,56 +73,144 @@ class APIConnection(object):
         self.api_settings = api_settings
         self.worksheet_name = api_settings['worksheet_name']
         self.spreadsheet_url = api_settings['spreadsheet_url']
-        self.json_key = json.loads(api_settings['json_key'])
+        self.json_key = get_json_key(api_settings)
         self.scope = api_settings['scope']
+        self.fetch_mode = api_settings.get('fetch_mode', FETCH_MODE_COLUMNS)
+        self.streaming = api_settings.get('streaming', False)
+        self.window_size = api_settings.get('window_size', DEFAULT_WINDOW_SIZE)
+        self.parallel_windows = api_settings.get('parallel_windows', DEFAULT_PARALLEL_WINDOWS)
+
+        # Compiled once, returns the mapped values of a row in API_MAPPING order
+        self.extract_row = create_row_extractor(self.API_MAPPING)
 
         self.client = self.authenticate_api()
-        self.data = self.init_spreadsheet_data()
         self.drive = self.authenticate_drive_api()
 
+        self.spreadsheet_cache = get_spreadsheet_cache(ttl=api_settings.get('cache_ttl', DEFAULT_TTL), shared=api_settings.get('shared_cache', False))
+
+        # In streaming mode the spreadsheet is only loaded when a single row is requested
+        self.data = None if self.streaming else self.init_spreadsheet_data()
+
+        # Authorized http connections per thread, used by parallel downloads
+        self.thread_local = threading.local()
 
     def init_spreadsheet_data(self):
+        # Cached data is used while the spreadsheet revision is unchanged
+        cache_key = self.get_cache_key()
+        revision = self.get_spreadsheet_revision()
+
+        data = self.spreadsheet_cache.get(cache_key, revision)
+        if data is not None:
+            return data
 
         spreadsheet = self.client.open_by_url(self.spreadsheet_url)
-        worksheet = spreadsheet.worksheet(self.worksheet_name)
 
-        raw_data = worksheet.get_all_values()
-        data = self.transform_data(raw_data)
-        return data
+        # Only the columns in API_MAPPING are requested
+        raw_data = fetch_worksheet_values(spreadsheet, self.worksheet_name, self.API_MAPPING, self.fetch_mode)
+        with time_phase("transform"):
+            data = self.transform_data(raw_data)
+        return self.spreadsheet_cache.set(cache_key, data, revision)
+
+    def get_data(self):
+        if self.data is None:
+            self.data = self.init_spreadsheet_data()
+        return self.data
+
+    def get_cache_key(self):
+        return "%s:%s:%s" %(self.__class__.__module__, self.spreadsheet_url, self.worksheet_name)
+
+    def get_spreadsheet_revision(self):
+        # One cheap metadata request to Drive
+        try:
+            spreadsheet_id = extract_id_from_url(self.spreadsheet_url)
+            drive_data = self.get_drive_data(spreadsheet_id)
+            return "%s:%s" %(drive_data.get('version', ''), drive_data.get('modifiedTime', ''))
+        except Exception as err:
+            logger("[Warning] Revision of the spreadsheet cannot be requested. Spreadsheet data is not cached.", err)
+            return None
 
 
     def get_all_organizations(self):
         #
         # Request the organization list from the GoogleSheets API
         #
-        return self.data
+        return self.get_data()
+
+    def stream_all_organizations(self):
+        #
+        # Yields the organizations from the GoogleSheets API window by window,
+        # without loading the whole worksheet in memory
+        #
+        spreadsheet = self.client.open_by_url(self.spreadsheet_url)
+
+        header_rows = self.MINIMUM_SIZE
+        for rows in iter_row_windows(spreadsheet, self.worksheet_name, self.API_MAPPING, self.window_size, self.parallel_windows):
+            if header_rows:
+                skipped_rows = min(header_rows, len(rows))
+                rows = rows[skipped_rows:]
+                header_rows -= skipped_rows
+
+            with time_phase("transform"):
+                organization_records = [self.transform_row(row) for row in rows]
+
+            for organization_record in organization_records:
+                yield organization_record
 
     def get_organization_by_id(self, organization_id):
         # 
         # Gets an organization by ID 
         # 
 
-        if organization_id in self.data.keys():
-            return self.data[organization_id]
+        data = self.get_data()
+        if organization_id in data.keys():
+            return data[organization_id]
         else:
             raise_error('responseHandlingError', 'Organization is not found in the Spreadsheet. ID: %s' %(organization_id))
 
     # Authentication
     def authenticate_api(self): #TODO: needs validation and error handling
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.json_key, self.scope)
-        client = gspread.authorize(creds)
+        # Authenticated clients are reused until the settings change
+        client = get_gspread_client(self.api_settings)
         return client
 
     def authenticate_drive_api(self): #TODO: needs validation and error handling
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.json_key, self.scope)
-        http = creds.authorize(Http())
-        drive = discovery.build('drive', 'v3', http=http, cache_discovery=False)
+        drive = get_drive_service(self.api_settings)
         return drive
 
-    def download_media_by_id(self, media_id):
+    def get_thread_http(self):
+        # httplib2 connections cannot be shared between threads
+        http = getattr(self.thread_local, 'http', None)
+        if http is None:
+            http = get_credentials(self.api_settings).authorize(Http())
+            self.thread_local.http = http
+        return http
+
+    def get_drive_data(self, spreadsheet_id):
+        data = self.drive.files().get(fileId=spreadsheet_id, fields="modifiedTime,version").execute()
+        count_api_call("drive")
+        return data
+
+    def get_media_metadata(self, media_id, threaded=False):
+        # Checksum and modification time, used to revalidate cached images
+        if media_id:
+            try:
+                request = self.drive.files().get(fileId=media_id, fields="md5Checksum,modifiedTime")
+                count_api_call("drive")
+                if threaded:
+                    return request.execute(http=self.get_thread_http())
+                return request.execute()
+            except:
+                raise_error('responseHandlingError', 'Error while requesting the metadata of the image file with ID: %s' %(media_id))
+                return None
+        else:
+            return None
+
+    def download_media_by_id(self, media_id, threaded=False):
         if media_id:
             try:
                 request = self.drive.files().get_media(fileId=media_id)
+                if threaded:
+                    request.http = self.get_thread_http()
                 fh = io.BytesIO()
 
                 downloader = MediaIoBaseDownload(fh, request)
@@ -122,7 +218,9 @@ class APIConnection(object):
                 while done is False:
                     status, done = downloader.next_chunk()
                 fh.seek(0)
-                return fh.read()
+                media_data = fh.read()
+                count_api_call("drive", len(media_data))
+                return media_data
             except:
                 raise_error('responseHandlingError', 'Error download the image file with ID: %s' %(media_id))
                 return None
@@ -135,28 +233,20 @@ class APIConnection(object):
         if len(raw_data) > self.MINIMUM_SIZE:
             
             for row in raw_data[self.MINIMUM_SIZE:]:
-
-                new_organization = {}
-                for fieldname, sheet_position in self.API_MAPPING.items():
-                    new_organization[fieldname] = row[sheet_position]
-
-                google_ads_id = new_organization['google_ads_id']
-                new_organization["_id"] = google_ads_id
-                data[google_ads_id] = new_organization
+                new_organization = self.transform_row(row)
+                data[new_organization._id] = new_organization
 
         return data
 
+    def transform_row(self, row):
+        values = self.extract_row(row)
 
+        # The Google Ads ID is the ID of the organization
+        values += (values[GOOGLE_ADS_ID_INDEX],)
+        return OrganizationRecord._make(values + (generate_row_fingerprint(values, self.API_MAPPING),))
 
 
+# Compact record type of a spreadsheet row
+OrganizationRecord = create_record_type("OrganizationRecord", APIConnection.API_MAPPING, ('_id', '_fingerprint'), module=__name__)
 
-
-    
-
-
-
-
-
-
-    
-
+GOOGLE_ADS_ID_INDEX = OrganizationRecord._fields.index("google_ads_id")
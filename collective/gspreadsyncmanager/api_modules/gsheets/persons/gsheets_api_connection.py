@@ -21,10 +21,17 @@ except ImportError:
 
 # Product dependencies
 from collective.gspreadsyncmanager.error_handling.error import raise_error
-from collective.gspreadsyncmanager.utils import clean_whitespaces, phonenumber_to_id, generate_person_id, generate_safe_id
+from collective.gspreadsyncmanager.api_modules.gsheets.client_registry import get_json_key, get_credentials, get_gspread_client, get_drive_service
+from collective.gspreadsyncmanager.api_modules.gsheets.records import create_record_type, create_row_extractor
+from collective.gspreadsyncmanager.api_modules.gsheets.spreadsheet_cache import get_spreadsheet_cache, DEFAULT_TTL
+from collective.gspreadsyncmanager.api_modules.gsheets.sheet_reader import fetch_worksheet_values, iter_row_windows, FETCH_MODE_COLUMNS, DEFAULT_WINDOW_SIZE, DEFAULT_PARALLEL_WINDOWS
+from collective.gspreadsyncmanager.logging.logging import logger
+from collective.gspreadsyncmanager.metrics import time_phase, count_api_call
+from collective.gspreadsyncmanager.utils import clean_whitespaces, phonenumber_to_id, generate_person_id, generate_safe_id, generate_row_fingerprint
 
 # Google spreadsheet dependencies
 import gspread
+from gspread.utils import extract_id_from_url
 from oauth2client.service_account import ServiceAccountCredentials
 import json
 from httplib2 import Http
@@ -61,56 +68,111 @@ class APIConnection(object):
         self.api_settings = api_settings
         self.worksheet_name = api_settings['worksheet_name']
         self.spreadsheet_url = api_settings['spreadsheet_url']
-        self.json_key = json.loads(api_settings['json_key'])
+        self.json_key = get_json_key(api_settings)
         self.scope = api_settings['scope']
+        self.fetch_mode = api_settings.get('fetch_mode', FETCH_MODE_COLUMNS)
+        self.streaming = api_settings.get('streaming', False)
+        self.window_size = api_settings.get('window_size', DEFAULT_WINDOW_SIZE)
+        self.parallel_windows = api_settings.get('parallel_windows', DEFAULT_PARALLEL_WINDOWS)
+
+        # Compiled once, returns the mapped values of a row in API_MAPPING order
+        self.extract_row = create_row_extractor(self.API_MAPPING)
 
         self.client = self.authenticate_api()
-        #self.drive = self.authenticate_drive_api()
+        self.drive = self.authenticate_drive_api()
+
+        self.spreadsheet_cache = get_spreadsheet_cache(ttl=api_settings.get('cache_ttl', DEFAULT_TTL), shared=api_settings.get('shared_cache', False))
 
-        self.data = self.init_spreadsheet_data()
-        #self.drive_data = self.get_drive_data()
+        # In streaming mode the spreadsheet is only loaded when a single row is requested
+        self.data = None if self.streaming else self.init_spreadsheet_data()
 
     def init_spreadsheet_data(self):
+        # Cached data is used while the spreadsheet revision is unchanged
+        cache_key = self.get_cache_key()
+        revision = self.get_spreadsheet_revision()
+
+        data = self.spreadsheet_cache.get(cache_key, revision)
+        if data is not None:
+            return data
 
         spreadsheet = self.client.open_by_url(self.spreadsheet_url)
-        worksheet = spreadsheet.worksheet(self.worksheet_name)
 
-        raw_data = worksheet.get_all_values()
-        data = self.transform_data(raw_data)
-        return data
+        # Only the columns in API_MAPPING are requested
+        raw_data = fetch_worksheet_values(spreadsheet, self.worksheet_name, self.API_MAPPING, self.fetch_mode)
+        with time_phase("transform"):
+            data = self.transform_data(raw_data)
+        return self.spreadsheet_cache.set(cache_key, data, revision)
+
+    def get_data(self):
+        if self.data is None:
+            self.data = self.init_spreadsheet_data()
+        return self.data
+
+    def get_cache_key(self):
+        return "%s:%s:%s" %(self.__class__.__module__, self.spreadsheet_url, self.worksheet_name)
+
+    def get_spreadsheet_revision(self):
+        # One cheap metadata request to Drive
+        try:
+            spreadsheet_id = extract_id_from_url(self.spreadsheet_url)
+            drive_data = self.get_drive_data(spreadsheet_id)
+            return "%s:%s" %(drive_data.get('version', ''), drive_data.get('modifiedTime', ''))
+        except Exception as err:
+            logger("[Warning] Revision of the spreadsheet cannot be requested. Spreadsheet data is not cached.", err)
+            return None
 
 
     def get_all_persons(self):
         #
         # Request the person list from the GoogleSheets API
         #
-        return self.data
+        return self.get_data()
+
+    def stream_all_persons(self):
+        #
+        # Yields the persons from the GoogleSheets API window by window,
+        # without loading the whole worksheet in memory
+        #
+        spreadsheet = self.client.open_by_url(self.spreadsheet_url)
+
+        header_rows = self.MINIMUM_SIZE
+        for rows in iter_row_windows(spreadsheet, self.worksheet_name, self.API_MAPPING, self.window_size, self.parallel_windows):
+            if header_rows:
+                skipped_rows = min(header_rows, len(rows))
+                rows = rows[skipped_rows:]
+                header_rows -= skipped_rows
+
+            with time_phase("transform"):
+                person_records = [self.transform_row(row) for row in rows]
+
+            for person_record in person_records:
+                yield person_record
 
     def get_person_by_id(self, person_id):
         # 
         # Gets an person by ID 
         # 
 
-        if person_id in self.data.keys():
-            return self.data[person_id]
+        data = self.get_data()
+        if person_id in data.keys():
+            return data[person_id]
         else:
             raise_error('responseHandlingError', 'Person is not found in the Spreadsheet. ID: %s' %(person_id))
 
     # Authentication
-    """def authenticate_drive_api(self): #TODO: needs validation and error handling
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.json_key, self.scope)
-        http = creds.authorize(Http())
-        drive = discovery.build('drive', 'v3', http=http)
-        return drive"""
+    def authenticate_drive_api(self): #TODO: needs validation and error handling
+        drive = get_drive_service(self.api_settings)
+        return drive
 
     def authenticate_api(self): #TODO: needs validation and error handling
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.json_key, self.scope)
-        client = gspread.authorize(creds)
+        # Authenticated clients are reused until the settings change
+        client = get_gspread_client(self.api_settings)
         return client
 
-    """def get_drive_data(self):
-        data = drive.files().get(fileId="1yNy_9s_nJfnPh8hyb5c3rVApdLhE8k4sGqLPNvKmkQk", fields="name,modifiedTime")
-        return data"""
+    def get_drive_data(self, spreadsheet_id):
+        data = self.drive.files().get(fileId=spreadsheet_id, fields="modifiedTime,version").execute()
+        count_api_call("drive")
+        return data
 
     # Transformations 
     def transform_data(self, raw_data): #TODO: needs validation and error handling
@@ -118,20 +180,19 @@ class APIConnection(object):
         if len(raw_data) > self.MINIMUM_SIZE:
             
             for row in raw_data[self.MINIMUM_SIZE:]:
+                new_person = self.transform_row(row)
+                data[new_person._id] = new_person
 
-                new_person = {}
-                for fieldname, sheet_position in self.API_MAPPING.items():
-                    new_person[fieldname] = row[sheet_position]
-
-                email_address = self.generate_emailaddress(new_person["name"])
-                person_id = generate_person_id(new_person["fullname"])
+        return data
 
-                new_person['email'] = email_address
-                new_person['_id'] = person_id
+    def transform_row(self, row):
+        values = self.extract_row(row)
 
-                data[person_id] = new_person
+        email_address = self.generate_emailaddress(values[NAME_INDEX])
+        person_id = generate_person_id(values[FULLNAME_INDEX])
 
-        return data
+        values += (email_address, person_id)
+        return PersonRecord._make(values + (generate_row_fingerprint(values, self.API_MAPPING),))
 
     def generate_emailaddress(self, name):
         name = generate_safe_id(name)
@@ -140,16 +201,8 @@ class APIConnection(object):
         return emailaddress
 
 
+# Compact record type of a spreadsheet row
+PersonRecord = create_record_type("PersonRecord", APIConnection.API_MAPPING, ('email', '_id', '_fingerprint'), module=__name__)
 
-
-
-
-    
-
-
-
-
-
-
-    
-
+NAME_INDEX = PersonRecord._fields.index("name")
+FULLNAME_INDEX = PersonRecord._fields.index("fullname")
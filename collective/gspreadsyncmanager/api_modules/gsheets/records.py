@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Global dependencies
+from operator import itemgetter
+
+
+class Record(object):
+    #
+    # Compact, read-only record of a spreadsheet row.
+    # Values are stored in slots and keep mapping access, so the sync managers
+    # can keep using record['field'], record.get() and record.keys().
+    # Namedtuples cannot be used, as they reject fields like '_id'.
+    #
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self._fields, values):
+            object.__setattr__(self, field, value)
+
+    @classmethod
+    def _make(cls, values):
+        return cls(*values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Spreadsheet records are read-only")
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __reduce__(self):
+        return (self.__class__, self.values())
+
+    def __repr__(self):
+        return "%s(%s)" %(self.__class__.__name__, ", ".join("%s=%r" %(field, value) for field, value in self.items()))
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    def items(self):
+        return zip(self._fields, self.values())
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+def create_record_type(name, api_mapping, extra_fields=(), module=None):
+    # Record type with the mapped fields first, in API_MAPPING order.
+    # 'module' has to be the defining module so cached records can be pickled.
+    fields = tuple(api_mapping.keys()) + tuple(extra_fields)
+    record_type = type(name, (Record,), {'__slots__': fields, '_fields': fields})
+    if module:
+        record_type.__module__ = module
+    return record_type
+
+def create_row_extractor(api_mapping):
+    # Returns the mapped values of a row as a tuple, in API_MAPPING order
+    positions = list(api_mapping.values())
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda row: (row[position],)
+    return itemgetter(*positions)
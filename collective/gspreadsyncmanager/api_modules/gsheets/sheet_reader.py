@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Global dependencies
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Product dependencies
+from collective.gspreadsyncmanager.logging.logging import logger
+from collective.gspreadsyncmanager.metrics import time_phase
+
+FETCH_MODE_ALL = "all"
+FETCH_MODE_COLUMNS = "columns"
+
+DEFAULT_WINDOW_SIZE = 1000 # rows per request
+DEFAULT_PARALLEL_WINDOWS = 4 # requests at the same time, within the Sheets API quota
+
+
+def get_column_letter(column_index):
+    # Zero-based column index to A1 notation: 0 -> A, 26 -> AA
+    letters = ""
+    column_number = column_index + 1
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def get_column_ranges(api_mapping):
+    # Contiguous ranges of the mapped columns, as (first, last) indexes
+    columns = sorted(set(api_mapping.values()))
+    column_ranges = []
+    for column in columns:
+        if column_ranges and column == column_ranges[-1][1] + 1:
+            column_ranges[-1] = (column_ranges[-1][0], column)
+        else:
+            column_ranges.append((column, column))
+    return column_ranges
+
+def get_a1_range(worksheet_name, first_column, last_column, first_row=None, last_row=None):
+    sheet_name = worksheet_name.replace("'", "''")
+    first_cell = "%s%s" %(get_column_letter(first_column), first_row or "")
+    last_cell = "%s%s" %(get_column_letter(last_column), last_row or "")
+    return "'%s'!%s:%s" %(sheet_name, first_cell, last_cell)
+
+def build_rows(column_ranges, value_ranges):
+    # Rebuilds rows from column-major value ranges. Rows have the mapped
+    # values at their sheet positions and empty strings elsewhere.
+    columns = {}
+    for (first, last), value_range in zip(column_ranges, value_ranges):
+        for offset, column_values in enumerate(value_range.get('values', [])):
+            columns[first + offset] = column_values
+
+    row_count = max([len(column_values) for column_values in columns.values()] or [0])
+    row_size = column_ranges[-1][1] + 1 if column_ranges else 0
+
+    rows = []
+    for row_index in range(row_count):
+        row = [""] * row_size
+        for column, column_values in columns.items():
+            if row_index < len(column_values):
+                row[column] = column_values[row_index]
+        rows.append(row)
+
+    return rows
+
+def fetch_mapped_columns(spreadsheet, worksheet_name, api_mapping):
+    # Requests only the mapped columns in one column-major values:batchGet call
+    column_ranges = get_column_ranges(api_mapping)
+    return fetch_row_window(spreadsheet, worksheet_name, column_ranges)
+
+def fetch_row_window(spreadsheet, worksheet_name, column_ranges, first_row=None, last_row=None):
+    ranges = [get_a1_range(worksheet_name, first, last, first_row, last_row) for first, last in column_ranges]
+
+    with time_phase("sheet_fetch"):
+        response = spreadsheet.values_batch_get(ranges, params={'majorDimension': 'COLUMNS'})
+    return build_rows(column_ranges, response.get('valueRanges', []))
+
+def iter_row_windows(spreadsheet, worksheet_name, api_mapping, window_size=DEFAULT_WINDOW_SIZE, parallel_windows=DEFAULT_PARALLEL_WINDOWS):
+    #
+    # Yields the rows of the mapped columns window by window, in sheet order.
+    # Up to 'parallel_windows' windows are requested at the same time and
+    # only those windows are kept in memory.
+    #
+    column_ranges = get_column_ranges(api_mapping)
+    row_count = spreadsheet.worksheet(worksheet_name).row_count
+
+    windows = iter([(first_row, min(first_row + window_size - 1, row_count)) for first_row in range(1, row_count + 1, window_size)])
+
+    with ThreadPoolExecutor(max_workers=parallel_windows) as executor:
+        pending = deque()
+        for first_row, last_row in windows:
+            pending.append(executor.submit(fetch_row_window, spreadsheet, worksheet_name, column_ranges, first_row, last_row))
+            if len(pending) >= parallel_windows:
+                break
+
+        while pending:
+            rows = pending.popleft().result()
+
+            next_window = next(windows, None)
+            if next_window:
+                pending.append(executor.submit(fetch_row_window, spreadsheet, worksheet_name, column_ranges, next_window[0], next_window[1]))
+
+            yield rows
+
+def fetch_worksheet_values(spreadsheet, worksheet_name, api_mapping, fetch_mode=FETCH_MODE_COLUMNS):
+    if fetch_mode == FETCH_MODE_COLUMNS:
+        try:
+            return fetch_mapped_columns(spreadsheet, worksheet_name, api_mapping)
+        except Exception as err:
+            logger("[Warning] Mapped columns cannot be requested. Falling back to all worksheet values.", err)
+
+    with time_phase("sheet_fetch"):
+        worksheet = spreadsheet.worksheet(worksheet_name)
+        return worksheet.get_all_values()
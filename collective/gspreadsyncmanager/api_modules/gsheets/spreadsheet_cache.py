@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Global dependencies
+import time
+import threading
+
+# Plone dependencies
+from zope.component import queryUtility
+from zope.ramcache.interfaces.ram import IRAMCache
+
+# Product dependencies
+from collective.gspreadsyncmanager.logging.logging import logger
+
+CACHE_LOCATION = "collective.gspreadsyncmanager.spreadsheet_data"
+DEFAULT_TTL = 3600 # seconds
+
+
+class SpreadsheetCache(object):
+    #
+    # Cache of transformed spreadsheet data.
+    # Entries are stored with the revision of the spreadsheet in Drive and
+    # are only served while that revision is unchanged and the TTL has not
+    # expired. Without a known revision nothing is cached.
+    # With 'shared' the entries are stored in the Zope RAM cache utility
+    # instead of in this process only.
+    #
+    def __init__(self, ttl=DEFAULT_TTL, shared=False):
+        self.ttl = ttl
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, cache_key, revision):
+        if revision is None:
+            return None
+
+        entry = self.query(cache_key)
+        if not entry:
+            return None
+
+        if time.time() - entry['timestamp'] > self.ttl:
+            return None
+
+        if entry['revision'] != revision:
+            return None
+
+        return entry['data']
+
+    def set(self, cache_key, data, revision):
+        if revision is None:
+            return data
+
+        entry = {
+            'data': data,
+            'revision': revision,
+            'timestamp': time.time()
+        }
+
+        ram_cache = self.get_ram_cache()
+        if ram_cache is not None:
+            ram_cache.set(entry, CACHE_LOCATION, key={'cache_key': cache_key})
+        else:
+            with self.lock:
+                self.entries[cache_key] = entry
+
+        return data
+
+    def invalidate(self, cache_key=None):
+        ram_cache = self.get_ram_cache()
+        if ram_cache is not None:
+            ram_cache.invalidate(CACHE_LOCATION)
+
+        with self.lock:
+            if cache_key:
+                self.entries.pop(cache_key, None)
+            else:
+                self.entries.clear()
+
+    def query(self, cache_key):
+        ram_cache = self.get_ram_cache()
+        if ram_cache is not None:
+            return ram_cache.query(CACHE_LOCATION, key={'cache_key': cache_key}, default=None)
+
+        with self.lock:
+            return self.entries.get(cache_key, None)
+
+    def get_ram_cache(self):
+        if not self.shared:
+            return None
+
+        ram_cache = queryUtility(IRAMCache)
+        if ram_cache is None:
+            logger("[Warning] The shared RAM cache is not available. Spreadsheet data is cached in this process.", "RAM cache not found.")
+        return ram_cache
+
+
+_spreadsheet_caches = {}
+_spreadsheet_caches_lock = threading.Lock()
+
+def get_spreadsheet_cache(ttl=DEFAULT_TTL, shared=False):
+    # One cache per process and settings. The persons and organizations
+    # connections share it when their settings are the same.
+    cache_settings = (ttl, bool(shared))
+    with _spreadsheet_caches_lock:
+        if cache_settings not in _spreadsheet_caches:
+            _spreadsheet_caches[cache_settings] = SpreadsheetCache(ttl=ttl, shared=shared)
+        return _spreadsheet_caches[cache_settings]
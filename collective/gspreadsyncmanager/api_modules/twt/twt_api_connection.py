@@ -8,7 +8,6 @@
 
 # Global dependencies
 import re
-import requests
 import sys
 from datetime import datetime
 from .utils import DATE_FORMAT
@@ -21,6 +20,7 @@ except ImportError:
 
 # Product dependencies
 from .error import raise_error
+from collective.gspreadsyncmanager.http_sessions import get_session_pool
 
 
 # Global method
@@ -253,7 +253,7 @@ class APIConnection(object):
         try:
             url = self._format_request_data(endpoint_type, params)
 
-            response = requests.request(
+            response = get_session_pool().request(
                 http_method, url,
                 headers={
                     'Accept': 'application/json',
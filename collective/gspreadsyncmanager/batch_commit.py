@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+import time
+import transaction
+from ZODB.POSException import ConflictError
+
+# Logging module
+from .logging.logging import logger
+
+# Sync metrics
+from .metrics import time_phase
+
+
+class BatchCommitter(object):
+    #
+    # Groups the sync of several objects in one transaction.
+    # Every object runs inside its own savepoint, so a failing row only
+    # rolls back its own changes. When the commit of a batch conflicts,
+    # the batch is aborted and its operations are replayed.
+    #
+    DEFAULT_BATCH_SIZE = 1
+    DEFAULT_CONFLICT_RETRIES = 3
+    RETRY_DELAY = 0.5 # seconds, doubled on every retry
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, conflict_retries=DEFAULT_CONFLICT_RETRIES):
+        self.batch_size = max(int(batch_size or self.DEFAULT_BATCH_SIZE), 1)
+        self.conflict_retries = conflict_retries
+        self.operations = []
+        self.running = False
+
+    def is_running(self):
+        return self.running
+
+    def run(self, operation, *args, **kwargs):
+        result = self.add(operation, *args, **kwargs)
+
+        if self.is_full():
+            self.commit()
+
+        return result
+
+    def add(self, operation, *args, **kwargs):
+        # Runs the operation in its own savepoint and adds it to the batch,
+        # the caller commits the batch when it is full
+        result = self._run_in_savepoint(operation, args, kwargs)
+        self.operations.append((operation, args, kwargs))
+        return result
+
+    def is_full(self):
+        return len(self.operations) >= self.batch_size
+
+    def commit(self):
+        # Returns the (committed, failed) operations of the batch.
+        # Operations that fail when they are replayed and batches that
+        # still conflict after the retries are failed. Other errors of the
+        # commit abort the batch and are raised.
+        attempt = 0
+        failed = []
+        while True:
+            try:
+                with time_phase("commit"):
+                    transaction.get().commit()
+                committed, self.operations = self.operations, []
+                return committed, failed
+            except ConflictError as err:
+                transaction.abort()
+
+                if attempt >= self.conflict_retries:
+                    logger("[Error] Batch of %s objects is not committed after %s retries." %(len(self.operations), attempt), err)
+                    failed, self.operations = failed + self.operations, []
+                    return [], failed
+
+                attempt += 1
+                logger("[Warning] Conflict while committing a batch of %s objects. Retry %s." %(len(self.operations), attempt), err)
+                time.sleep(self.RETRY_DELAY * (2 ** (attempt - 1)))
+                failed.extend(self.replay())
+            except Exception as err:
+                transaction.abort()
+                logger("[Error] Batch of %s objects is not committed." %(len(self.operations)), err)
+                self.operations = []
+                raise
+
+    def replay(self):
+        # Returns the operations that fail again
+        operations = self.operations
+        self.operations = []
+        failed = []
+
+        for operation, args, kwargs in operations:
+            try:
+                self._run_in_savepoint(operation, args, kwargs)
+                self.operations.append((operation, args, kwargs))
+            except Exception as err:
+                logger("[Error] Error while replaying a sync operation after a conflict.", err)
+                failed.append((operation, args, kwargs))
+
+        return failed
+
+    def _run_in_savepoint(self, operation, args, kwargs):
+        savepoint = transaction.savepoint(optimistic=True)
+        self.running = True
+        try:
+            return operation(*args, **kwargs)
+        except Exception:
+            savepoint.rollback()
+            raise
+        finally:
+            self.running = False
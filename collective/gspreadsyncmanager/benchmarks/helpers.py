@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Micro-benchmarks of the helpers that run once or more per spreadsheet row,
+# on unicode names. The cost of a call is measured relative to a plain
+# Python reference call in the same round, so the baseline that is
+# committed in this package holds on other machines. The benchmarks run as
+# tests in tests/test_benchmark_helpers.py and fail when a helper is more
+# than GSPREADSYNC_BENCHMARK_THRESHOLD percent (default 50) slower than the
+# baseline. Timings of calls this cheap vary by a few tens of percent
+# between runs, the default catches lost caches and algorithmic changes.
+# Run with --save after an intended change to update helpers_baseline.json.
+#
+# Usage: bin/instance run -m collective.gspreadsyncmanager.benchmarks.helpers [--save] [--threshold 50]
+#
+import os
+import sys
+import json
+import time
+import argparse
+
+from collective.gspreadsyncmanager.benchmarks.transform import generate_rows, get_api_connection, register_normalizer
+from collective.gspreadsyncmanager.utils import normalize_id, generate_person_id, generate_safe_id, clean_whitespaces, phonenumber_to_id, generate_row_fingerprint
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "helpers_baseline.json")
+DEFAULT_THRESHOLD = 50.0 # percent
+THRESHOLD_ENVIRONMENT_VARIABLE = "GSPREADSYNC_BENCHMARK_THRESHOLD"
+DEFAULT_ROUNDS = 5
+DEFAULT_NAMES = 10000
+TRANSFORM_ROWS = 1000
+
+NAMES = [
+    u"José María Fernández",
+    u"Zoë van der Berg",
+    u"Łukasz Żółkiewski",
+    u"Nguyễn Thị Minh Khai",
+    u"Søren Kierkegaard",
+    u"Antonín Dvořák",
+    u"Björk Guðmundsdóttir",
+    u"Siobhán O'Brien-Smith",
+    u"François d'Anjou",
+    u"Mehmet Öztürk",
+    u"Ørjan Ødegård",
+    u"Anaïs Lefèvre",
+    u"Chloé  Dubois ",
+    u"Σωκράτης Παπαδόπουλος",
+    u"Владимир Иванов"
+]
+
+
+def generate_names(count):
+    return [u"%s %s" %(NAMES[index % len(NAMES)], index) for index in range(count)]
+
+def generate_phone_numbers(count):
+    return [u"+31 6 %04d %04d" %(index // 10000, index % 10000) for index in range(count)]
+
+def clear_normalizer_caches():
+    generate_person_id.cache_clear()
+    generate_safe_id.cache_clear()
+
+
+def reference_call(name):
+    # Plain Python work on a name, the unit of the relative costs
+    return u"".join(character.lower() for character in name if not character.isspace())
+
+
+class HelperBenchmark(object):
+    #
+    # Calls 'function' once for every input and keeps the fastest of
+    # 'rounds' runs. 'setup' runs before every round, outside the timing.
+    # Every round also times the 'reference' benchmark, so that the
+    # relative cost is measured under the same load of the machine.
+    #
+    def __init__(self, name, function, inputs, setup=None):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.setup = setup
+
+    def time_round(self):
+        function = self.function
+        if self.setup:
+            self.setup()
+        start = time.perf_counter()
+        for value in self.inputs:
+            function(value)
+        return (time.perf_counter() - start) / len(self.inputs)
+
+    def run(self, rounds=DEFAULT_ROUNDS, reference=None):
+        best = None
+        relative_cost = None
+        for _ in range(rounds):
+            reference_cost = reference.time_round() if reference else None
+            cost = self.time_round()
+            best = cost if best is None else min(best, cost)
+            if reference_cost:
+                relative_cost = cost / reference_cost if relative_cost is None else min(relative_cost, cost / reference_cost)
+
+        return {
+            'calls': len(self.inputs),
+            'seconds_per_call': best,
+            'calls_per_second': 1.0 / best if best else 0.0,
+            'relative_cost': relative_cost
+        }
+
+
+def get_reference_benchmark(name_count=DEFAULT_NAMES):
+    return HelperBenchmark("reference", reference_call, generate_names(name_count))
+
+def get_benchmarks(name_count=DEFAULT_NAMES):
+    register_normalizer()
+
+    names = generate_names(name_count)
+    phone_numbers = generate_phone_numbers(name_count)
+    emails = [u"%s@intk.com" %(clean_whitespaces(name)) for name in names]
+    phone_pairs = list(zip(phone_numbers, emails))
+
+    api = get_api_connection()
+    rows = generate_rows(TRANSFORM_ROWS)
+    records = [api.transform_row(row) for row in rows[1:]]
+
+    return [
+        HelperBenchmark("normalize_id", normalize_id, names),
+        HelperBenchmark("generate_person_id (cold)", generate_person_id, names, setup=clear_normalizer_caches),
+        HelperBenchmark("generate_person_id (warm)", generate_person_id, names),
+        HelperBenchmark("generate_safe_id (cold)", generate_safe_id, names, setup=clear_normalizer_caches),
+        HelperBenchmark("clean_whitespaces", clean_whitespaces, names),
+        HelperBenchmark("phonenumber_to_id", lambda pair: phonenumber_to_id(*pair), phone_pairs),
+        HelperBenchmark("generate_emailaddress (cold)", api.generate_emailaddress, names, setup=clear_normalizer_caches),
+        HelperBenchmark("generate_row_fingerprint", lambda record: generate_row_fingerprint(record.values()[:-1], api.API_MAPPING), records),
+        # One call transforms TRANSFORM_ROWS rows
+        HelperBenchmark("transform_data (%s rows)" %(TRANSFORM_ROWS), api.transform_data, [rows], setup=clear_normalizer_caches)
+    ]
+
+def get_threshold():
+    # Allowed slowdown in percent, GSPREADSYNC_BENCHMARK_THRESHOLD overrides the default
+    try:
+        return float(os.environ.get(THRESHOLD_ENVIRONMENT_VARIABLE, DEFAULT_THRESHOLD))
+    except ValueError:
+        return DEFAULT_THRESHOLD
+
+def run_benchmarks(rounds=DEFAULT_ROUNDS, name_count=DEFAULT_NAMES):
+    # Results by benchmark name, with the cost of a call relative to a reference call
+    reference = get_reference_benchmark(name_count)
+    return dict((benchmark.name, benchmark.run(rounds, reference)) for benchmark in get_benchmarks(name_count))
+
+def load_baseline(path=DEFAULT_BASELINE):
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    # Only the relative costs hold on other machines
+    baseline = dict((name, {'relative_cost': round(result['relative_cost'], 4)}) for name, result in results.items())
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+def get_slowdown(result, baseline_result):
+    # Percent by which the relative cost grew since the baseline, None without a baseline
+    if not baseline_result or not baseline_result.get('relative_cost', None):
+        return None
+    return (result['relative_cost'] / baseline_result['relative_cost'] - 1) * 100
+
+def compare(results, baseline, threshold):
+    # Names of the helpers that are more than 'threshold' percent slower
+    regressions = []
+    for name, result in sorted(results.items()):
+        slowdown = get_slowdown(result, (baseline or {}).get(name, None))
+        if slowdown is None:
+            print("%-36s %12.0f calls/s %8.2fx" %(name, result['calls_per_second'], result['relative_cost']))
+            continue
+
+        regression = slowdown > threshold
+        print("%-36s %12.0f calls/s %8.2fx %+8.1f%% %s" %(name, result['calls_per_second'], result['relative_cost'], slowdown, "REGRESSION" if regression else ""))
+        if regression:
+            regressions.append(name)
+
+    return regressions
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the per-row helpers.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON file of the baseline results")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=get_threshold(), help="Allowed slowdown in percent")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Runs per helper, the fastest is kept")
+    parser.add_argument("--names", type=int, default=DEFAULT_NAMES, help="Names per round")
+    return parser.parse_args(arguments)
+
+def run(arguments=()):
+    # Returns the exit code: 1 when a helper regressed
+    options = parse_arguments(list(arguments))
+    results = run_benchmarks(options.rounds, options.names)
+
+    baseline = None if options.save else load_baseline(options.baseline)
+    regressions = compare(results, baseline, options.threshold)
+
+    if options.save:
+        save_baseline(results, options.baseline)
+        print("Baseline is saved in %s" %(options.baseline))
+        return 0
+
+    if baseline is None:
+        print("No baseline found in %s. Run with --save to create it." %(options.baseline))
+        return 0
+
+    if regressions:
+        print("%s helpers are more than %s%% slower than the baseline: %s" %(len(regressions), options.threshold, ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# End-to-end throughput of the full syncs on synthetic spreadsheets.
+# Runs on the functional test layer of collective.gspreadsyncmanager.testing,
+# which has its own person and organization types and folders. The Sheets
+# API, Drive and the image downloads are served by fakes.
+#
+# Every size runs an initial sync, which creates all rows, and a second sync
+# after 'change_ratio' of the rows changed. Wall time, catalog queries and
+# the bytes written to the ZODB are reported for both, and saved as JSON
+# when GSPREADSYNC_BENCHMARK_DIRECTORY is set.
+#
+# Usage: GSPREADSYNC_BENCHMARK_SIZES=1000,10000 zope-testrunner --test-path . -t test_benchmark_sync
+#
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import base64
+import shutil
+import resource
+import tempfile
+from contextlib import contextmanager
+
+from Products.CMFPlone.CatalogTool import CatalogTool
+
+from collective.gspreadsyncmanager.api_modules.gsheets.persons.gsheets_api_connection import APIConnection as APIConnectionPersons
+from collective.gspreadsyncmanager.api_modules.gsheets.organizations.gsheets_api_connection import APIConnection as APIConnectionOrganizations
+from collective.gspreadsyncmanager.image_cache import ImageCache
+from collective.gspreadsyncmanager.metrics import get_metrics, count_api_call
+from collective.gspreadsyncmanager.sync_manager_persons import SyncManager as SyncManagerPersons
+from collective.gspreadsyncmanager.sync_manager_organizations import SyncManager as SyncManagerOrganizations
+from collective.gspreadsyncmanager.mapping_cores.gsheets.mapping_core import CORE as SYNC_CORE
+from collective.gspreadsyncmanager.mapping_cores.gsheets.mapping_core import CORE_ORGANIZATIONS as SYNC_CORE_ORGANIZATIONS
+from collective.gspreadsyncmanager.sync_jobs import FULL_SYNC_BATCH_SIZE
+
+DEFAULT_SIZES = (100,)
+DEFAULT_CHANGE_RATIO = 0.1
+DEFAULT_IMAGE_RATIO = 0.2
+
+# Row counts, separated by commas, and the directory of the JSON results
+SIZES_ENVIRONMENT_VARIABLE = "GSPREADSYNC_BENCHMARK_SIZES"
+DIRECTORY_ENVIRONMENT_VARIABLE = "GSPREADSYNC_BENCHMARK_DIRECTORY"
+
+SYNC_PERSONS = "persons"
+SYNC_ORGANIZATIONS = "organizations"
+
+# 1x1 PNG served for every synthetic picture
+IMAGE_DATA = base64.b64decode(b'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC')
+IMAGE_URL_TEMPLATE = "https://drive.google.com/open?id=benchmark-image-%s"
+
+A1_CELL = re.compile(r"^([A-Z]+)(\d*)$")
+
+
+#
+# Synthetic spreadsheets
+#
+def generate_person_row(row_number, with_image):
+    row = [""] * 28
+    row[0] = "colleague%s" %(row_number)
+    row[1] = "2020-01-01"
+    row[12] = "intern" if row_number % 10 == 0 else "colleague"
+    row[14] = "Market A, Market B"
+    row[15] = "Mentor %s" %(row_number % 50)
+    row[16] = "Team %s" %(row_number % 20)
+    row[20] = "Colleague %s Benchmark" %(row_number)
+    row[26] = "+31 6 %08d" %(row_number)
+    row[27] = IMAGE_URL_TEMPLATE %(row_number) if with_image else ""
+    return row
+
+def generate_organization_row(row_number, with_image):
+    row = [""] * 10
+    row[0] = "Organization %s Benchmark" %(row_number)
+    row[1] = "%s" %(1000000 + row_number)
+    row[3] = IMAGE_URL_TEMPLATE %(row_number) if with_image else ""
+    row[6] = "museum" if row_number % 2 else "theatre"
+    row[8] = "Netherlands, Belgium"
+    row[9] = "en"
+    return row
+
+# Column changed by a row update, per sync type
+CHANGED_COLUMNS = {
+    SYNC_PERSONS: 26,
+    SYNC_ORGANIZATIONS: 6
+}
+
+ROW_GENERATORS = {
+    SYNC_PERSONS: generate_person_row,
+    SYNC_ORGANIZATIONS: generate_organization_row
+}
+
+
+class SyntheticSheet(object):
+    #
+    # Header row and 'row_count' generated rows. Every 'image_ratio' of the
+    # rows has a picture. The revision is increased when rows change, so the
+    # spreadsheet cache is not used for changed data.
+    #
+    def __init__(self, sync_type, row_count, image_ratio=DEFAULT_IMAGE_RATIO):
+        self.sync_type = sync_type
+        self.url = "https://docs.google.com/spreadsheets/d/benchmark-%s-%s/edit" %(sync_type, uuid.uuid4().hex)
+        self.revision = 1
+
+        generate_row = ROW_GENERATORS[sync_type]
+        image_interval = int(1 / image_ratio) if image_ratio else 0
+        header = ["column %s" %(column) for column in range(len(generate_row(0, False)))]
+        self.rows = [header] + [generate_row(row_number, bool(image_interval) and row_number % image_interval == 0) for row_number in range(row_count)]
+
+    def change_rows(self, change_ratio):
+        if not change_ratio:
+            return 0
+
+        column = CHANGED_COLUMNS[self.sync_type]
+        interval = max(int(1 / change_ratio), 1)
+        changed_rows = self.rows[1::interval]
+        for row in changed_rows:
+            row[column] = "%s changed" %(row[column])
+
+        self.revision += 1
+        return len(changed_rows)
+
+
+#
+# Fake Sheets API client
+#
+def get_column_index(letters):
+    column_number = 0
+    for letter in letters:
+        column_number = column_number * 26 + ord(letter) - 64
+    return column_number - 1
+
+def parse_a1_range(a1_range):
+    # "'Sheet'!A2:C100" -> (first column, last column, first row, last row)
+    first_cell, last_cell = a1_range.rsplit("!", 1)[1].split(":")
+    first_column, first_row = A1_CELL.match(first_cell).groups()
+    last_column, last_row = A1_CELL.match(last_cell).groups()
+    return (get_column_index(first_column), get_column_index(last_column), int(first_row) if first_row else None, int(last_row) if last_row else None)
+
+
+class FakeWorksheet(object):
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.row_count = len(sheet.rows)
+
+    def get_all_values(self):
+        count_api_call("sheets")
+        return [list(row) for row in self.sheet.rows]
+
+
+class FakeSpreadsheet(object):
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def worksheet(self, worksheet_name):
+        return FakeWorksheet(self.sheet)
+
+    def values_batch_get(self, ranges, params=None):
+        # Column-major values, like majorDimension=COLUMNS
+        count_api_call("sheets")
+        value_ranges = []
+        for a1_range in ranges:
+            first_column, last_column, first_row, last_row = parse_a1_range(a1_range)
+            rows = self.sheet.rows[(first_row or 1) - 1:last_row]
+            value_ranges.append({'values': [[row[column] for row in rows] for column in range(first_column, last_column + 1)]})
+        return {'valueRanges': value_ranges}
+
+
+class FakeGspreadClient(object):
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def open_by_url(self, url):
+        return FakeSpreadsheet(self.sheet)
+
+    def login(self):
+        return None
+
+
+class FakeResponse(object):
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.headers = {'content-type': 'image/png'}
+
+
+class FakeImageSession(object):
+    # Serves the person pictures instead of the Drive download URL
+
+    def get(self, url, **kwargs):
+        count_api_call("http", len(IMAGE_DATA))
+        return FakeResponse(IMAGE_DATA)
+
+
+#
+# API connections on the fakes
+#
+def get_api_settings(sheet):
+    return {
+        'scope': [],
+        'json_key': '{}',
+        'spreadsheet_url': sheet.url,
+        'worksheet_name': "benchmark"
+    }
+
+
+class BenchmarkPersonsAPI(APIConnectionPersons):
+
+    def __init__(self, sheet, api_settings):
+        self.sheet = sheet
+        APIConnectionPersons.__init__(self, api_settings)
+
+    def authenticate_api(self):
+        return FakeGspreadClient(self.sheet)
+
+    def authenticate_drive_api(self):
+        return None
+
+    def get_drive_data(self, spreadsheet_id):
+        count_api_call("drive")
+        return {'version': self.sheet.revision, 'modifiedTime': ""}
+
+
+class BenchmarkOrganizationsAPI(APIConnectionOrganizations):
+
+    def __init__(self, sheet, api_settings):
+        self.sheet = sheet
+        APIConnectionOrganizations.__init__(self, api_settings)
+
+    def authenticate_api(self):
+        return FakeGspreadClient(self.sheet)
+
+    def authenticate_drive_api(self):
+        return None
+
+    def get_drive_data(self, spreadsheet_id):
+        count_api_call("drive")
+        return {'version': self.sheet.revision, 'modifiedTime': ""}
+
+    def get_media_metadata(self, media_id, threaded=False):
+        count_api_call("drive")
+        return {'md5Checksum': "benchmark", 'modifiedTime': ""}
+
+    def download_media_by_id(self, media_id, threaded=False):
+        count_api_call("drive", len(IMAGE_DATA))
+        return IMAGE_DATA
+
+
+def get_sync_manager(sync_type, sheet, image_cache, batch_size=FULL_SYNC_BATCH_SIZE, streaming=False):
+    sync_options = {
+        'image_cache': image_cache,
+        'batch_size': batch_size
+    }
+
+    if sync_type == SYNC_PERSONS:
+        api_connection = BenchmarkPersonsAPI(sheet, dict(get_api_settings(sheet), streaming=streaming))
+        sync_options.update({'api': api_connection, 'core': SYNC_CORE, 'http_session': FakeImageSession()})
+        return SyncManagerPersons(sync_options)
+
+    api_connection = BenchmarkOrganizationsAPI(sheet, dict(get_api_settings(sheet), streaming=streaming))
+    sync_options.update({'api': api_connection, 'core': SYNC_CORE_ORGANIZATIONS})
+    return SyncManagerOrganizations(sync_options)
+
+def run_sync(sync_type, sync_manager):
+    if sync_type == SYNC_PERSONS:
+        return sync_manager.update_persons(create_and_unpublish=True)
+    return sync_manager.update_organizations(create_and_unpublish=True)
+
+
+#
+# Measurements
+#
+@contextmanager
+def count_catalog_queries():
+    # Counts the catalog searches of the sync, including plone.api.content.find
+    counts = {'queries': 0}
+    originals = dict((name, CatalogTool.__dict__[name]) for name in ('searchResults', '__call__'))
+
+    def create_counter(original):
+        def count_query(self, *args, **kwargs):
+            counts['queries'] += 1
+            return original(self, *args, **kwargs)
+        return count_query
+
+    for name, original in originals.items():
+        setattr(CatalogTool, name, create_counter(original))
+    try:
+        yield counts
+    finally:
+        for name, original in originals.items():
+            setattr(CatalogTool, name, original)
+
+def get_bytes_written(storage):
+    # Size of the records written to the DemoStorage changes
+    bytes_written = 0
+    for transaction_record in storage.changes.iterator():
+        for data_record in transaction_record:
+            bytes_written += len(data_record.data or b"")
+    return bytes_written
+
+def get_peak_rss():
+    # Peak resident memory of the process in bytes (kilobytes on Linux)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+def measure_sync(sync_type, sync_manager, storage, row_count):
+    metrics = get_metrics()
+    metrics.reset()
+    bytes_before = get_bytes_written(storage)
+
+    with count_catalog_queries() as catalog_counts:
+        start = time.time()
+        run_sync(sync_type, sync_manager)
+        duration = time.time() - start
+
+    summary = metrics.get_summary()
+    progress = sync_manager.progress.to_dict()
+
+    return {
+        'rows': row_count,
+        'duration': duration,
+        'rows_per_second': row_count / duration if duration else 0.0,
+        'commits': summary['phases'].get('commit', {}).get('count', 0),
+        'catalog_queries': catalog_counts['queries'],
+        'peak_rss': get_peak_rss(),
+        'zodb_bytes_written': get_bytes_written(storage) - bytes_before,
+        'created': progress['created'],
+        'updated': progress['updated'],
+        'skipped': progress['skipped'],
+        'failed': progress['failed'],
+        'phases': summary['phases'],
+        'api_calls': summary['api_calls'],
+        'api_bytes': summary['api_bytes']
+    }
+
+
+#
+# Scenarios
+#
+def get_sizes():
+    sizes = os.environ.get(SIZES_ENVIRONMENT_VARIABLE, "")
+    return [int(size) for size in sizes.split(",") if size.strip()] or list(DEFAULT_SIZES)
+
+def run_scenario(portal, sync_type, row_count, change_ratio=DEFAULT_CHANGE_RATIO, image_ratio=DEFAULT_IMAGE_RATIO, batch_size=FULL_SYNC_BATCH_SIZE, streaming=False):
+    # Both syncs write to the DemoStorage of the test layer
+    storage = portal._p_jar.db().storage
+    sheet = SyntheticSheet(sync_type, row_count, image_ratio)
+    image_directory = tempfile.mkdtemp(prefix="gspreadsync-benchmark-")
+    try:
+        image_cache = ImageCache(directory=image_directory)
+
+        initial = measure_sync(sync_type, get_sync_manager(sync_type, sheet, image_cache, batch_size, streaming), storage, row_count)
+        print_result(sync_type, "initial", initial)
+
+        changed_rows = sheet.change_rows(change_ratio)
+        changed = measure_sync(sync_type, get_sync_manager(sync_type, sheet, image_cache, batch_size, streaming), storage, row_count)
+        changed['changed_rows'] = changed_rows
+        print_result(sync_type, "changed", changed)
+    finally:
+        shutil.rmtree(image_directory, ignore_errors=True)
+
+    return {
+        'sync_type': sync_type,
+        'rows': row_count,
+        'change_ratio': change_ratio,
+        'image_ratio': image_ratio,
+        'batch_size': batch_size,
+        'streaming': streaming,
+        'initial': initial,
+        'changed': changed
+    }
+
+def print_result(sync_type, run_name, result):
+    print("%-14s %-8s %8s rows %8.2fs %9.0f rows/s %6s commits %8s queries %8.1f MB written %8.1f MB peak RSS" %(
+        sync_type, run_name, result['rows'], result['duration'], result['rows_per_second'], result['commits'],
+        result['catalog_queries'], result['zodb_bytes_written'] / 1048576.0, result['peak_rss'] / 1048576.0))
+
+def save_results(sync_type, scenarios):
+    # Returns the path of the JSON results, if a directory is set
+    directory = os.environ.get(DIRECTORY_ENVIRONMENT_VARIABLE, None)
+    if not directory:
+        return None
+
+    path = os.path.join(directory, "gspreadsync-benchmark-%s.json" %(sync_type))
+    with open(path, 'w') as output_file:
+        json.dump({'started': time.time(), 'scenarios': scenarios}, output_file, indent=2, sort_keys=True)
+    return path
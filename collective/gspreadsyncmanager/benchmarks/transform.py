@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Transform throughput of the persons spreadsheet rows.
+# Compares the previous dict based transform with the compiled extractor,
+# record type and memoized normalizers, on synthetic rows.
+#
+# Usage: bin/instance run -m collective.gspreadsyncmanager.benchmarks.transform [rows]
+#
+import sys
+import time
+
+from zope.component import provideUtility, queryUtility
+from plone.i18n.normalizer import idnormalizer
+from plone.i18n.normalizer.interfaces import IIDNormalizer
+
+from collective.gspreadsyncmanager.api_modules.gsheets.persons.gsheets_api_connection import APIConnection
+from collective.gspreadsyncmanager.api_modules.gsheets.records import create_row_extractor
+from collective.gspreadsyncmanager.utils import clean_whitespaces, generate_person_id, generate_safe_id, generate_row_fingerprint
+
+DEFAULT_ROWS = 100000
+ROW_SIZE = 28
+
+
+def generate_rows(row_count):
+    header = ["column %s" %(column) for column in range(ROW_SIZE)]
+    rows = [header]
+    for row_number in range(row_count):
+        row = ["value %s-%s" %(row_number, column) for column in range(ROW_SIZE)]
+        row[0] = "colleague%s" %(row_number)
+        row[20] = "Colleague Name %s" %(row_number)
+        rows.append(row)
+    return rows
+
+def get_api_connection():
+    # Only the transformation is used, so nothing is authenticated or requested
+    api = APIConnection.__new__(APIConnection)
+    api.extract_row = create_row_extractor(APIConnection.API_MAPPING)
+    return api
+
+def legacy_transform_data(api, raw_data):
+    # The dict based transform, with a normalizer lookup for every ID
+    normalize = lambda text: "%s" % queryUtility(IIDNormalizer).normalize(text)
+
+    data = {}
+    for row in raw_data[api.MINIMUM_SIZE:]:
+        new_person = {}
+        for fieldname, sheet_position in api.API_MAPPING.items():
+            new_person[fieldname] = row[sheet_position]
+
+        email_address = "%s%s" %(clean_whitespaces(normalize(new_person["name"])), api.EMAIL_ADDRESS_DOMAIN)
+        person_id = normalize(new_person["fullname"])
+
+        new_person['email'] = email_address
+        new_person['_id'] = person_id
+        new_person['_fingerprint'] = generate_row_fingerprint(new_person, api.API_MAPPING)
+        data[person_id] = new_person
+
+    return data
+
+def measure(name, transform, raw_data):
+    start = time.time()
+    data = transform(raw_data)
+    duration = time.time() - start
+
+    row_count = len(raw_data) - 1
+    print("%-32s %8.2fs %10.0f rows/s %8s records" %(name, duration, row_count / duration, len(data)))
+    return duration
+
+def register_normalizer():
+    # Outside a site the ID normalizer utility is not registered
+    if queryUtility(IIDNormalizer) is None:
+        provideUtility(idnormalizer, IIDNormalizer)
+
+def run(row_count=DEFAULT_ROWS):
+    register_normalizer()
+
+    api = get_api_connection()
+    raw_data = generate_rows(row_count)
+
+    generate_person_id.cache_clear()
+    generate_safe_id.cache_clear()
+
+    print("Transforming %s synthetic rows" %(row_count))
+    before = measure("before (dict records)", lambda rows: legacy_transform_data(api, rows), raw_data)
+    after = measure("after (cold normalizer cache)", api.transform_data, raw_data)
+    after_warm = measure("after (warm normalizer cache)", api.transform_data, raw_data)
+    print("Speedup: %.2fx cold, %.2fx warm" %(before / after, before / after_warm))
+
+    return {'before': before, 'after': after, 'after_warm': after_warm}
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
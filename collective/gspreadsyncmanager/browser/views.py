@@ -20,24 +20,28 @@ from zope.component import getUtility
 #
 # Product dependencies
 #
-from collective.gspreadsyncmanager.utils import get_api_settings, get_api_settings_persons, get_datetime_today, get_datetime_future, clean_whitespaces, phonenumber_to_id, generate_person_id
+from collective.gspreadsyncmanager.utils import get_api_settings, get_api_settings_persons, get_datetime_today, get_datetime_future, clean_whitespaces, phonenumber_to_id, generate_person_id, str2bool
 from collective.gspreadsyncmanager.error_handling.error import raise_error
 from collective.gspreadsyncmanager.logging.logging import logger
+from collective.gspreadsyncmanager.http_sessions import get_single_attempt_session_pool
+from collective.gspreadsyncmanager.sync_jobs import FULL_SYNC_BATCH_SIZE, JOB_SYNC_PERSON, JOB_SYNC_ALL_PERSONS, JOB_SYNC_ALL_PERSONS_SHARDED, JOB_SYNC_ALL_ORGANIZATIONS_SHARDED
+from collective.gspreadsyncmanager.sync_queue import SyncJob, get_sync_queue
+from collective.gspreadsyncmanager.progress import get_progress_tracker
+from collective.gspreadsyncmanager.metrics import get_metrics
+from collective.gspreadsyncmanager.profiling import run_profiled
+from collective.gspreadsyncmanager.sharding import get_shard_urls, get_shard_parameters, get_forwarded_headers, dump_result, SHARD_URLS_ENVIRONMENT_VARIABLE
+from collective.gspreadsyncmanager.sync_plan import DEFAULT_OPERATIONS_LIMIT
 import plone.api
-#from collective.taskqueue.interfaces import ITaskQueue
-#from collective.taskqueue import taskqueue
 
 
 # Google Spreadsheets connection
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
-import requests
 from requests.auth import HTTPBasicAuth
 from plone.registry import Registry
 import transaction
 
-
 # TESTS API
 
 # PERSONS
@@ -92,27 +96,16 @@ class QueueSyncPerson(BrowserView):
 
     def queue_sync(self):
         redirect_url = self.context.absolute_url()
-        """
-        QUEUE_LIMIT = 1
-        QUEUE_VIEW = "sync_person"
-
-        queue_view_path = self.context.getPhysicalPath()
-        queue_size = len(getUtility(ITaskQueue, name='sync'))
-
-        queue_view_path_url = "/".join(queue_view_path)
-        queue_view_url = "%s/%s" %(queue_view_path_url, QUEUE_VIEW)
-        
-        print("URL: %s" %(queue_view_url))
-        print("Queue size: %s" %(queue_size))
-
         messages = IStatusMessage(self.request)
 
-        if queue_size < QUEUE_LIMIT:
-            sync_id = taskqueue.add(url=queue_view_url, queue="sync")
-            print("Run sync with ID: '%s'" %(sync_id))
-            messages.add(u"Sync ID '%s' is now triggered." %(sync_id), type=u"info")
+        context_person_id = generate_person_id(getattr(self.context, 'title', ''))
+
+        if context_person_id:
+            job = queue_sync_job(JOB_SYNC_PERSON, item_id=context_person_id)
+            messages.add(u"Sync of person ID '%s' is queued. Job ID: '%s'" %(context_person_id, job.job_id), type=u"info")
         else:
-            messages.add(u"There is one sync currently running. Try again later.", type=u"warning")"""
+            messages.add(u"This person cannot be synced with the API. Person ID is missing.", type=u"error")
+            logger("[Error] Error while queueing the sync for the person. Person ID is not available.", "Person ID not found.")
 
         raise Redirect(redirect_url)
 
@@ -123,36 +116,26 @@ class QueueSyncAllPersons(BrowserView):
 
     def queue_sync(self):
         redirect_url = self.context.absolute_url()
-
-        """QUEUE_LIMIT = 1
-        QUEUE_VIEW = "sync_all_persons"
-
-        queue_view_path = self.context.getPhysicalPath()
-        queue_size = len(getUtility(ITaskQueue, name='sync'))
-
-        queue_view_path_url = "/".join(queue_view_path)
-        queue_view_url = "%s/%s" %(queue_view_path_url, QUEUE_VIEW)
-        
-        print("URL: %s" %(queue_view_url))
-        print("Queue size: %s" %(queue_size))
-
         messages = IStatusMessage(self.request)
 
-        if queue_size < QUEUE_LIMIT:
-            sync_id = taskqueue.add(url=queue_view_url, queue="sync")
-            print("Run sync with ID: '%s'" %(sync_id))
-            messages.add(u"Sync ID '%s' is now triggered." %(sync_id), type=u"info")
-        else:
-            messages.add(u"There is one sync currently running. Try again later.", type=u"warning")"""
+        job = queue_sync_job(JOB_SYNC_ALL_PERSONS)
+        messages.add(u"Sync of all persons is queued. Job ID: '%s'" %(job.job_id), type=u"info")
 
         raise Redirect(redirect_url)
 
+def queue_sync_job(job_type, item_id=None, headers=None):
+    # Identical jobs that are still waiting are only queued once
+    site_path = plone.api.portal.get().getPhysicalPath()
+    # The job runs as this user, looked up again by its login name
+    user = plone.api.user.get_current()
+    return get_sync_queue().add(SyncJob(job_type, site_path, item_id=item_id, user_id=user.getId(), username=user.getUserName(), headers=headers))
 
 
 class SyncPerson(BrowserView):
 
     def __call__(self):
-        return self.sync()
+        # ?profile=1 runs the sync in the profiler
+        return run_profiled(self.context, self.request, "sync_person", self.sync)
 
     def sync(self):
 
@@ -204,14 +187,13 @@ class SyncAllPersonsAJAX(BrowserView):
         try:
             # Get API settings from the controlpanel
             api_settings = get_api_settings_persons()
-            plone.api.portal.set_registry_record("sync_complete", False)
 
             # Create the API connection
             api_connection = APIConnectionPersons(api_settings)
 
             # Create the settings for the sync
             # Initiate the sync manager
-            sync_options = {"api": api_connection, 'core': SYNC_CORE}
+            sync_options = {"api": api_connection, 'core': SYNC_CORE, 'batch_size': FULL_SYNC_BATCH_SIZE}
             sync_manager = SyncManagerPersons(sync_options)
             
             # Trigger the sync to update one organization
@@ -226,7 +208,8 @@ class SyncAllPersonsAJAX(BrowserView):
 class SyncAllPersons(BrowserView):
 
     def __call__(self):
-        return self.sync()
+        # ?profile=1 runs the sync in the profiler
+        return run_profiled(self.context, self.request, "sync_all_persons", self.sync)
 
     def sync(self):
 
@@ -242,7 +225,7 @@ class SyncAllPersons(BrowserView):
 
             # Create the settings for the sync
             # Initiate the sync manager
-            sync_options = {"api": api_connection, 'core': SYNC_CORE}
+            sync_options = {"api": api_connection, 'core': SYNC_CORE, 'batch_size': FULL_SYNC_BATCH_SIZE}
             sync_manager = SyncManagerPersons(sync_options)
             
             # Trigger the sync to update one organization
@@ -258,6 +241,120 @@ class SyncAllPersons(BrowserView):
         raise Redirect(redirect_url)
 
 
+class SyncPersonsShard(BrowserView):
+    # One shard of a sharded full sync, requested by the coordinator
+
+    def __call__(self):
+        return self.sync()
+
+    def sync(self):
+
+        result = {'status': 'done'}
+
+        try:
+            shard = get_shard_parameters(self.request)
+
+            # Get API settings from the controlpanel
+            api_settings = get_api_settings_persons()
+
+            # Create the API connection
+            api_connection = APIConnectionPersons(api_settings)
+
+            # Only the rows of this shard are synced and nothing is unpublished
+            sync_options = {"api": api_connection, 'core': SYNC_CORE, 'batch_size': FULL_SYNC_BATCH_SIZE, 'shard': shard, 'unpublish_missing': False}
+            sync_manager = SyncManagerPersons(sync_options)
+
+            logger("[Status] Start update of persons shard %s of %s." %(shard[0], shard[1]))
+            person_data = sync_manager.update_persons(create_and_unpublish=True)
+            logger("[Status] Finished update of persons shard %s of %s." %(shard[0], shard[1]))
+
+            # Counters of the shard, merged by the coordinator
+            result.update(sync_manager.progress.to_dict())
+        except Exception as err:
+            logger("[Error] Error while requesting the sync for a shard of persons.", err)
+            result = {'status': 'failed', 'error': str(err)}
+
+        return dump_result(self.request, result)
+
+class SyncAllPersonsSharded(BrowserView):
+    # Queues the coordinator of a sharded full sync across the ZEO clients.
+    # It runs as a sync job, so this request does not wait on the shards
+    # that can be served by the threads of this same server.
+
+    def __call__(self):
+        return self.sync()
+
+    def sync(self):
+
+        redirect_url = self.context.absolute_url()
+        messages = IStatusMessage(self.request)
+
+        shard_urls = get_shard_urls()
+        if not shard_urls:
+            messages.add(u"Sharded sync is not configured. Set the %s environment variable." %(SHARD_URLS_ENVIRONMENT_VARIABLE), type=u"error")
+            raise Redirect(redirect_url)
+
+        # The shard requests are authenticated as this request
+        job = queue_sync_job(JOB_SYNC_ALL_PERSONS_SHARDED, headers=get_forwarded_headers(self.request))
+        messages.add(u"Sharded sync of all persons in %s shards is queued. Job ID: '%s'" %(len(shard_urls), job.job_id), type=u"info")
+
+        raise Redirect(redirect_url)
+
+class SyncPersonsDryRun(BrowserView):
+    # Plan of a full sync with the field-level diffs, as JSON.
+    # Nothing is written and no pictures are downloaded.
+    # ?skipped=1 also lists the unchanged rows, ?limit= the number of listed operations.
+
+    def __call__(self):
+        return self.plan()
+
+    def plan(self):
+
+        try:
+            # Get API settings from the controlpanel
+            api_settings = get_api_settings_persons()
+
+            # Create the API connection
+            api_connection = APIConnectionPersons(api_settings)
+
+            sync_options = {"api": api_connection, 'core': SYNC_CORE, 'dry_run': True}
+            sync_manager = SyncManagerPersons(sync_options)
+
+            logger("[Status] Start dry run of the sync of all persons.")
+            plan = sync_manager.plan_persons()
+            logger("[Status] Finished dry run of the sync of all persons.")
+
+            result = plan.to_dict(include_skipped=str2bool(self.request.form.get('skipped', False)), limit=int(self.request.form.get('limit', DEFAULT_OPERATIONS_LIMIT)))
+            result['status'] = 'done'
+        except Exception as err:
+            logger("[Error] Error while planning the sync for all persons.", err)
+            result = {'status': 'failed', 'error': str(err)}
+        finally:
+            # Staged values are only read, nothing of the plan is committed
+            transaction.abort()
+
+        return dump_result(self.request, result)
+
+class SyncProgressView(BrowserView):
+    # Progress of the running and recent syncs of this process, as JSON.
+    # Cheap to poll, as nothing is read from the database.
+
+    def __call__(self):
+        return dump_result(self.request, get_progress_tracker().to_dict())
+
+class SyncJobsView(BrowserView):
+    # Queued, running and recent sync jobs of this process, as JSON
+
+    def __call__(self):
+        return dump_result(self.request, get_sync_queue().get_jobs())
+
+class SyncMetricsView(BrowserView):
+    # Phase timings and API counters of this process in the Prometheus text format
+
+    def __call__(self):
+        self.request.response.setHeader("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        return get_metrics().render()
+
 class RequestSyncAllPersons(BrowserView):
 
     def __call__(self):
@@ -272,8 +369,8 @@ class RequestSyncAllPersons(BrowserView):
 
             request_url = "%s%s" %(current_url, view_name)
             
-            res = requests.get(request_url, auth=HTTPBasicAuth('##', '##'))
-            res.connection.close()
+            # The full sync can take minutes, so this request has no read timeout
+            res = get_single_attempt_session_pool().get(request_url, auth=HTTPBasicAuth('##', '##'), timeout=None)
             return True
         else:
             return False
@@ -285,7 +382,8 @@ class RequestSyncAllPersons(BrowserView):
 class SyncOrganization(BrowserView):
 
     def __call__(self):
-        return self.sync()
+        # ?profile=1 runs the sync in the profiler
+        return run_profiled(self.context, self.request, "sync_organization", self.sync)
 
     def sync(self):
 
@@ -327,7 +425,8 @@ class SyncOrganization(BrowserView):
 class SyncAllOrganizations(BrowserView):
 
     def __call__(self):
-        return self.sync()
+        # ?profile=1 runs the sync in the profiler
+        return run_profiled(self.context, self.request, "sync_all_organizations", self.sync)
 
     def sync(self):
 
@@ -343,7 +442,7 @@ class SyncAllOrganizations(BrowserView):
 
             # Create the settings for the sync
             # Initiate the sync manager
-            sync_options = {"api": api_connection, 'core': SYNC_CORE_ORGANIZATIONS}
+            sync_options = {"api": api_connection, 'core': SYNC_CORE_ORGANIZATIONS, 'batch_size': FULL_SYNC_BATCH_SIZE}
             sync_manager = SyncManagerOrganizations(sync_options)
             
             # Trigger the sync to update one organization
@@ -357,5 +456,98 @@ class SyncAllOrganizations(BrowserView):
         # Redirect to the original page
         raise Redirect(redirect_url)
 
+class SyncOrganizationsShard(BrowserView):
+    # One shard of a sharded full sync, requested by the coordinator
+
+    def __call__(self):
+        return self.sync()
+
+    def sync(self):
+
+        result = {'status': 'done'}
+
+        try:
+            shard = get_shard_parameters(self.request)
+
+            # Get API settings from the controlpanel
+            api_settings = get_api_settings()
+
+            # Create the API connection
+            api_connection = APIConnectionOrganizations(api_settings)
+
+            # Only the rows of this shard are synced and nothing is unpublished
+            sync_options = {"api": api_connection, 'core': SYNC_CORE_ORGANIZATIONS, 'batch_size': FULL_SYNC_BATCH_SIZE, 'shard': shard, 'unpublish_missing': False}
+            sync_manager = SyncManagerOrganizations(sync_options)
+
+            logger("[Status] Start update of organizations shard %s of %s." %(shard[0], shard[1]))
+            organization_data = sync_manager.update_organizations(create_and_unpublish=True)
+            logger("[Status] Finished update of organizations shard %s of %s." %(shard[0], shard[1]))
+
+            # Counters of the shard, merged by the coordinator
+            result.update(sync_manager.progress.to_dict())
+        except Exception as err:
+            logger("[Error] Error while requesting the sync for a shard of organizations.", err)
+            result = {'status': 'failed', 'error': str(err)}
+
+        return dump_result(self.request, result)
+
+class SyncAllOrganizationsSharded(BrowserView):
+    # Queues the coordinator of a sharded full sync across the ZEO clients.
+    # It runs as a sync job, so this request does not wait on the shards
+    # that can be served by the threads of this same server.
+
+    def __call__(self):
+        return self.sync()
+
+    def sync(self):
+
+        redirect_url = self.context.absolute_url()
+        messages = IStatusMessage(self.request)
+
+        shard_urls = get_shard_urls()
+        if not shard_urls:
+            messages.add(u"Sharded sync is not configured. Set the %s environment variable." %(SHARD_URLS_ENVIRONMENT_VARIABLE), type=u"error")
+            raise Redirect(redirect_url)
+
+        # The shard requests are authenticated as this request
+        job = queue_sync_job(JOB_SYNC_ALL_ORGANIZATIONS_SHARDED, headers=get_forwarded_headers(self.request))
+        messages.add(u"Sharded sync of all organizations in %s shards is queued. Job ID: '%s'" %(len(shard_urls), job.job_id), type=u"info")
+
+        raise Redirect(redirect_url)
+
+class SyncOrganizationsDryRun(BrowserView):
+    # Plan of a full sync with the field-level diffs, as JSON.
+    # Nothing is written and no pictures are downloaded.
+    # ?skipped=1 also lists the unchanged rows, ?limit= the number of listed operations.
+
+    def __call__(self):
+        return self.plan()
+
+    def plan(self):
+
+        try:
+            # Get API settings from the controlpanel
+            api_settings = get_api_settings()
+
+            # Create the API connection
+            api_connection = APIConnectionOrganizations(api_settings)
+
+            sync_options = {"api": api_connection, 'core': SYNC_CORE_ORGANIZATIONS, 'dry_run': True}
+            sync_manager = SyncManagerOrganizations(sync_options)
+
+            logger("[Status] Start dry run of the sync of all organizations.")
+            plan = sync_manager.plan_organizations()
+            logger("[Status] Finished dry run of the sync of all organizations.")
+
+            result = plan.to_dict(include_skipped=str2bool(self.request.form.get('skipped', False)), limit=int(self.request.form.get('limit', DEFAULT_OPERATIONS_LIMIT)))
+            result['status'] = 'done'
+        except Exception as err:
+            logger("[Error] Error while planning the sync for all organizations.", err)
+            result = {'status': 'failed', 'error': str(err)}
+        finally:
+            # Staged values are only read, nothing of the plan is committed
+            transaction.abort()
+
+        return dump_result(self.request, result)
 
 
@@ -6,6 +6,9 @@ from plone.z3cform import layout
 from zope import schema
 from zope.interface import Interface
 
+from collective.gspreadsyncmanager.api_modules.gsheets.spreadsheet_cache import DEFAULT_TTL
+from collective.gspreadsyncmanager.api_modules.gsheets.sheet_reader import FETCH_MODE_COLUMNS, FETCH_MODE_ALL, DEFAULT_WINDOW_SIZE, DEFAULT_PARALLEL_WINDOWS
+
 class IGSheetsControlPanel(Interface):
 
     api_scope = schema.TextLine(
@@ -38,6 +41,50 @@ class IGSheetsControlPanel(Interface):
         required=False
     )
 
+    api_cache_ttl = schema.Int(
+        title=u'Spreadsheet cache TTL (seconds)',
+        description=u'Transformed spreadsheet data is cached while the spreadsheet is unchanged, for at most this time.',
+        default=DEFAULT_TTL,
+        min=0,
+        required=False
+    )
+
+    api_shared_cache = schema.Bool(
+        title=u'Shared spreadsheet cache',
+        description=u'Cache the spreadsheet data in the Zope RAM cache utility instead of in this process only.',
+        default=False,
+        required=False
+    )
+
+    api_fetch_mode = schema.Choice(
+        title=u'Spreadsheet fetch mode',
+        description=u"'columns' requests only the mapped columns, 'all' downloads every worksheet value.",
+        values=[FETCH_MODE_COLUMNS, FETCH_MODE_ALL],
+        default=FETCH_MODE_COLUMNS,
+        required=False
+    )
+
+    api_streaming = schema.Bool(
+        title=u'Stream full syncs',
+        description=u'Full syncs read the worksheet in windows of rows and sync them while the next windows are downloaded.',
+        default=False,
+        required=False
+    )
+
+    api_window_size = schema.Int(
+        title=u'Rows per window',
+        default=DEFAULT_WINDOW_SIZE,
+        min=1,
+        required=False
+    )
+
+    api_parallel_windows = schema.Int(
+        title=u'Windows requested at the same time',
+        default=DEFAULT_PARALLEL_WINDOWS,
+        min=1,
+        required=False
+    )
+
 
 class GsheetsControlPanelForm(RegistryEditForm):
     schema = IGSheetsControlPanel
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from Products.Five import BrowserView
+from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
+from zExceptions import NotFound
+
+from collective.gspreadsyncmanager.profiling import get_profiles, get_profile_path, get_profile_directory, PROFILE_PARAMETER, MEMORY_PARAMETER, PROFILE_EXTENSION
+
+
+class SyncProfilesView(BrowserView):
+    # Saved profiles of the sync views, with download links
+
+    index = ViewPageTemplateFile('profiles.pt')
+
+    def __call__(self):
+        filename = self.request.form.get('download', None)
+        if filename:
+            return self.download(filename)
+        return self.index()
+
+    def get_profiles(self):
+        return get_profiles()
+
+    def get_profile_directory(self):
+        return get_profile_directory()
+
+    def get_usage(self):
+        return u"Add ?%s=1 to @@sync_all_persons, @@sync_all_organizations, @@sync_person or @@sync_organization to profile the sync. Add &%s=1 to also compare the memory between the sync phases." %(PROFILE_PARAMETER, MEMORY_PARAMETER)
+
+    def get_download_url(self, filename):
+        return "%s/@@gspreadsync-profiles?download=%s" %(self.context.absolute_url(), filename)
+
+    def download(self, filename):
+        path = get_profile_path(filename)
+        if path is None:
+            raise NotFound(filename)
+
+        content_type = "application/octet-stream" if filename.endswith(PROFILE_EXTENSION) else "text/plain; charset=utf-8"
+        self.request.response.setHeader("Content-Type", content_type)
+        self.request.response.setHeader("Content-Disposition", 'attachment; filename="%s"' %(filename))
+        with open(path, 'rb') as profile_file:
+            return profile_file.read()
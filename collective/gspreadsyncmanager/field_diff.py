@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Logging module
+from .logging.logging import logger
+
+SUBJECT_FIELD = "subject"
+SUBJECTS_FIELD = "subjects" # Schema field of the Subject keywords
+
+_marker = object()
+
+
+class SubjectComposer(object):
+    #
+    # Collects the Subject contributions of one row (type, markets, countries)
+    # and keeps the preserved flags that are currently set, like 'frontpage'.
+    # The composed subjects are unique and are only written when the set of
+    # keywords changed.
+    #
+    def __init__(self, current_subjects, preserved_subjects=()):
+        self.current_subjects = tuple(current_subjects)
+        self.preserved = [subject for subject in self.current_subjects if subject in preserved_subjects]
+        self.contributions = []
+
+    def add(self, subjects):
+        for subject in subjects:
+            subject = (subject or "").strip()
+            if subject:
+                self.contributions.append(subject)
+        return self.contributions
+
+    def compose(self):
+        subjects = []
+        for subject in self.preserved + self.contributions:
+            if subject not in subjects:
+                subjects.append(subject)
+        return tuple(subjects)
+
+    def is_changed(self):
+        # Duplicated keywords from earlier syncs are also cleaned up
+        current_set = set(self.current_subjects)
+        if len(current_set) != len(self.current_subjects):
+            return True
+        return set(self.compose()) != current_set
+
+
+class FieldChanges(object):
+    #
+    # Stages the new field values of one synced object.
+    # Values are only written to the object by 'apply' and only when they
+    # differ from the current value, so unchanged objects are not marked
+    # as changed in the ZODB.
+    #
+    def __init__(self, obj, preserved_subjects=()):
+        self.obj = obj
+        self.preserved_subjects = preserved_subjects
+        self.subjects = None
+        self.staged = {}
+        self.changed = []
+
+    def exists(self, fieldname):
+        return fieldname in self.staged or hasattr(self.obj, fieldname)
+
+    def get(self, fieldname, default=None):
+        if fieldname in self.staged:
+            return self.staged[fieldname]
+        return self.get_current(fieldname, default)
+
+    def get_current(self, fieldname, default=None):
+        if fieldname == SUBJECT_FIELD:
+            return tuple(self.obj.Subject())
+        return getattr(self.obj, fieldname, default)
+
+    def set(self, fieldname, value):
+        self.staged[fieldname] = value
+        return value
+
+    def get_subjects(self):
+        if self.subjects is not None:
+            return self.subjects.compose()
+        return tuple(self.get(SUBJECT_FIELD))
+
+    def set_subjects(self, subjects):
+        return self.set(SUBJECT_FIELD, tuple(subjects))
+
+    def reset_subjects(self):
+        # Subjects are composed again from the contributions of the row
+        self.subjects = SubjectComposer(self.get_current(SUBJECT_FIELD), self.preserved_subjects)
+        return self.subjects
+
+    def add_subjects(self, subjects):
+        if self.subjects is None:
+            self.reset_subjects()
+        return self.subjects.add(subjects)
+
+    def compose_subjects(self):
+        # setSubject is only called when the set of keywords changed
+        if self.subjects is not None:
+            self.staged.pop(SUBJECTS_FIELD, None)
+            if self.subjects.is_changed():
+                self.staged[SUBJECT_FIELD] = self.subjects.compose()
+            else:
+                self.staged.pop(SUBJECT_FIELD, None)
+            self.subjects = None
+
+    def is_changed(self, fieldname, value):
+        current_value = self.get_current(fieldname, _marker)
+        return current_value is _marker or current_value != value
+
+    def get_diffs(self):
+        # (current value, new value) of the staged fields that differ,
+        # without writing anything to the object
+        self.compose_subjects()
+        diffs = {}
+        for fieldname, value in self.staged.items():
+            if self.is_changed(fieldname, value):
+                diffs[fieldname] = (self.get_current(fieldname, None), value)
+        return diffs
+
+    def apply(self):
+        self.compose_subjects()
+        changed = []
+        for fieldname, value in self.staged.items():
+            if not self.is_changed(fieldname, value):
+                continue
+
+            try:
+                if fieldname == SUBJECT_FIELD:
+                    self.obj.setSubject(value)
+                else:
+                    setattr(self.obj, fieldname, value)
+                changed.append(fieldname)
+            except Exception as err:
+                logger("[Error] Exception while writing the Plone field '%s'" %(fieldname), err)
+
+        self.staged = {}
+        self.changed = changed
+        return self.changed
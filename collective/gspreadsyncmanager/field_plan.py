@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+
+# Logging module
+from .logging.logging import logger
+
+
+def build_field_plan(core, special_fields_handlers):
+    #
+    # Compiles the fields mapping into an ordered list of
+    # (API field, Plone field, transform) entries, in the order of the core.
+    # Ignored fields are dropped here, so updates only run the mapped fields.
+    # 'transform' is the special field handler of the API field or None.
+    #
+    field_plan = []
+    for fieldname, plonefield in core.items():
+        if not plonefield:
+            logger("[Warning] API field '%s' is ignored in the fields mapping" %(fieldname), "Field ignored in mapping.")
+            continue
+        field_plan.append((fieldname, plonefield, special_fields_handlers.get(fieldname, None)))
+    return field_plan
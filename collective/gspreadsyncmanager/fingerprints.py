@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+import plone.api
+from BTrees.OOBTree import OOBTree
+from zope.annotation.interfaces import IAnnotations
+
+ANNOTATION_KEY = "collective.gspreadsyncmanager.fingerprints"
+
+
+class FingerprintStore(object):
+    #
+    # Fingerprints of the last synced spreadsheet rows, keyed by '_id'.
+    # Stored in a BTree annotation on the site root, so rows can be compared
+    # without loading the synced content objects.
+    #
+    def __init__(self, name):
+        self.name = name
+
+    def get_fingerprints(self, create=False):
+        annotations = IAnnotations(plone.api.portal.get())
+        stores = annotations.get(ANNOTATION_KEY, None)
+
+        if stores is None:
+            if not create:
+                return None
+            stores = annotations[ANNOTATION_KEY] = OOBTree()
+
+        if self.name not in stores:
+            if not create:
+                return None
+            stores[self.name] = OOBTree()
+
+        return stores[self.name]
+
+    def get(self, _id):
+        fingerprints = self.get_fingerprints()
+        if fingerprints is None:
+            return None
+        return fingerprints.get(_id, None)
+
+    def is_unchanged(self, _id, fingerprint):
+        return bool(fingerprint) and self.get(_id) == fingerprint
+
+    def set(self, _id, fingerprint):
+        if not _id or not fingerprint or self.get(_id) == fingerprint:
+            return False
+
+        fingerprints = self.get_fingerprints(create=True)
+        fingerprints[_id] = fingerprint
+        return True
+
+    def remove(self, _id):
+        fingerprints = self.get_fingerprints()
+        if fingerprints is not None and _id in fingerprints:
+            del fingerprints[_id]
+            return True
+        return False
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Sync metrics
+from .metrics import create_response_hook
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_TIMEOUT = (5, 60) # connect, read (seconds)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class SessionPool(object):
+    #
+    # Shared requests session with keep-alive connections.
+    # The urllib3 connection pool of the session is thread-safe, so one
+    # session is used by all threads, including the image prefetch workers.
+    #
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, timeout=DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.session = None
+
+    def get_session(self):
+        with self.lock:
+            if self.session is None:
+                self.session = self.create_session()
+            return self.session
+
+    def create_session(self):
+        if self.retries:
+            max_retries = Retry(
+                total=self.retries,
+                backoff_factor=self.backoff_factor,
+                status_forcelist=RETRY_STATUS_CODES,
+                raise_on_status=False
+            )
+        else:
+            max_retries = 0
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=max_retries, pool_block=True)
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.hooks['response'].append(create_response_hook("http"))
+        return session
+
+    def request(self, http_method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.get_session().request(http_method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+
+_session_pools = {}
+_session_pools_lock = threading.Lock()
+
+def get_session_pool(name="default", **settings):
+    # One pool per name and process, created with the settings of the first call
+    with _session_pools_lock:
+        if name not in _session_pools:
+            _session_pools[name] = SessionPool(**settings)
+        return _session_pools[name]
+
+def get_single_attempt_session_pool():
+    # Requests that start a sync are never sent again, as a retry after
+    # a proxy timeout or read error would start the whole sync again
+    return get_session_pool("single_attempt", retries=0)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl the index is only locked within this process
+    fcntl = None
+
+# Logging module
+from .logging.logging import logger
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), "collective.gspreadsyncmanager-images")
+
+
+def hash_image_data(image_data):
+    return hashlib.sha256(image_data).hexdigest()
+
+def is_same_image(image_blob, image_data):
+    # Compares the size first, so the blob file is only read when needed
+    if image_blob is None or not image_data:
+        return False
+    try:
+        if image_blob.getSize() != len(image_data):
+            return False
+        return hash_image_data(image_blob.data) == hash_image_data(image_data)
+    except Exception as err:
+        logger("[Error] Error while comparing the current image blob.", err)
+        return False
+
+
+class ImageCache(object):
+    #
+    # Local disk cache of downloaded pictures.
+    # Entries are keyed by Drive file ID and point to content-addressed files
+    # named after the sha256 of the bytes, so identical images are stored once.
+    # The least recently used entries are evicted above 'max_size' bytes.
+    # Processes on the same host share the directory: the index is locked
+    # and reloaded before every change, so they do not overwrite each other.
+    # Reads only update the recency of an entry in this process.
+    #
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    INDEX_FILENAME = "index.json"
+    LOCK_FILENAME = "index.lock"
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self.entries = self.load_index()
+
+    #
+    # Cache operations
+    #
+    def get(self, image_id, etag=None, last_modified=None):
+        # Returns the cached bytes when the given validators match the entry
+        with self.lock:
+            entry = self.entries.get(image_id, None)
+            if not entry:
+                return None
+            if etag and entry.get('etag') != etag:
+                return None
+            if last_modified and entry.get('last_modified') != last_modified:
+                return None
+
+            image_data = self.read_file(entry['sha256'])
+            if image_data is None:
+                self.remove(image_id)
+                return None
+
+            self.entries.move_to_end(image_id)
+            return image_data
+
+    def get_validators(self, image_id):
+        # HTTP headers to revalidate a cached image with the server
+        headers = {}
+        with self.lock:
+            entry = self.entries.get(image_id, None)
+            if entry:
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, image_id, image_data, etag=None, last_modified=None):
+        if not image_id or not image_data:
+            return None
+
+        sha256 = hash_image_data(image_data)
+        with self.update_index():
+            try:
+                self.write_file(sha256, image_data)
+            except Exception as err:
+                logger("[Error] Error while writing the image '%s' to the cache." %(image_id), err)
+                return None
+
+            self.entries[image_id] = {
+                'sha256': sha256,
+                'size': len(image_data),
+                'etag': etag,
+                'last_modified': last_modified
+            }
+            self.entries.move_to_end(image_id)
+            self.evict()
+
+        return sha256
+
+    def remove(self, image_id):
+        with self.update_index():
+            entry = self.entries.pop(image_id, None)
+            if entry:
+                self.remove_unused_file(entry['sha256'])
+
+    def evict(self):
+        while self.entries and self.get_size() > self.max_size:
+            image_id, entry = self.entries.popitem(last=False)
+            self.remove_unused_file(entry['sha256'])
+
+    def get_size(self):
+        # Files shared by several entries are only counted once
+        sizes = dict((entry['sha256'], entry['size']) for entry in self.entries.values())
+        return sum(sizes.values())
+
+    #
+    # Disk operations
+    #
+    def get_file_path(self, sha256):
+        return os.path.join(self.directory, sha256)
+
+    def read_file(self, sha256):
+        try:
+            with open(self.get_file_path(sha256), 'rb') as image_file:
+                return image_file.read()
+        except (IOError, OSError):
+            return None
+
+    def write_file(self, sha256, image_data):
+        file_path = self.get_file_path(sha256)
+        if os.path.exists(file_path):
+            return file_path
+
+        self.ensure_directory()
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(temp_fd, 'wb') as image_file:
+            image_file.write(image_data)
+        os.rename(temp_path, file_path)
+        return file_path
+
+    def remove_unused_file(self, sha256):
+        if any(entry['sha256'] == sha256 for entry in self.entries.values()):
+            return False
+        try:
+            os.remove(self.get_file_path(sha256))
+            return True
+        except (IOError, OSError):
+            return False
+
+    def ensure_directory(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @contextmanager
+    def update_index(self):
+        # Changes the index of the latest entries on disk and saves it,
+        # while the other processes wait for the lock
+        with self.lock:
+            lock_file = None
+            try:
+                if fcntl is not None:
+                    self.ensure_directory()
+                    lock_file = open(os.path.join(self.directory, self.LOCK_FILENAME), 'a')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except (IOError, OSError) as err:
+                logger("[Warning] The image cache index cannot be locked.", err)
+
+            try:
+                self.entries = self.load_index()
+                yield self.entries
+                self.save_index()
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILENAME)) as index_file:
+                return OrderedDict(json.load(index_file))
+        except (IOError, OSError, ValueError):
+            return OrderedDict()
+
+    def save_index(self):
+        try:
+            self.ensure_directory()
+            index_path = os.path.join(self.directory, self.INDEX_FILENAME)
+            temp_fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(temp_fd, 'w') as index_file:
+                json.dump(list(self.entries.items()), index_file)
+            os.rename(temp_path, index_path)
+        except Exception as err:
+            logger("[Error] Error while saving the image cache index.", err)
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    # One cache per process, shared by all syncs
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+from concurrent.futures import ThreadPoolExecutor
+
+# Logging module
+from .logging.logging import logger
+
+
+class ImagePrefetcher(object):
+    #
+    # Downloads the pictures of a sync in a bounded thread pool,
+    # before the objects are updated inside the transaction.
+    # 'download' is called with one key (URL or file ID) and returns the bytes.
+    # The bytes are kept by key until the chunk of rows is applied.
+    #
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_PREFETCH_WINDOW = 500 # rows
+
+    def __init__(self, download, max_workers=DEFAULT_MAX_WORKERS):
+        self.download = download
+        self.max_workers = max(int(max_workers or 1), 1)
+        self.images = {}
+
+    def prefetch(self, keys):
+        keys = [key for key in set(keys) if key and key not in self.images]
+
+        if keys:
+            logger("[Status] Prefetching %s images." %(len(keys)))
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as executor:
+                for key, image_data in zip(keys, executor.map(self.safe_download, keys)):
+                    self.images[key] = image_data
+
+        return self.images
+
+    def safe_download(self, key):
+        try:
+            return self.download(key)
+        except Exception as err:
+            logger("[Error] Error while prefetching the image '%s'" %(key), err)
+            return None
+
+    def has_image(self, key):
+        return key in self.images
+
+    def get_image(self, key):
+        # Rows that share a picture and replayed batches reuse the bytes
+        return self.images.get(key, None)
+
+    def clear(self):
+        # Frees the bytes of a chunk once it is applied
+        self.images = {}
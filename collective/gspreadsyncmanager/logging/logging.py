@@ -1,49 +1,199 @@
 # -*- coding: utf-8 -*-
 
+#
+# Structured logger of the sync, on top of the standard logging module.
+# Records propagate to the handlers configured by the instance, like the
+# Zope event log. Repeated warnings are aggregated into counts and the
+# records can also be written to a buffered CSV or JSONL file by a
+# listener thread, so the file does not block the sync.
+#
+# logger(message, err) is kept as the API: the level comes from the
+# '[Error]', '[Warning]' and '[Status]' prefixes of the message.
+#
+import os
+import csv
+import sys
+import json
+import atexit
+import threading
 from datetime import datetime
-print_warnings = False
-print_errors = True
-print_status = True
-
-def log_csv(message, err, timestamp):
-    """
-    Log format:
-    datetime, type_error, message, exception
-    """
-
-    """if '[Error]' in message:
-        pass
-    elif '[Warning]' in message:
-        pass
-    elif '[Status]' in message:
-        pass"""
-
-    return ""
-
-def log_sentry(message, err, timestamp):
-    return ""
-
-def logger(message, err=""):
-    timestamp = datetime.today().isoformat()
-    log_csv(message, err, timestamp)
-    log_sentry(message, err, timestamp)
-
-    print_message = False
-    if '[Error]' in message and print_errors:
-        print_message = True
-
-    elif '[Status]' in message and print_status:
-        print_message = True
-
-    elif '[Warning]' in message and print_warnings:
-        print_message = True
-    else:
-        print_message = False
-
-    if print_message:
-        if '[Status]' not in message:
-            print("[%s] %s Exception: %s" %(timestamp, message, err))
-        else:
-            print("[%s] %s" %(timestamp, message))
-    else:
-        pass
+
+# Absolute import of the standard library module, not this module
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import queue
+except ImportError:
+    # support python 2
+    import Queue as queue
+
+LOGGER_NAME = "collective.gspreadsyncmanager"
+
+# Path of the log file; the extension selects the format (.csv or .jsonl)
+LOG_FILE_ENVIRONMENT_VARIABLE = "GSPREADSYNC_LOG_FILE"
+
+BUFFER_SIZE = 100 # records written to the log file at once
+REPEAT_INTERVAL = 60 # seconds in which identical warnings are counted
+
+LEVEL_PREFIXES = (
+    ("[Error]", logging.ERROR),
+    ("[Warning]", logging.WARNING),
+    ("[Status]", logging.INFO)
+)
+
+
+def get_level(message):
+    for prefix, level in LEVEL_PREFIXES:
+        if message.startswith(prefix):
+            return level
+    return logging.DEBUG
+
+def get_timestamp(record):
+    return datetime.fromtimestamp(record.created).isoformat()
+
+
+class LazyQueueHandler(QueueHandler):
+    # Records are formatted by the listener thread instead of the caller
+    def prepare(self, record):
+        return record
+
+
+class RepeatedWarningsFilter(logging.Filter):
+    #
+    # Only the first of identical warnings passes in every interval.
+    # The others are counted and reported in one record by 'flush'.
+    #
+    def __init__(self, interval=REPEAT_INTERVAL):
+        logging.Filter.__init__(self)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.window_start = None
+
+    def filter(self, record):
+        if record.levelno != logging.WARNING or getattr(record, 'aggregated', False):
+            return True
+
+        if self.window_start is not None and record.created - self.window_start > self.interval:
+            self.flush()
+
+        message = record.getMessage()
+        with self.lock:
+            if self.window_start is None:
+                self.window_start = record.created
+            count = self.counts.get(message, 0)
+            self.counts[message] = count + 1
+        return count == 0
+
+    def flush(self):
+        with self.lock:
+            repeated = [(message, count - 1) for message, count in self.counts.items() if count > 1]
+            self.counts = {}
+            self.window_start = None
+
+        for message, count in repeated:
+            get_logger().warning("%s (repeated %s more times)", message, count, extra={'err': '', 'aggregated': True})
+        return repeated
+
+
+class BufferedFileHandler(logging.Handler):
+    #
+    # Appends records to a CSV or JSONL file, 'buffer_size' records at a time.
+    # CSV format: datetime, level, message, exception
+    #
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        logging.Handler.__init__(self)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self.buffer = []
+
+    def emit(self, record):
+        try:
+            self.buffer.append((get_timestamp(record), record.levelname, record.getMessage(), "%s" %(getattr(record, 'err', ''),)))
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if not self.buffer:
+                return
+            rows, self.buffer = self.buffer, []
+            with open(self.path, 'a') as log_file:
+                if self.file_format == "csv":
+                    csv.writer(log_file).writerows(rows)
+                else:
+                    for timestamp, level, message, err in rows:
+                        log_file.write(json.dumps({'timestamp': timestamp, 'level': level, 'message': message, 'exception': err}) + "\n")
+        except Exception as err:
+            sys.stderr.write("Log file '%s' cannot be written: %s\n" %(self.path, err))
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        logging.Handler.close(self)
+
+
+_setup_lock = threading.Lock()
+_configured = False
+_listener = None
+_repeated_warnings = RepeatedWarningsFilter()
+
+def get_logger():
+    # Configures the logger once. Levels and handlers are left to the
+    # logging configuration of the instance, only the log file is added.
+    global _configured, _listener
+    log = logging.getLogger(LOGGER_NAME)
+    if _configured:
+        return log
+
+    with _setup_lock:
+        if not _configured:
+            log.addFilter(_repeated_warnings)
+
+            log_file = os.environ.get(LOG_FILE_ENVIRONMENT_VARIABLE, None)
+            if log_file:
+                log_queue = queue.Queue(-1)
+                log.addHandler(LazyQueueHandler(log_queue))
+                _listener = QueueListener(log_queue, BufferedFileHandler(log_file), respect_handler_level=True)
+                _listener.start()
+                atexit.register(stop_logging)
+
+            _configured = True
+
+    return log
+
+def flush_logs():
+    # Reports the repeated warnings and writes the buffered records
+    _repeated_warnings.flush()
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.flush()
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _repeated_warnings.flush()
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def logger(message, err="", *args):
+    # 'args' are formatted lazily into the message, only when it is logged
+    level = get_level(message)
+    log = get_logger()
+    if log.isEnabledFor(level):
+        err = "%s" %(err,) if err else ""
+        if err and level > logging.INFO:
+            # The handlers of the instance only write the message
+            if args:
+                message, args = message + " Exception: %s", args + (err,)
+            else:
+                message = "%s Exception: %s" %(message, err)
+        log.log(level, message, *args, extra={'err': err})
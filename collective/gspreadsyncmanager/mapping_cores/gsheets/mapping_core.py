@@ -16,7 +16,9 @@ CORE = {
 	"mentor":"mentor",
 	"team": "team",
 
-	"market":"market"
+	"market":"market",
+
+	"_fingerprint": ""
 }
 
 CORE_ORGANIZATIONS = {
@@ -28,7 +30,8 @@ CORE_ORGANIZATIONS = {
 	"organization_language": "organization_language",
 	"city":"city",
 	
-	"_id":""
+	"_id":"",
+	"_fingerprint": ""
 }
 
 
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Per-phase timings and API counters of the syncs in this process,
+# rendered in the Prometheus text exposition format.
+#
+import time
+import threading
+from contextlib import contextmanager
+
+PHASE_DURATION = "gspreadsync_phase_duration_seconds"
+API_CALLS = "gspreadsync_api_calls_total"
+API_BYTES = "gspreadsync_api_bytes_total"
+
+# Seconds, from one catalog lookup to a full sheet fetch
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRIC_HELP = {
+    PHASE_DURATION: "Duration of the sync phases in seconds.",
+    API_CALLS: "Number of requests to the Sheets, Drive and HTTP APIs.",
+    API_BYTES: "Bytes received from the Sheets, Drive and HTTP APIs."
+}
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" %(",".join('%s="%s"' %(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels))
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append("%s_bucket%s %s" %(name, format_labels(labels + (("le", format_value(bucket)),)), cumulative))
+        lines.append("%s_bucket%s %s" %(name, format_labels(labels + (("le", "+Inf"),)), self.count))
+        lines.append("%s_sum%s %s" %(name, format_labels(labels), format_value(self.sum)))
+        lines.append("%s_count%s %s" %(name, format_labels(labels), self.count))
+        return lines
+
+
+class SyncMetrics(object):
+    #
+    # Histograms and counters keyed by metric name and sorted label pairs
+    #
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        # Called with (phase, duration) when a timed phase ends
+        self.listeners = []
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key, None)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            self.observe(PHASE_DURATION, duration, phase=phase)
+            for listener in self.listeners:
+                listener(phase, duration)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners = [current for current in self.listeners if current is not listener]
+
+    def count_api_call(self, api, received_bytes=0):
+        self.increment(API_CALLS, api=api)
+        if received_bytes:
+            self.increment(API_BYTES, received_bytes, api=api)
+
+    def get_summary(self):
+        # Count and seconds per phase, calls and bytes per API
+        with self.lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+
+        summary = {'phases': {}, 'api_calls': {}, 'api_bytes': {}}
+        for (name, labels), histogram in histograms:
+            if name == PHASE_DURATION:
+                summary['phases'][dict(labels)['phase']] = {'count': histogram.count, 'seconds': histogram.sum}
+
+        for (name, labels), value in counters:
+            if name == API_CALLS:
+                summary['api_calls'][dict(labels)['api']] = value
+            elif name == API_BYTES:
+                summary['api_bytes'][dict(labels)['api']] = value
+        return summary
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def render(self):
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        rendered_names = set()
+        for (name, labels), histogram in histograms:
+            if name not in rendered_names:
+                lines.append("# HELP %s %s" %(name, METRIC_HELP.get(name, name)))
+                lines.append("# TYPE %s histogram" %(name))
+                rendered_names.add(name)
+            lines.extend(histogram.render(name, labels))
+
+        for (name, labels), value in counters:
+            if name not in rendered_names:
+                lines.append("# HELP %s %s" %(name, METRIC_HELP.get(name, name)))
+                lines.append("# TYPE %s counter" %(name))
+                rendered_names.add(name)
+            lines.append("%s%s %s" %(name, format_labels(labels), format_value(value)))
+
+        return "\n".join(lines) + "\n"
+
+
+_metrics = SyncMetrics()
+
+def get_metrics():
+    return _metrics
+
+def time_phase(phase):
+    # with time_phase("reindex"): ...
+    return _metrics.timer(phase)
+
+def count_api_call(api, received_bytes=0):
+    return _metrics.count_api_call(api, received_bytes)
+
+def get_response_size(response):
+    content_length = response.headers.get('Content-Length', None)
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    try:
+        return len(response.content)
+    except Exception:
+        return 0
+
+def create_response_hook(api):
+    # requests response hook that counts the calls and bytes of a session
+    def count_response(response, *args, **kwargs):
+        count_api_call(api, get_response_size(response))
+        return response
+    return count_response
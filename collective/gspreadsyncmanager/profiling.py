@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# On-demand profiling of the sync views.
+# With ?profile=1 and the profile permission, the sync runs in cProfile and
+# the profile is saved on disk with a text report. With ?profile_memory=1
+# tracemalloc snapshots are also compared between the sync phases.
+#
+import os
+import io
+import re
+import time
+import uuid
+import pstats
+import cProfile
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+from collections import OrderedDict
+
+from AccessControl import getSecurityManager
+
+# Logging module
+from .logging.logging import logger
+
+# Sync metrics
+from .metrics import get_metrics
+
+# Utils
+from .utils import str2bool
+
+PROFILE_PERMISSION = "collective.gspreadsyncmanager: Profile sync"
+PROFILE_PARAMETER = "profile"
+MEMORY_PARAMETER = "profile_memory"
+
+PROFILE_DIRECTORY_ENVIRONMENT_VARIABLE = "GSPREADSYNC_PROFILE_DIRECTORY"
+DEFAULT_PROFILE_DIRECTORY = os.path.join(tempfile.gettempdir(), "collective.gspreadsyncmanager-profiles")
+
+PROFILE_RETENTION = 20 # profiles kept on disk
+REPORT_FUNCTIONS = 40
+REPORT_ALLOCATIONS = 10
+
+PROFILE_EXTENSION = ".prof"
+REPORT_EXTENSION = ".txt"
+PROFILE_FILENAME = re.compile(r"^[\w.-]+\.(prof|txt)$")
+
+
+def get_profile_directory():
+    return os.environ.get(PROFILE_DIRECTORY_ENVIRONMENT_VARIABLE, None) or DEFAULT_PROFILE_DIRECTORY
+
+def format_size(size):
+    return "%.1f MB" %(size / 1048576.0)
+
+
+class MemoryPhases(object):
+    #
+    # tracemalloc statistics per sync phase of the profiled thread.
+    # Used as a phase listener of the sync metrics. A snapshot is taken the
+    # first time a phase ends and compared with the snapshot before it.
+    #
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.phases = OrderedDict()
+        self.snapshots = []
+        self.was_tracing = False
+
+    def start(self):
+        self.was_tracing = tracemalloc.is_tracing()
+        if not self.was_tracing:
+            tracemalloc.start()
+        self.snapshots.append(("start", tracemalloc.take_snapshot()))
+
+    def stop(self):
+        self.snapshots.append(("end", tracemalloc.take_snapshot()))
+        if not self.was_tracing:
+            tracemalloc.stop()
+
+    def __call__(self, phase, duration):
+        if threading.get_ident() != self.thread_id:
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        stats = self.phases.get(phase, None)
+        if stats is None:
+            stats = self.phases[phase] = {'count': 0, 'seconds': 0.0, 'current': 0, 'peak': 0}
+            self.snapshots.append((phase, tracemalloc.take_snapshot()))
+
+        stats['count'] += 1
+        stats['seconds'] += duration
+        stats['current'] = current
+        stats['peak'] = max(stats['peak'], peak)
+
+    def get_report(self):
+        lines = ["Memory per phase", ""]
+        for phase, stats in self.phases.items():
+            lines.append("%-16s %6s times %8.2fs  traced %10s  peak %10s" %(phase, stats['count'], stats['seconds'], format_size(stats['current']), format_size(stats['peak'])))
+
+        for (previous_name, previous), (name, snapshot) in zip(self.snapshots, self.snapshots[1:]):
+            lines.extend(["", "Allocations from '%s' to '%s'" %(previous_name, name), ""])
+            for statistic in snapshot.compare_to(previous, 'lineno')[:REPORT_ALLOCATIONS]:
+                lines.append("%s" %(statistic))
+
+        return "\n".join(lines)
+
+
+class SyncProfiler(object):
+    #
+    # Runs a sync in cProfile and saves '<profile id>.prof', readable with
+    # pstats or snakeviz, and a '<profile id>.txt' report.
+    # Only the newest 'retention' profiles are kept.
+    #
+    def __init__(self, name, memory=False, directory=None, retention=PROFILE_RETENTION, details=None):
+        self.name = name
+        self.memory = memory
+        self.directory = directory or get_profile_directory()
+        self.retention = retention
+        self.details = details or {}
+        self.profile_id = "%s-%s-%s" %(datetime.now().strftime("%Y%m%d-%H%M%S"), re.sub(r"[^\w-]", "_", name), uuid.uuid4().hex[:6])
+
+    def run(self, function, *args, **kwargs):
+        profile = cProfile.Profile()
+        memory_phases = MemoryPhases() if self.memory else None
+
+        try:
+            profile.enable()
+        except ValueError as err:
+            # Another profiler is active in this thread
+            logger("[Warning] Sync '%s' cannot be profiled." %(self.name), err)
+            return function(*args, **kwargs)
+
+        if memory_phases:
+            memory_phases.start()
+            get_metrics().add_listener(memory_phases)
+
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            duration = time.time() - start
+
+            if memory_phases:
+                get_metrics().remove_listener(memory_phases)
+                memory_phases.stop()
+
+            self.save(profile, memory_phases, duration)
+
+    def save(self, profile, memory_phases, duration):
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            profile_path = os.path.join(self.directory, self.profile_id + PROFILE_EXTENSION)
+            profile.dump_stats(profile_path)
+
+            with open(os.path.join(self.directory, self.profile_id + REPORT_EXTENSION), 'w') as report_file:
+                report_file.write(self.get_report(profile, memory_phases, duration))
+
+            logger("[Status] Profile of sync '%s' is saved in %s" %(self.name, profile_path))
+            remove_old_profiles(self.directory, self.retention)
+        except Exception as err:
+            logger("[Error] Profile of sync '%s' cannot be saved." %(self.name), err)
+
+    def get_report(self, profile, memory_phases, duration):
+        lines = ["Sync: %s" %(self.name), "Duration: %.2fs" %(duration)]
+        for name, value in sorted(self.details.items()):
+            lines.append("%s: %s" %(name.capitalize(), value))
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(REPORT_FUNCTIONS)
+        lines.extend(["", stream.getvalue()])
+
+        if memory_phases:
+            lines.append(memory_phases.get_report())
+
+        return "\n".join(lines) + "\n"
+
+
+#
+# Saved profiles
+#
+def get_profiles(directory=None):
+    # Saved profiles, newest first
+    directory = directory or get_profile_directory()
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for filename in os.listdir(directory):
+        if not filename.endswith(PROFILE_EXTENSION):
+            continue
+
+        profile_id = filename[:-len(PROFILE_EXTENSION)]
+        profile_path = os.path.join(directory, filename)
+        report_filename = profile_id + REPORT_EXTENSION
+        modified = os.path.getmtime(profile_path)
+
+        profiles.append({
+            'profile_id': profile_id,
+            'created': datetime.fromtimestamp(modified).strftime("%Y-%m-%d %H:%M:%S"),
+            'modified': modified,
+            'size': os.path.getsize(profile_path),
+            'profile_file': filename,
+            'report_file': report_filename if os.path.exists(os.path.join(directory, report_filename)) else None
+        })
+
+    return sorted(profiles, key=lambda profile: profile['modified'], reverse=True)
+
+def remove_old_profiles(directory, retention=PROFILE_RETENTION):
+    for profile in get_profiles(directory)[retention:]:
+        for filename in (profile['profile_file'], profile['report_file']):
+            if filename:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError as err:
+                    logger("[Warning] Old profile '%s' cannot be removed." %(filename), err)
+
+def get_profile_path(filename, directory=None):
+    # Path of a saved profile file, or None for unknown or unsafe names
+    if not filename or not PROFILE_FILENAME.match(filename):
+        return None
+
+    path = os.path.join(directory or get_profile_directory(), filename)
+    if not os.path.isfile(path):
+        return None
+    return path
+
+
+#
+# Sync views
+#
+def is_profiling_requested(context, request):
+    if not str2bool(request.form.get(PROFILE_PARAMETER, False)):
+        return False
+
+    if not getSecurityManager().checkPermission(PROFILE_PERMISSION, context):
+        logger("[Warning] Profiling is requested without the '%s' permission. The sync is not profiled." %(PROFILE_PERMISSION), "Unauthorized")
+        return False
+
+    return True
+
+def run_profiled(context, request, name, function):
+    # Runs 'function' of a sync view, in the profiler when it is requested
+    if not is_profiling_requested(context, request):
+        return function()
+
+    details = {
+        'url': request.get('ACTUAL_URL', ''),
+        'user': getSecurityManager().getUser().getId()
+    }
+    profiler = SyncProfiler(name, memory=str2bool(request.form.get(MEMORY_PARAMETER, False)), details=details)
+    return profiler.run(function)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# In-memory progress of the running syncs.
+# Nothing is written to the database, so the progress view is cheap to poll.
+#
+import time
+import threading
+
+COUNTERS = ('seen', 'created', 'updated', 'skipped', 'unpublished', 'failed')
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+FINISHED_SYNCS_LIMIT = 10
+
+
+class SyncProgress(object):
+    #
+    # Counters of one sync. 'total' is the number of rows when it is known,
+    # which is not the case for streamed syncs.
+    #
+    def __init__(self, sync_type, total=None):
+        self.sync_type = sync_type
+        self.total = total
+        self.lock = threading.Lock()
+        self.counts = dict((counter, 0) for counter in COUNTERS)
+        self.status = STATUS_RUNNING
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counts[counter] += amount
+
+    def finish(self, status=STATUS_DONE, error=None):
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+
+    def get_elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def get_rows_per_second(self):
+        elapsed = self.get_elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return self.counts['seen'] / elapsed
+
+    def get_eta(self):
+        # Seconds until all rows are seen, at the current rate
+        if self.status != STATUS_RUNNING or not self.total:
+            return None
+        rows_per_second = self.get_rows_per_second()
+        if not rows_per_second:
+            return None
+        return max(self.total - self.counts['seen'], 0) / rows_per_second
+
+    def to_dict(self):
+        with self.lock:
+            counts = dict(self.counts)
+
+        progress = {
+            'sync_type': self.sync_type,
+            'status': self.status,
+            'error': self.error,
+            'total': self.total,
+            'started': self.started,
+            'finished': self.finished,
+            'elapsed': self.get_elapsed(),
+            'rows_per_second': self.get_rows_per_second(),
+            'eta': self.get_eta()
+        }
+        progress.update(counts)
+        return progress
+
+
+class ProgressTracker(object):
+    #
+    # Running and recently finished syncs of this process
+    #
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.finished = []
+
+    def start(self, sync_type, total=None):
+        progress = SyncProgress(sync_type, total)
+        with self.lock:
+            self.running[id(progress)] = progress
+        return progress
+
+    def finish(self, progress, status=STATUS_DONE, error=None):
+        progress.finish(status, error)
+        with self.lock:
+            self.running.pop(id(progress), None)
+            self.finished = ([progress] + self.finished)[:FINISHED_SYNCS_LIMIT]
+        return progress
+
+    def to_dict(self):
+        with self.lock:
+            running = list(self.running.values())
+            finished = list(self.finished)
+
+        return {
+            'running': [progress.to_dict() for progress in running],
+            'finished': [progress.to_dict() for progress in finished]
+        }
+
+
+_progress_tracker = ProgressTracker()
+
+def get_progress_tracker():
+    return _progress_tracker
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Sharded full syncs across ZEO clients.
+# Rows are assigned to a shard by a stable hash of their ID. The coordinator
+# runs as a sync job, requests the shard view on every client at the same
+# time, merges the results and runs the unpublish pass once.
+#
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Logging module
+from .logging.logging import logger
+
+# Pooled HTTP sessions
+from .http_sessions import get_single_attempt_session_pool
+
+# Sync progress
+from .progress import COUNTERS
+
+# Site URLs of the ZEO clients, separated by commas
+SHARD_URLS_ENVIRONMENT_VARIABLE = "GSPREADSYNC_SHARD_URLS"
+
+# Headers of the coordinator request that authenticate the shard requests
+FORWARDED_HEADERS = ("Cookie", "Authorization")
+
+
+def get_shard_index(item_id, shard_count):
+    # Stable across processes and restarts, unlike hash()
+    digest = hashlib.sha1(("%s" %(item_id)).encode('utf-8')).hexdigest()
+    return int(digest, 16) % shard_count
+
+def is_in_shard(item_id, shard):
+    if not shard:
+        return True
+    shard_index, shard_count = shard
+    return get_shard_index(item_id, shard_count) == shard_index
+
+def get_shard_urls():
+    shard_urls = os.environ.get(SHARD_URLS_ENVIRONMENT_VARIABLE, "")
+    return [url.strip().rstrip("/") for url in shard_urls.split(",") if url.strip()]
+
+def get_forwarded_headers(request):
+    headers = {}
+    for header in FORWARDED_HEADERS:
+        value = request.getHeader(header, None)
+        if value:
+            headers[header] = value
+    return headers
+
+def request_shard(site_url, view_name, shard_index, shard_count, headers):
+    url = "%s/%s" %(site_url, view_name)
+    start = time.time()
+    try:
+        # A shard can take minutes, so the request has no read timeout.
+        # It is never retried, as a retry would sync the shard again.
+        response = get_single_attempt_session_pool().get(url, params={'shard': shard_index, 'shards': shard_count}, headers=headers, timeout=None)
+        response.raise_for_status()
+        result = response.json()
+    except Exception as err:
+        logger("[Error] Shard %s of %s failed. URL: %s" %(shard_index, shard_count, url), err)
+        result = {'status': 'failed', 'error': str(err)}
+
+    result.update({'shard': shard_index, 'url': site_url, 'duration': time.time() - start})
+    return result
+
+def run_shards(shard_urls, view_name, headers=None):
+    # Runs one shard per client URL and returns the merged results
+    shard_count = len(shard_urls)
+    with ThreadPoolExecutor(max_workers=shard_count) as executor:
+        futures = [executor.submit(request_shard, site_url, view_name, shard_index, shard_count, headers or {}) for shard_index, site_url in enumerate(shard_urls)]
+        results = [future.result() for future in futures]
+
+    return merge_shard_results(results)
+
+def merge_shard_results(results):
+    merged = {
+        'shards': results,
+        'failed_shards': [result['shard'] for result in results if result.get('status') != 'done'],
+        'duration': max([result['duration'] for result in results] or [0])
+    }
+    for counter in COUNTERS:
+        merged[counter] = sum([result.get(counter, 0) for result in results])
+    return merged
+
+def get_shard_parameters(request):
+    # (shard index, shard count) of a shard request
+    shard_index = int(request.form.get('shard', 0))
+    shard_count = int(request.form.get('shards', 1))
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError("Invalid shard %s of %s" %(shard_index, shard_count))
+    return (shard_index, shard_count)
+
+def dump_result(request, result):
+    request.response.setHeader("Content-Type", "application/json")
+    return json.dumps(result)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Sync jobs run by the background sync queue.
+# Every runner is called with the site and the job, inside the site
+# of the worker's own ZODB connection.
+#
+
+import transaction
+
+# Product dependencies
+from .api_modules.gsheets.persons.gsheets_api_connection import APIConnection as APIConnectionPersons
+from .api_modules.gsheets.organizations.gsheets_api_connection import APIConnection as APIConnectionOrganizations
+from .sync_manager_persons import SyncManager as SyncManagerPersons
+from .sync_manager_organizations import SyncManager as SyncManagerOrganizations
+from .mapping_cores.gsheets.mapping_core import CORE as SYNC_CORE
+from .mapping_cores.gsheets.mapping_core import CORE_ORGANIZATIONS as SYNC_CORE_ORGANIZATIONS
+
+# Logging module
+from .logging.logging import logger
+
+# Sharded full syncs
+from .sharding import get_shard_urls, run_shards, SHARD_URLS_ENVIRONMENT_VARIABLE
+
+# Utils
+from .utils import get_api_settings, get_api_settings_persons
+
+# Number of objects committed per transaction during a full sync
+FULL_SYNC_BATCH_SIZE = 50
+
+JOB_SYNC_PERSON = "sync_person"
+JOB_SYNC_ALL_PERSONS = "sync_all_persons"
+JOB_SYNC_ORGANIZATION = "sync_organization"
+JOB_SYNC_ALL_ORGANIZATIONS = "sync_all_organizations"
+JOB_SYNC_ALL_PERSONS_SHARDED = "sync_all_persons_sharded"
+JOB_SYNC_ALL_ORGANIZATIONS_SHARDED = "sync_all_organizations_sharded"
+
+
+def get_persons_sync_manager(**options):
+    api_connection = APIConnectionPersons(get_api_settings_persons())
+    sync_options = {"api": api_connection, 'core': SYNC_CORE}
+    sync_options.update(options)
+    return SyncManagerPersons(sync_options)
+
+def get_organizations_sync_manager(**options):
+    api_connection = APIConnectionOrganizations(get_api_settings())
+    sync_options = {"api": api_connection, 'core': SYNC_CORE_ORGANIZATIONS}
+    sync_options.update(options)
+    return SyncManagerOrganizations(sync_options)
+
+def sync_person(site, job):
+    logger("[Status] Start queued update of person ID '%s'." %(job.item_id))
+    sync_manager = get_persons_sync_manager()
+    sync_manager.update_person_by_id(person_id=job.item_id)
+    logger("[Status] Finished queued update of person ID '%s'." %(job.item_id))
+
+def sync_all_persons(site, job):
+    logger("[Status] Start queued update of all persons.")
+    sync_manager = get_persons_sync_manager(batch_size=FULL_SYNC_BATCH_SIZE)
+    sync_manager.update_persons(create_and_unpublish=True)
+    logger("[Status] Finished queued update of all persons.")
+
+def sync_all_persons_sharded(site, job):
+    shard_urls = get_configured_shard_urls()
+    logger("[Status] Start queued sharded update of all persons in %s shards." %(len(shard_urls)))
+    results = run_shards(shard_urls, "@@sync_persons_shard", job.headers)
+
+    # See the changes committed by the shards before unpublishing
+    transaction.abort()
+
+    sync_manager = get_persons_sync_manager(batch_size=FULL_SYNC_BATCH_SIZE)
+    unpublished_persons = sync_manager.unpublish_missing_persons()
+    logger("[Status] Finished queued sharded update of all persons in %.2fs." %(results['duration']))
+
+    check_shard_results(results)
+
+def sync_organization(site, job):
+    logger("[Status] Start queued update of organization ID '%s'." %(job.item_id))
+    sync_manager = get_organizations_sync_manager()
+    sync_manager.update_organization_by_id(organization_id=job.item_id)
+    logger("[Status] Finished queued update of organization ID '%s'." %(job.item_id))
+
+def sync_all_organizations(site, job):
+    logger("[Status] Start queued update of all organizations.")
+    sync_manager = get_organizations_sync_manager(batch_size=FULL_SYNC_BATCH_SIZE)
+    sync_manager.update_organizations(create_and_unpublish=True)
+    logger("[Status] Finished queued update of all organizations.")
+
+def sync_all_organizations_sharded(site, job):
+    shard_urls = get_configured_shard_urls()
+    logger("[Status] Start queued sharded update of all organizations in %s shards." %(len(shard_urls)))
+    results = run_shards(shard_urls, "@@sync_organizations_shard", job.headers)
+
+    # See the changes committed by the shards before unpublishing
+    transaction.abort()
+
+    sync_manager = get_organizations_sync_manager(batch_size=FULL_SYNC_BATCH_SIZE)
+    unpublished_organizations = sync_manager.unpublish_missing_organizations()
+    logger("[Status] Finished queued sharded update of all organizations in %.2fs." %(results['duration']))
+
+    check_shard_results(results)
+
+def get_configured_shard_urls():
+    shard_urls = get_shard_urls()
+    if not shard_urls:
+        raise ValueError("Sharded sync is not configured. Set the %s environment variable." %(SHARD_URLS_ENVIRONMENT_VARIABLE))
+    return shard_urls
+
+def check_shard_results(results):
+    # The job fails when a shard failed
+    if results['failed_shards']:
+        raise RuntimeError("Shards %s failed." %(", ".join([str(shard) for shard in results['failed_shards']])))
+
+
+JOB_RUNNERS = {
+    JOB_SYNC_PERSON: sync_person,
+    JOB_SYNC_ALL_PERSONS: sync_all_persons,
+    JOB_SYNC_ORGANIZATION: sync_organization,
+    JOB_SYNC_ALL_ORGANIZATIONS: sync_all_organizations,
+    JOB_SYNC_ALL_PERSONS_SHARDED: sync_all_persons_sharded,
+    JOB_SYNC_ALL_ORGANIZATIONS_SHARDED: sync_all_organizations_sharded
+}
+
+# Jobs of a type that run at the same time
+JOB_CONCURRENCY = {
+    JOB_SYNC_PERSON: 2,
+    JOB_SYNC_ORGANIZATION: 2,
+    JOB_SYNC_ALL_PERSONS: 1,
+    JOB_SYNC_ALL_ORGANIZATIONS: 1,
+    JOB_SYNC_ALL_PERSONS_SHARDED: 1,
+    JOB_SYNC_ALL_ORGANIZATIONS_SHARDED: 1
+}
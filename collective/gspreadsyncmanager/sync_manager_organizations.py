@@ -7,7 +7,6 @@
 from email.mime import image
 import plone.api
 import transaction
-import requests
 from zope.component import queryAdapter, queryMultiAdapter
 from plone.uuid.interfaces import IUUID
 from zope import event
@@ -34,11 +33,44 @@ from zope.component import queryUtility
 from .error_handling.error import raise_error
 
 # Logging module
-from .logging.logging import logger
+from .logging.logging import logger, flush_logs
+
+# Batched transactions
+from .batch_commit import BatchCommitter
+
+# Field diffing
+from .field_diff import FieldChanges, SUBJECTS_FIELD
+
+# Compiled fields mapping
+from .field_plan import build_field_plan
+
+# Row fingerprints
+from .fingerprints import FingerprintStore
+
+# Parallel image downloads
+from .image_prefetch import ImagePrefetcher
+
+# Image cache
+from .image_cache import get_image_cache, is_same_image
+
+# Pooled HTTP sessions
+from .http_sessions import get_session_pool
+
+# Sharded syncs
+from .sharding import is_in_shard
+
+# Sync metrics
+from .metrics import time_phase
+
+# Sync progress
+from .progress import SyncProgress, get_progress_tracker, STATUS_FAILED
+
+# Sync plans
+from .sync_plan import SyncPlan, SyncOperation, get_creation_diffs, OPERATION_CREATE, OPERATION_UPDATE, OPERATION_UNPUBLISH, OPERATION_SKIP, OPERATION_COUNTERS
 
 # Utils
 from .utils import str2bool, normalize_id, phonenumber_to_id
-from .utils import get_datetime_today, get_datetime_future, DATE_FORMAT
+from .utils import get_datetime_today, get_datetime_future, iter_chunks, DATE_FORMAT
 
 class SyncManager(object):
     #
@@ -60,22 +92,80 @@ class SyncManager(object):
 
     TAXONOMY_NAME = "taxonomy_cultural_organizations" # TODO: should come from settings
 
+    # Subjects that are kept when the subjects are synced
+    PRESERVED_SUBJECTS = ('frontpage', 'main-organization-page')
+
+    # Catalog indexes that depend on the synced Plone fields
+    REINDEX_MAPPING = {
+        "title": ["Title", "sortable_title", "SearchableText"],
+        "subject": ["Subject", "SearchableText"],
+        "country": ["country"],
+        "organization_id": ["organization_id"],
+        "google_ads_id": ["organization_id"],
+        "review_state": ["review_state"]
+    }
+
+    # Changed fields that need a full reindex, as the catalog metadata
+    # of the image scales is only refreshed then
+    FULL_REINDEX_FIELDS = ('preview_image',)
+
 
     def __init__(self, options):
         self.options = options
         self.gsheets_api = self.options['api']
         self.CORE = self.options['core']
 
+        # Ordered (API field, Plone field, transform) entries of the core
+        self.field_plan = build_field_plan(self.CORE, self.get_special_fields_handlers())
+
         #self.taxonomy_utility = queryUtility(ITaxonomy, name='collective.taxonomy.cultural_organizations')
         self.taxonomy_data = None #self.taxonomy_utility.data
 
+        # Objects already resolved in the chunk that is synced, keyed by organization ID
+        self.resolved_organizations = {}
+
+        # Plone fields changed by the last update
+        self.changed_fields = []
+
+        # Rows with the same fingerprint as the last sync are skipped
+        self.fingerprints = FingerprintStore("organizations")
+        self.skip_unchanged = self.options.get('skip_unchanged', True)
+
+        # Keep-alive HTTP connections shared by all image downloads
+        self.http_session = self.options.get('http_session', None) or get_session_pool()
+
+        # Downloaded pictures are cached on disk by Drive file ID
+        self.image_cache = self.options.get('image_cache', None) or get_image_cache()
+
+        # Pictures are downloaded in parallel before the rows are synced,
+        # 'prefetch_window' rows at a time
+        self.image_prefetcher = ImagePrefetcher(self.download_image_by_id, max_workers=self.options.get('image_workers', ImagePrefetcher.DEFAULT_MAX_WORKERS))
+        self.prefetch_window = self.options.get('prefetch_window', ImagePrefetcher.DEFAULT_PREFETCH_WINDOW)
+
+        # Only the rows of this (shard index, shard count) are synced.
+        # The coordinator of a sharded sync unpublishes the missing organizations once.
+        self.shard = self.options.get('shard', None)
+        self.unpublish_missing = self.options.get('unpublish_missing', True)
+
+        # Dry runs only plan the sync, so pictures are not downloaded
+        self.dry_run = self.options.get('dry_run', False)
+
+        # Counters of the running full sync, replaced by a tracked progress in update_organizations
+        self.progress = SyncProgress("organizations")
+
+        # Commit the transaction every 'batch_size' synced objects
+        self.committer = BatchCommitter(
+            batch_size=self.options.get('batch_size', BatchCommitter.DEFAULT_BATCH_SIZE),
+            conflict_retries=self.options.get('conflict_retries', BatchCommitter.DEFAULT_CONFLICT_RETRIES)
+        )
+
     #
     # Sync operations 
     #
-    def update_organization_by_id(self, organization_id, organization_data=None, translate=True):
+    def update_organization_by_id(self, organization_id, organization_data=None, translate=True, organization_brain=None):
 
         if organization_id:
-            organization = self.find_organization(organization_id)
+            organization = self.resolve_organization(organization_id, organization_brain)
 
             if not organization_data:
                 organization_data = self.gsheets_api.get_organization_by_id(organization_id)
@@ -90,18 +180,36 @@ class SyncManager(object):
             return None
 
     def update_organizations(self, create_and_unpublish=False):
-        organization_list = self.gsheets_api.get_all_organizations()
-        
-        if create_and_unpublish:
-            website_organizations = self.get_all_organizations()
-            self.sync_organization_list(organization_list, website_organizations)
+        if getattr(self.gsheets_api, 'streaming', False):
+            # Rows are synced while the next windows are downloaded
+            organization_list = self.gsheets_api.stream_all_organizations()
         else:
-            self.update_organization_list(organization_list)
+            organization_list = self.gsheets_api.get_all_organizations()
 
-        cache_invalidated = self.invalidate_cache()
-        
-        transaction.get().commit()
-        
+        # The total number of rows is unknown while streaming
+        total = len(organization_list) if isinstance(organization_list, dict) else None
+        progress_tracker = get_progress_tracker()
+        self.progress = progress_tracker.start("organizations", total)
+
+        try:
+            website_organizations = self.get_all_organizations()
+
+            if create_and_unpublish:
+                self.sync_organization_list(organization_list, website_organizations)
+            else:
+                self.update_organization_list(organization_list, website_organizations)
+
+            cache_invalidated = self.invalidate_cache()
+
+            self.committer.commit()
+        except Exception as err:
+            progress_tracker.finish(self.progress, STATUS_FAILED, str(err))
+            raise
+        finally:
+            # Repeated warnings of this sync are reported now
+            flush_logs()
+
+        progress_tracker.finish(self.progress)
         return organization_list
 
     #
@@ -109,8 +217,8 @@ class SyncManager(object):
     #
 
     # UPDATE
-    def update_organization(self, organization_id, organization, organization_data, translate=True):
-        updated_organization = self.update_all_fields(organization, organization_data)
+    def update_organization(self, organization_id, organization, organization_data, translate=True, changes=None):
+        updated_organization = self.update_all_fields(organization, organization_data, changes)
 
         updated_organization = self.publish_based_on_current_state(organization)
 
@@ -120,7 +228,12 @@ class SyncManager(object):
 
         organization = self.validate_organization_data(organization, organization_data)
 
-        logger("[Status] Organization with ID '%s' is now updated. URL: %s" %(organization_id, organization.absolute_url()))
+        self.fingerprints.set(self.safe_value(organization_id), organization_data.get('_fingerprint', None))
+
+        if self.changed_fields:
+            logger("[Status] Organization with ID '%s' is now updated. URL: %s" %(organization_id, organization.absolute_url()))
+        else:
+            logger("[Status] Organization with ID '%s' is unchanged. URL: %s" %(organization_id, organization.absolute_url()))
         return updated_organization
 
 
@@ -160,13 +273,15 @@ class SyncManager(object):
         return translated_organization
 
     def copy_fields_to_translation(self, organization, translated_organization):
+        changes = FieldChanges(translated_organization)
 
         for fieldname in self.TRANSLATABLE_FIELDS:
-            setattr(translated_organization, fieldname, getattr(organization, fieldname, ''))
+            changes.set(fieldname, getattr(organization, fieldname, ''))
 
         original_subjects = organization.Subject()
-        translated_organization.setSubject(original_subjects)
+        changes.set_subjects(original_subjects)
 
+        self.changed_fields = changes.apply()
         return translated_organization
 
 
@@ -175,17 +290,16 @@ class SyncManager(object):
         if not organization_data:
             organization_data = self.gsheets_api.get_organization_by_id(organization_id)
         
-        try:
-            title = organization_data['name']
-            new_organization_id = normalize_id(title)
-
-            container = self.get_container()
-            new_organization = plone.api.content.create(container=container, type=self.DEFAULT_CONTENT_TYPE, id=new_organization_id, safe_id=True, title=title)
-            logger("[Status] Organization with ID '%s' is now created. URL: %s" %(organization_id, new_organization.absolute_url()))
-            updated_organization = self.update_organization(organization_id, new_organization, organization_data)
-        except Exception as err:
-            logger("[Error] Error while creating the organization ID '%s'" %(organization_id), err)
-            return None
+        # Errors are raised to the caller, so the savepoint of the batch
+        # can roll back a partially created organization
+        title = organization_data['name']
+        new_organization_id = normalize_id(title)
+
+        container = self.get_container()
+        new_organization = plone.api.content.create(container=container, type=self.DEFAULT_CONTENT_TYPE, id=new_organization_id, safe_id=True, title=title)
+        logger("[Status] Organization with ID '%s' is now created. URL: %s" %(organization_id, new_organization.absolute_url()))
+        updated_organization = self.update_organization(organization_id, new_organization, organization_data)
+        return updated_organization
     
     def create_new_organizations(self, organizations_data, website_data):
         new_organizations = [api_id for api_id in organizations_data.keys() if api_id not in website_data.keys()]
@@ -194,60 +308,264 @@ class SyncManager(object):
 
     # CREATE OR UPDATE
     def sync_organization_list(self, organization_list, website_organizations):
+        return self.plan_and_apply_organization_list(organization_list, website_organizations, create_and_unpublish=True)
 
+    def update_organization_list(self, organization_list, website_organizations=None):
+        return self.plan_and_apply_organization_list(organization_list, website_organizations or [], create_and_unpublish=False)
+
+    def plan_and_apply_organization_list(self, organization_list, website_organizations, create_and_unpublish=True):
+        # Every chunk is planned while nothing is written and is then applied
+        # and committed, so no write transaction waits on the downloads
         website_data = self.build_website_data_dict(website_organizations)
+        seen_ids = set()
+        skipped_organizations = 0
 
-        for organization in organization_list.values():
-            organization_id = str(organization.get('_id', ''))
+        for organization_chunk in iter_chunks(self.get_organization_records(organization_list), self.prefetch_window):
+            self.prefetch_organization_images(organization_chunk, website_data)
+            organization_plan = self.apply_plan(self.plan_organization_chunk(organization_chunk, website_data, create_and_unpublish, seen_ids))
+            self.clear_chunk()
+            skipped_organizations += organization_plan.counts[OPERATION_SKIP]
 
-            if organization_id:
-                # Update
-                if organization_id in website_data.keys():
-                    consume_organization = website_data.pop(organization_id)
-                    try:
-                        organization_data = self.update_organization_by_id(organization_id, organization)
-                    except Exception as err:
-                        logger("[Error] Error while updating the organization ID: %s" %(organization_id), err)
-                # Create
-                else:
-                    try:
-                        new_organization = self.create_organization(organization_id, organization)
-                    except Exception as err:
-                        logger("[Error] Error while creating the organization ID: '%s'" %(organization_id), err)
-            else:
-                # TODO: log error
-                pass
-        
-        if len(website_data.keys()) > 0:
-            unpublished_organizations = [self.unpublish_organization(organization_brain.getObject()) for organization_brain in website_data.values()]
+        if create_and_unpublish and self.unpublish_missing and len(website_data.keys()) > 0:
+            self.bulk_unpublish_organizations(website_data)
 
+        if skipped_organizations:
+            logger("[Status] %s unchanged organizations are skipped." %(skipped_organizations))
         return organization_list
 
-    def update_organization_list(self, organization_list):
-        for organization in organization_list.values():
-            organization_id = organization.get('_id', '')
+    #
+    # Plan and apply
+    #
+    def plan_organizations(self, create_and_unpublish=True):
+        # Read-only plan of a full sync with the field-level diffs of every row
+        if getattr(self.gsheets_api, 'streaming', False):
+            organization_list = self.gsheets_api.stream_all_organizations()
+        else:
+            organization_list = self.gsheets_api.get_all_organizations()
+
+        website_data = self.build_website_data_dict(self.get_all_organizations())
+        plan = SyncPlan("organizations")
+        seen_ids = set()
+
+        for organization_chunk in iter_chunks(self.get_organization_records(organization_list), self.prefetch_window):
+            self.prefetch_organization_images(organization_chunk, website_data)
+            plan.extend(self.plan_organization_chunk(organization_chunk, website_data, create_and_unpublish, seen_ids))
+            self.clear_chunk()
+
+        if create_and_unpublish and self.unpublish_missing:
+            plan.extend(self.plan_unpublish_organizations(website_data))
+
+        return plan
+
+    def clear_chunk(self):
+        # Objects and pictures are only kept while their chunk is synced,
+        # repeated IDs are found with the IDs in 'seen_ids'
+        self.resolved_organizations = {}
+        self.image_prefetcher.clear()
+
+    def plan_organization_chunk(self, organization_records, website_data, create_and_unpublish=True, seen_ids=None):
+        plan = SyncPlan("organizations")
+        for organization in organization_records:
+            organization_operation = plan.add(self.plan_organization(organization, website_data, create_and_unpublish, seen_ids))
+            if self.dry_run:
+                # Staged changes are only kept to be applied
+                organization_operation.changes = None
+        return plan
+
+    def plan_organization(self, organization_data, website_data, create_and_unpublish=True, seen_ids=None):
+        organization_id = str(organization_data.get('_id', ''))
+        if not organization_id:
+            return SyncOperation(OPERATION_SKIP, organization_id, data=organization_data, reason="The row has no organization ID.")
+
+        # Streamed rows are not merged by ID, so only the first row of an ID is synced
+        if seen_ids is not None:
+            if organization_id in seen_ids:
+                logger("[Warning] Organization ID '%s' is repeated in the spreadsheet. The row is skipped." %(organization_id), "Duplicated ID")
+                return SyncOperation(OPERATION_SKIP, organization_id, data=organization_data, reason="The organization ID is repeated in the spreadsheet.")
+            seen_ids.add(organization_id)
+
+        if create_and_unpublish:
+            organization_brain = website_data.pop(organization_id, None)
+            if organization_brain is None:
+                return SyncOperation(OPERATION_CREATE, organization_id, data=organization_data, diffs=get_creation_diffs(self.field_plan, organization_data))
+        else:
+            organization_brain = website_data.get(organization_id)
+
+        if organization_brain is not None and self.is_unchanged_organization(organization_id, organization_data):
+            return SyncOperation(OPERATION_SKIP, organization_id, data=organization_data, brain=organization_brain, reason="The row is unchanged since the last sync.")
+
+        try:
+            organization = self.resolve_organization(organization_id, organization_brain)
+            changes = self.stage_all_fields(organization, organization_data)
+            diffs = changes.get_diffs()
+            diffs.update(self.get_state_diff(organization, changes))
+        except Exception as err:
+            return SyncOperation(OPERATION_UPDATE, organization_id, data=organization_data, brain=organization_brain, error=str(err))
+
+        return SyncOperation(OPERATION_UPDATE, organization_id, data=organization_data, brain=organization_brain, changes=changes, diffs=diffs)
+
+    def plan_unpublish_organizations(self, website_data):
+        # Organizations keep their review state when they are missing in the
+        # spreadsheet, see unpublish_organization, so nothing is planned
+        plan = SyncPlan("organizations")
+        if website_data:
+            logger("[Status] %s organizations are missing in the spreadsheet. Organizations are not unpublished." %(len(website_data)))
+        return plan
+
+    def bulk_unpublish_organizations(self, website_data):
+        # Only the fingerprints of the missing organizations are removed,
+        # without loading the organizations
+        for organization_id in website_data.keys():
+            # The row needs a full sync again when it comes back in the spreadsheet
+            self.fingerprints.remove(organization_id)
+        return self.apply_plan(self.plan_unpublish_organizations(website_data))
+
+    def apply_plan(self, plan):
+        # Runs the planned operations in batches of short write transactions
+        for organization_operation in plan:
+            if organization_operation.operation != OPERATION_UNPUBLISH:
+                self.progress.increment('seen')
+
+            if organization_operation.error:
+                self.progress.increment('failed')
+                logger("[Error] Error while planning the sync for the organization ID: '%s'" %(organization_operation.item_id), organization_operation.error)
+                continue
+
+            if organization_operation.operation == OPERATION_SKIP:
+                self.progress.increment('skipped')
+                continue
+
             try:
-                organization_data = self.update_organization_by_id(organization_id, organization)
+                self.committer.add(self.apply_organization_operation, organization_operation)
             except Exception as err:
-                logger("[Error] Error while requesting the sync for the organization ID: '%s'" %(organization_id), err)
-        
-        return organization_list
+                self.progress.increment('failed')
+                logger("[Error] Error while applying the %s of the organization ID: '%s'" %(organization_operation.operation, organization_operation.item_id), err)
+                continue
+
+            if self.committer.is_full():
+                self.commit_batch()
+
+        self.commit_batch()
+        return plan
+
+    def commit_batch(self):
+        # Only the operations of a committed batch are counted as applied
+        committed, failed = self.committer.commit()
+        for operation, args, kwargs in committed:
+            self.progress.increment(OPERATION_COUNTERS[args[0].operation])
+        for operation, args, kwargs in failed:
+            self.progress.increment('failed')
+            logger("[Error] The %s of the organization ID '%s' is not committed." %(args[0].operation, args[0].item_id), "Batch not committed")
+        return committed
+
+    def apply_organization_operation(self, organization_operation):
+        if organization_operation.operation == OPERATION_CREATE:
+            return self.create_organization(organization_operation.item_id, organization_operation.data)
+
+        if organization_operation.operation == OPERATION_UNPUBLISH:
+            return self.unpublish_missing_organization(organization_operation.item_id, organization_operation.brain)
+
+        # The planned changes are only applied once. A batch that is replayed
+        # after a conflict stages them again, as the images of the planned
+        # changes were created in the aborted transaction.
+        changes, organization_operation.changes = organization_operation.changes, None
+
+        organization = self.resolve_organization(organization_operation.item_id, organization_operation.brain)
+        return self.update_organization(organization_operation.item_id, organization, organization_operation.data, changes=changes)
+
+    def is_unchanged_organization(self, organization_id, organization_data):
+        # Compares the row with the fingerprint of the last sync,
+        # without loading the organization from the database
+        if not self.skip_unchanged:
+            return False
+        return self.fingerprints.is_unchanged(self.safe_value(organization_id), organization_data.get('_fingerprint', None))
+
+    def get_organization_records(self, organization_list):
+        # Spreadsheet data is either a dict by ID or a stream of rows
+        if isinstance(organization_list, dict):
+            organization_records = organization_list.values()
+        else:
+            organization_records = organization_list
+
+        if self.shard:
+            return (organization for organization in organization_records if is_in_shard(organization.get('_id', ''), self.shard))
+        return organization_records
+
+    def unpublish_missing_organizations(self, organization_list=None):
+        # Unpublish pass of a sharded sync, run once after all shards
+        if organization_list is None:
+            organization_list = self.gsheets_api.get_all_organizations()
+
+        website_data = self.build_website_data_dict(self.get_all_organizations())
+        for organization in self.get_organization_records(organization_list):
+            website_data.pop(str(organization.get('_id', '')), None)
+
+        unpublish_plan = self.bulk_unpublish_organizations(website_data)
+        return [organization_operation.item_id for organization_operation in unpublish_plan]
+
+    def prefetch_organization_images(self, organization_records, website_data):
+        # Collects the pictures that changed in the spreadsheet
+        # and downloads them at the same time
+        if self.dry_run:
+            return {}
+
+        image_keys = []
+        for organization in organization_records:
+            organization_id = self.safe_value(organization.get('_id', ''))
+            organization_brain = website_data.get(organization_id)
+            url = organization.get('picture', '')
+
+            if not url:
+                continue
+
+            if organization_brain is not None:
+                if self.is_unchanged_organization(organization_id, organization):
+                    continue
+                try:
+                    current_url = getattr(self.resolve_organization(organization_id, organization_brain), 'pictureUrl', None)
+                except Exception as err:
+                    current_url = None
+                if current_url == url:
+                    continue
+
+            image_keys.append(self.get_drive_file_id(url))
+
+        return self.image_prefetcher.prefetch(image_keys)
 
     # GET
     def get_all_organizations(self):
-        results = plone.api.content.find(portal_type=self.DEFAULT_CONTENT_TYPE, Language=self.MAIN_LANGUAGE)
+        with time_phase("catalog_lookup"):
+            results = plone.api.content.find(portal_type=self.DEFAULT_CONTENT_TYPE, Language=self.MAIN_LANGUAGE)
         return results
 
      # FIND
     def find_organization(self, organization_id):
         organization_id = self.safe_value(organization_id)
-        result = plone.api.content.find(organization_id=organization_id, Language=self.MAIN_LANGUAGE)
+        with time_phase("catalog_lookup"):
+            result = plone.api.content.find(organization_id=organization_id, Language=self.MAIN_LANGUAGE)
 
         if result:
             return result[0].getObject()
         else:
             raise_error("organizationNotFoundError", "Organization with ID '%s' is not found in Plone" %(organization_id))
 
+    # RESOLVE
+    def resolve_organization(self, organization_id, organization_brain=None):
+        # Reuses the brain from the full-sync catalog query when available,
+        # so only single organization syncs need a catalog search of their own
+        organization_id = self.safe_value(organization_id)
+
+        if organization_id in self.resolved_organizations:
+            return self.resolved_organizations[organization_id]
+
+        if organization_brain is not None:
+            organization = organization_brain.getObject()
+        else:
+            organization = self.find_organization(organization_id)
+
+        self.resolved_organizations[organization_id] = organization
+        return organization
+
     # DELETE
     def delete_organization_by_id(self, organization_id):
         obj = self.find_organization(organization_id=organization_id)
@@ -262,12 +580,27 @@ class SyncManager(object):
         if state != "published":
             if getattr(organization, 'preview_image', None):
                 updated_organization = self.publish_organization(organization)
+                self.changed_fields.append('review_state')
         else:
             if not getattr(organization, 'preview_image', None):
                 updated_organization = self.unpublish_organization(organization)
 
         return organization
 
+    def get_planned_state(self, organization, changes):
+        # The review state publish_based_on_current_state sets after the update
+        state = plone.api.content.get_state(obj=organization)
+        if state != "published" and changes.get('preview_image', None):
+            return "published"
+        return state
+
+    def get_state_diff(self, organization, changes):
+        state = plone.api.content.get_state(obj=organization)
+        planned_state = self.get_planned_state(organization, changes)
+        if planned_state != state:
+            return {'review_state': (state, planned_state)}
+        return {}
+
     def publish_organization(self, organization):
         plone.api.content.transition(obj=organization, to_state="published")
         logger("[Status] Published organization with ID: '%s'" %(getattr(organization, 'google_ads_id', '')))
@@ -285,6 +618,11 @@ class SyncManager(object):
 
         return organization
 
+    def unpublish_missing_organization(self, organization_id, organization_brain):
+        # The row needs a full sync again when it comes back in the spreadsheet
+        self.fingerprints.remove(organization_id)
+        return self.unpublish_organization(self.resolve_organization(organization_id, organization_brain))
+
     def unpublish_organization_by_id(self, organization_id):
         obj = self.find_organization(organization_id=organization_id)
         self.unpublish_organization(obj)
@@ -317,44 +655,41 @@ class SyncManager(object):
         return container
 
     # FIELDS
-    def match(self, field):
-        # Find match in the core
-        if field in self.CORE.keys():
-            if self.CORE[field]:
-                return self.CORE[field]
-            else:
-                logger("[Warning] API field '%s' is ignored in the fields mapping" %(field), "Field ignored in mapping.")
-                return False
-        else:
-            # log field not match
-            logger("[Error] API field '%s' does not exist in the fields mapping" %(field), "Field not found in mapping.")
-            return False
-
-    def update_field(self, organization, fieldname, fieldvalue):
-        plonefield_match = self.match(fieldname)
-
-        if plonefield_match:
-            try:
-                if not hasattr(organization, plonefield_match):
-                    logger("[Error] Plone field '%s' does not exist" %(plonefield_match), "Plone field not found")
-                    return None
+    def update_field(self, changes, fieldname, plonefield, fieldvalue, transform=None):
+        try:
+            if not changes.exists(plonefield):
+                logger("[Error] Plone field '%s' does not exist" %(plonefield), "Plone field not found")
+                return None
 
-                transform_value = self.transform_special_fields(organization, fieldname, fieldvalue)
+            if transform:
+                transform_value = transform(changes, fieldname, fieldvalue)
                 if transform_value:
                     return transform_value
-                else:
-                    setattr(organization, plonefield_match, self.safe_value(fieldvalue))
-                    return fieldvalue
-                    
-            except Exception as err:
-                logger("[Error] Exception while syncing the API field '%s'" %(fieldname), err)
-                return None
-        else:
+
+            changes.set(plonefield, self.safe_value(fieldvalue))
+            return fieldvalue
+
+        except Exception as err:
+            logger("[Error] Exception while syncing the API field '%s'" %(fieldname), err)
             return None
 
-    def update_all_fields(self, organization, organization_data):
-        self.clean_all_fields(organization)
-        updated_fields = [(self.update_field(organization, field, organization_data[field]), field) for field in organization_data.keys()]
+    def stage_all_fields(self, organization, organization_data):
+        # Values are only staged, nothing is written to the organization
+        changes = FieldChanges(organization, self.PRESERVED_SUBJECTS)
+        with time_phase("field_update"):
+            self.clean_all_fields(changes)
+            for fieldname, plonefield, transform in self.field_plan:
+                if fieldname in organization_data:
+                    self.update_field(changes, fieldname, plonefield, organization_data[fieldname], transform)
+        return changes
+
+    def update_all_fields(self, organization, organization_data, changes=None):
+        # Only the staged values that differ from the current values
+        # are written to the organization
+        if changes is None:
+            changes = self.stage_all_fields(organization, organization_data)
+        with time_phase("field_update"):
+            self.changed_fields = changes.apply()
         return organization
 
     #
@@ -369,46 +704,57 @@ class SyncManager(object):
         else:
             return fieldvalue
 
-    def clean_all_fields(self, organization):
+    def clean_all_fields(self, changes):
 
         # get all fields from schema
         for fieldname in self.CORE.values():
-            if fieldname not in ['organization_id', 'pictureUrl', 'google_ads_id']: # TODO: required field needs to come from the settings
-                self.clean_field(organization, fieldname)
+            if fieldname and fieldname not in ['organization_id', 'pictureUrl', 'google_ads_id']: # TODO: required field needs to come from the settings
+                self.clean_field(changes, fieldname)
 
-        return organization
+        return changes
 
-    def clean_field(self, organization, fieldname):
-        try:
-            setattr(organization, fieldname, "")
-        except:
-            logger("[Error] Field '%s' type is not recognised. " %(fieldname), "Field cannot be cleaned before sync.")
-
-        return organization
+    def clean_field(self, changes, fieldname):
+        if fieldname == SUBJECTS_FIELD:
+            changes.reset_subjects()
+        else:
+            changes.set(fieldname, "")
+        return changes
 
     def validate_organization_data(self, organization, organization_data):
         validated = True # Needs validation
         if validated:
-            organization.reindexObject(idxs=["Title", "country", "Subject", "organization_id"])
-            transaction.get().commit()
+            # Nothing to reindex or commit when the organization did not change
+            if self.changed_fields:
+                with time_phase("reindex"):
+                    if [fieldname for fieldname in self.changed_fields if fieldname in self.FULL_REINDEX_FIELDS]:
+                        organization.reindexObject()
+                    else:
+                        # The modification date moves with every changed field
+                        organization.notifyModified()
+                        organization.reindexObject(idxs=self.get_changed_indexes(self.changed_fields) + ['modified'])
+                if not self.committer.is_running():
+                    with time_phase("commit"):
+                        transaction.get().commit()
             return organization
         else:
             raise_error("validationError", "Organization is not valid. Do not commit changes to the database.")
 
+    def get_changed_indexes(self, changed_fields):
+        # Only the indexes of the changed fields are reindexed.
+        # An empty list means that no indexed field changed.
+        changed_indexes = []
+        for fieldname in changed_fields:
+            for index_name in self.REINDEX_MAPPING.get(fieldname, []):
+                if index_name not in changed_indexes:
+                    changed_indexes.append(index_name)
+        return changed_indexes
+
     #
     # Transform special fields
     # Special methods
     #
-    def transform_special_fields(self, organization, fieldname, fieldvalue):
-
-        special_field_handler = self.get_special_fields_handlers(fieldname)
-        if special_field_handler:
-            special_field_value = special_field_handler(organization, fieldname, fieldvalue)
-            return special_field_value
-
-        return False
-
-    def get_special_fields_handlers(self, fieldname):
+    def get_special_fields_handlers(self):
+        # Only used to compile the field plan
         SPECIAL_FIELDS_HANDLERS = {
             "title": self._transform_organization_title,
             "type": self._transform_organization_type,
@@ -416,25 +762,15 @@ class SyncManager(object):
             "country": self._transform_organization_country
         }
 
-        if fieldname in SPECIAL_FIELDS_HANDLERS:
-            return SPECIAL_FIELDS_HANDLERS[fieldname]
-        else:
-            return None
+        return SPECIAL_FIELDS_HANDLERS
 
-    def _transform_organization_title(self, organization, fieldname, fieldvalue):
-        setattr(organization, 'title', fieldvalue)
+    def _transform_organization_title(self, changes, fieldname, fieldvalue):
+        changes.set('title', fieldvalue)
         return fieldvalue
 
-    def _transform_organization_type(self, organization, fieldname, fieldvalue):
-        current_subjects = organization.Subject()
-        if 'frontpage' in current_subjects:
-            subjects = ['frontpage', fieldvalue]
-            organization.setSubject(subjects)
-        elif 'main-organization-page' in current_subjects:
-            subjects = ['main-organization-page', fieldvalue]
-            organization.setSubject(subjects)
-        else:
-            organization.setSubject([fieldvalue])
+    def _transform_organization_type(self, changes, fieldname, fieldvalue):
+        # Preserved flags like 'frontpage' are kept by the subject composer
+        changes.add_subjects([fieldvalue])
 
         """taxonomy_id = self.get_taxonomy_id(fieldvalue)
         taxonomies = getattr(organization, self.TAXONOMY_NAME, [])
@@ -448,18 +784,14 @@ class SyncManager(object):
             
         return [fieldvalue]
 
-    def _transform_organization_country(self, organization, fieldname, fieldvalue):
+    def _transform_organization_country(self, changes, fieldname, fieldvalue):
         if fieldvalue:
             all_countries = fieldvalue.split(',')
             all_countries_transform = [country.strip() for country in all_countries]
-            current_subjects = organization.Subject()
-            for country in all_countries_transform:
-                current_subjects = list(current_subjects)
-                current_subjects.append(country)
-            organization.setSubject(current_subjects)
-            setattr(organization, 'country', all_countries_transform[0])
+            changes.add_subjects(all_countries_transform)
+            changes.set('country', all_countries_transform[0])
         else:
-            setattr(organization, 'country', '')
+            changes.set('country', '')
 
         return [fieldvalue]
 
@@ -475,25 +807,25 @@ class SyncManager(object):
         return taxonomy_id
 
 
-    def _transform_organization_picture(self, organization, fieldname, fieldvalue):
+    def _transform_organization_picture(self, changes, fieldname, fieldvalue):
         url = fieldvalue
 
-        current_url = getattr(organization, 'pictureUrl', None)
+        current_url = changes.get('pictureUrl', None)
 
         if url:
             if not current_url:
-                image_created_url = self.add_image_to_organization(url, organization)
-                setattr(organization, 'pictureUrl', url)
+                image_created_url = self.add_image_to_organization(url, changes)
+                changes.set('pictureUrl', url)
             elif current_url != url:
-                image_created_url = self.add_image_to_organization(url, organization)
-                setattr(organization, 'pictureUrl', url)
+                image_created_url = self.add_image_to_organization(url, changes)
+                changes.set('pictureUrl', url)
             else:
-                setattr(organization, 'pictureUrl', url)
+                changes.set('pictureUrl', url)
                 return url
 
             return url
         else:
-            setattr(organization, 'preview_image', None)
+            changes.set('preview_image', None)
             return url
 
     def get_drive_file_id(self, url):
@@ -526,7 +858,7 @@ class SyncManager(object):
     def download_image(self, url):
         if url:
             try:
-                img_request = requests.get(url, stream=True)
+                img_request = self.http_session.get(url)
                 if img_request:
                     img_headers = img_request.headers.get('content-type')
 
@@ -544,8 +876,12 @@ class SyncManager(object):
         else:
             return None
 
-    def get_image_blob(self, img_data):
+    def get_image_blob(self, img_data, current_blob=None):
         if img_data:
+            # Keep the current blob when the bytes are identical
+            if is_same_image(current_blob, img_data):
+                return current_blob
+
             image_data = img_data
             img_blob = NamedBlobImage(data=image_data)
 
@@ -561,21 +897,55 @@ class SyncManager(object):
         else:
             return False
 
-    def add_image_to_organization(self, url, organization):
-        
+    def download_image_by_id(self, image_id):
+        if not image_id:
+            return None
+
+        with time_phase("image_download"):
+            return self.download_cached_image(image_id)
+
+    def download_cached_image(self, image_id):
+        # The Drive checksum and modification time revalidate the cached image
+        try:
+            metadata = self.gsheets_api.get_media_metadata(image_id, threaded=True) or {}
+        except Exception as err:
+            logger("[Warning] Metadata of the image '%s' cannot be requested. The image is downloaded without the cache." %(image_id), err)
+            metadata = {}
+
+        etag = metadata.get('md5Checksum', None)
+        last_modified = metadata.get('modifiedTime', None)
+
+        if etag or last_modified:
+            cached_data = self.image_cache.get(image_id, etag=etag, last_modified=last_modified)
+            if cached_data is not None:
+                return cached_data
+
+        image_data = self.gsheets_api.download_media_by_id(image_id, threaded=True)
+        if (etag or last_modified) and image_data and self.is_valid_image(image_data):
+            self.image_cache.set(image_id, image_data, etag=etag, last_modified=last_modified)
+        return image_data
+
+    def add_image_to_organization(self, url, changes):
+        if self.dry_run:
+            # The current picture is kept in the plan
+            return url
+
         image_id = self.get_drive_file_id(url)
-        image_data = self.gsheets_api.download_media_by_id(image_id)
+        if self.image_prefetcher.has_image(image_id):
+            image_data = self.image_prefetcher.get_image(image_id)
+        else:
+            image_data = self.download_image_by_id(image_id)
 
-        if self.is_valid_image(image_data):
-            image_blob = self.get_image_blob(image_data)
+        if image_data and self.is_valid_image(image_data):
+            image_blob = self.get_image_blob(image_data, current_blob=changes.get('preview_image', None))
         else:
             image_blob = None
 
         if image_blob:
-            setattr(organization, 'preview_image', image_blob)
+            changes.set('preview_image', image_blob)
             return url
         else:
-            setattr(organization, 'preview_image', None)
+            changes.set('preview_image', None)
             return url
 
     def invalidate_cache(self):
@@ -6,7 +6,6 @@
 #
 import plone.api
 import transaction
-import requests
 from zope.component import queryAdapter, queryMultiAdapter
 from plone.uuid.interfaces import IUUID
 from zope import event
@@ -30,11 +29,44 @@ from plone.app.multilingual.interfaces import ITranslationManager
 from .error_handling.error import raise_error
 
 # Logging module
-from .logging.logging import logger
+from .logging.logging import logger, flush_logs
+
+# Batched transactions
+from .batch_commit import BatchCommitter
+
+# Field diffing
+from .field_diff import FieldChanges, SUBJECTS_FIELD
+
+# Compiled fields mapping
+from .field_plan import build_field_plan
+
+# Row fingerprints
+from .fingerprints import FingerprintStore
+
+# Parallel image downloads
+from .image_prefetch import ImagePrefetcher
+
+# Image cache
+from .image_cache import get_image_cache, is_same_image
+
+# Pooled HTTP sessions
+from .http_sessions import get_session_pool
+
+# Sharded syncs
+from .sharding import is_in_shard
+
+# Sync metrics
+from .metrics import time_phase
+
+# Sync progress
+from .progress import SyncProgress, get_progress_tracker, STATUS_FAILED
+
+# Sync plans
+from .sync_plan import SyncPlan, SyncOperation, get_creation_diffs, OPERATION_CREATE, OPERATION_UPDATE, OPERATION_UNPUBLISH, OPERATION_SKIP, OPERATION_COUNTERS
 
 # Utils
 from .utils import str2bool, normalize_id, phonenumber_to_id, generate_person_id
-from .utils import get_datetime_today, get_datetime_future, DATE_FORMAT
+from .utils import get_datetime_today, get_datetime_future, iter_chunks, DATE_FORMAT
 
 class SyncManager(object):
     #
@@ -52,17 +84,73 @@ class SyncManager(object):
         "intern": "/en/team/interns"
     }
 
+    # Subjects that are kept when the subjects are synced
+    PRESERVED_SUBJECTS = ('frontpage', 'frontpage-collection')
+
+    # Catalog indexes that depend on the synced Plone fields
+    REINDEX_MAPPING = {
+        "title": ["Title", "sortable_title", "SearchableText"],
+        "subject": ["Subject", "SearchableText"],
+        "person_id": ["person_id"],
+        "review_state": ["review_state"]
+    }
+
+    # Changed fields that need a full reindex, as the catalog metadata
+    # of the image scales is only refreshed then
+    FULL_REINDEX_FIELDS = ('preview_image',)
+
     def __init__(self, options):
         self.options = options
         self.gsheets_api = self.options['api']
         self.CORE = self.options['core']
 
+        # Ordered (API field, Plone field, transform) entries of the core
+        self.field_plan = build_field_plan(self.CORE, self.get_special_fields_handlers())
+
+        # Objects already resolved in the chunk that is synced, keyed by person ID
+        self.resolved_persons = {}
+
+        # Plone fields changed by the last update
+        self.changed_fields = []
+
+        # Rows with the same fingerprint as the last sync are skipped
+        self.fingerprints = FingerprintStore("persons")
+        self.skip_unchanged = self.options.get('skip_unchanged', True)
+
+        # Keep-alive HTTP connections shared by all image downloads
+        self.http_session = self.options.get('http_session', None) or get_session_pool()
+
+        # Downloaded pictures are cached on disk by Drive file ID
+        self.image_cache = self.options.get('image_cache', None) or get_image_cache()
+
+        # Pictures are downloaded in parallel before the rows are synced,
+        # 'prefetch_window' rows at a time
+        self.image_prefetcher = ImagePrefetcher(self.download_image_by_id, max_workers=self.options.get('image_workers', ImagePrefetcher.DEFAULT_MAX_WORKERS))
+        self.prefetch_window = self.options.get('prefetch_window', ImagePrefetcher.DEFAULT_PREFETCH_WINDOW)
+
+        # Only the rows of this (shard index, shard count) are synced.
+        # The coordinator of a sharded sync unpublishes the missing persons once.
+        self.shard = self.options.get('shard', None)
+        self.unpublish_missing = self.options.get('unpublish_missing', True)
+
+        # Dry runs only plan the sync, so pictures are not downloaded
+        self.dry_run = self.options.get('dry_run', False)
+
+        # Counters of the running full sync, replaced by a tracked progress in update_persons
+        self.progress = SyncProgress("persons")
+
+        # Commit the transaction every 'batch_size' synced objects
+        self.committer = BatchCommitter(
+            batch_size=self.options.get('batch_size', BatchCommitter.DEFAULT_BATCH_SIZE),
+            conflict_retries=self.options.get('conflict_retries', BatchCommitter.DEFAULT_CONFLICT_RETRIES)
+        )
+
     #
     # Sync operations 
     #
-    def update_person_by_id(self, person_id, person_data=None):
+    def update_person_by_id(self, person_id, person_data=None, person_brain=None):
         if person_id:
-            person = self.find_person(person_id)
+            person = self.resolve_person(person_id, person_brain)
 
             if not person_data:
                 person_data = self.gsheets_api.get_person_by_id(person_id)
@@ -77,17 +165,36 @@ class SyncManager(object):
             return None
 
     def update_persons(self, create_and_unpublish=False):
-        person_list = self.gsheets_api.get_all_persons()
-        
-        if create_and_unpublish:
-            website_persons = self.get_all_persons()
-            self.sync_person_list(person_list, website_persons)
+        if getattr(self.gsheets_api, 'streaming', False):
+            # Rows are synced while the next windows are downloaded
+            person_list = self.gsheets_api.stream_all_persons()
         else:
-            self.update_person_list(person_list)
+            person_list = self.gsheets_api.get_all_persons()
 
-        cache_invalidated = self.invalidate_cache()
-        
-        transaction.get().commit()
+        # The total number of rows is unknown while streaming
+        total = len(person_list) if isinstance(person_list, dict) else None
+        progress_tracker = get_progress_tracker()
+        self.progress = progress_tracker.start("persons", total)
+
+        try:
+            website_persons = self.get_all_persons()
+
+            if create_and_unpublish:
+                self.sync_person_list(person_list, website_persons)
+            else:
+                self.update_person_list(person_list, website_persons)
+
+            cache_invalidated = self.invalidate_cache()
+
+            self.committer.commit()
+        except Exception as err:
+            progress_tracker.finish(self.progress, STATUS_FAILED, str(err))
+            raise
+        finally:
+            # Repeated warnings of this sync are reported now
+            flush_logs()
+
+        progress_tracker.finish(self.progress)
         return person_list
 
     #
@@ -97,8 +204,8 @@ class SyncManager(object):
     # UPDATE
     
 
-    def update_person(self, person_id, person, person_data):
-        updated_person = self.update_all_fields(person, person_data)
+    def update_person(self, person_id, person, person_data, changes=None):
+        updated_person = self.update_all_fields(person, person_data, changes)
 
         update_person = self.publish_based_on_current_state(person)
 
@@ -108,7 +215,12 @@ class SyncManager(object):
 
         updated_person = self.validate_person_data(updated_person, person_data)
 
-        logger("[Status] Person with ID '%s' is now updated. URL: %s" %(person_id, person.absolute_url()))
+        self.fingerprints.set(self.safe_value(person_id), person_data.get('_fingerprint', None))
+
+        if self.changed_fields:
+            logger("[Status] Person with ID '%s' is now updated. URL: %s" %(person_id, person.absolute_url()))
+        else:
+            logger("[Status] Person with ID '%s' is unchanged. URL: %s" %(person_id, person.absolute_url()))
         return updated_person
 
 
@@ -148,13 +260,15 @@ class SyncManager(object):
         return translated_person
 
     def copy_fields_to_translation(self, person, translated_person):
+        changes = FieldChanges(translated_person)
 
         for fieldname in self.TRANSLATABLE_FIELDS:
-            setattr(translated_person, fieldname, getattr(person, fieldname, ''))
+            changes.set(fieldname, getattr(person, fieldname, ''))
 
         original_subjects = person.Subject()
-        translated_person.setSubject(original_subjects)
+        changes.set_subjects(original_subjects)
 
+        self.changed_fields = changes.apply()
         return translated_person
 
 
@@ -163,19 +277,18 @@ class SyncManager(object):
         if not person_data:
             person_data = self.gsheets_api.get_person_by_id(person_id)
         
-        try:
-            title = person_data['fullname']
-            person_type = person_data['type']
+        # Errors are raised to the caller, so the savepoint of the batch
+        # can roll back a partially created person
+        title = person_data['fullname']
+        person_type = person_data['type']
 
-            new_person_id = normalize_id(title)
-            container = self.get_container(person_type=person_type)
+        new_person_id = normalize_id(title)
+        container = self.get_container(person_type=person_type)
 
-            new_person = plone.api.content.create(container=container, type=self.DEFAULT_CONTENT_TYPE, id=new_person_id, safe_id=True, title=title)
-            logger("[Status] Person with ID '%s' is now created. URL: %s" %(person_id, new_person.absolute_url()))
-            updated_person = self.update_person(person_id, new_person, person_data)
-        except Exception as err:
-            logger("[Error] Error while creating the person ID '%s'" %(person_id), err)
-            return None
+        new_person = plone.api.content.create(container=container, type=self.DEFAULT_CONTENT_TYPE, id=new_person_id, safe_id=True, title=title)
+        logger("[Status] Person with ID '%s' is now created. URL: %s" %(person_id, new_person.absolute_url()))
+        updated_person = self.update_person(person_id, new_person, person_data)
+        return updated_person
     
     def create_new_persons(self, persons_data, website_data):
         new_persons = [api_id for api_id in persons_data.keys() if api_id not in website_data.keys()]
@@ -184,60 +297,275 @@ class SyncManager(object):
 
     # CREATE OR UPDATE
     def sync_person_list(self, person_list, website_persons):
+        return self.plan_and_apply_person_list(person_list, website_persons, create_and_unpublish=True)
+
+    def update_person_list(self, person_list, website_persons=None):
+        return self.plan_and_apply_person_list(person_list, website_persons or [], create_and_unpublish=False)
 
+    def plan_and_apply_person_list(self, person_list, website_persons, create_and_unpublish=True):
+        # Every chunk is planned while nothing is written and is then applied
+        # and committed, so no write transaction waits on the downloads
         website_data = self.build_website_data_dict(website_persons)
+        seen_ids = set()
+        skipped_persons = 0
 
-        for person in person_list.values():
-            person_id = str(person.get('_id', ''))
+        for person_chunk in iter_chunks(self.get_person_records(person_list), self.prefetch_window):
+            self.prefetch_person_images(person_chunk, website_data)
+            person_plan = self.apply_plan(self.plan_person_chunk(person_chunk, website_data, create_and_unpublish, seen_ids))
+            self.clear_chunk()
+            skipped_persons += person_plan.counts[OPERATION_SKIP]
 
-            if person_id:
-                # Update
-                if person_id in website_data.keys():
-                    consume_person = website_data.pop(person_id)
-                    try:
-                        person_data = self.update_person_by_id(person_id, person)
-                    except Exception as err:
-                        logger("[Error] Error while updating the person ID: %s" %(person_id), err)
-                # Create
-                else:
-                    try:
-                        new_person = self.create_person(person_id, person)
-                    except Exception as err:
-                        logger("[Error] Error while creating the person ID: '%s'" %(person_id), err)
-            else:
-                # TODO: log error
-                pass
-        
-        if len(website_data.keys()) > 0:
-            unpublished_persons = [self.unpublish_person(person_brain.getObject()) for person_brain in website_data.values()]
+        if create_and_unpublish and self.unpublish_missing and len(website_data.keys()) > 0:
+            self.bulk_unpublish_persons(website_data)
 
+        if skipped_persons:
+            logger("[Status] %s unchanged persons are skipped." %(skipped_persons))
         return person_list
 
-    def update_person_list(self, person_list):
-        for person in person_list.values():
-            person_id = person.get('_id', '')
+    #
+    # Plan and apply
+    #
+    def plan_persons(self, create_and_unpublish=True):
+        # Read-only plan of a full sync with the field-level diffs of every row
+        if getattr(self.gsheets_api, 'streaming', False):
+            person_list = self.gsheets_api.stream_all_persons()
+        else:
+            person_list = self.gsheets_api.get_all_persons()
+
+        website_data = self.build_website_data_dict(self.get_all_persons())
+        plan = SyncPlan("persons")
+        seen_ids = set()
+
+        for person_chunk in iter_chunks(self.get_person_records(person_list), self.prefetch_window):
+            self.prefetch_person_images(person_chunk, website_data)
+            plan.extend(self.plan_person_chunk(person_chunk, website_data, create_and_unpublish, seen_ids))
+            self.clear_chunk()
+
+        if create_and_unpublish and self.unpublish_missing:
+            plan.extend(self.plan_unpublish_persons(website_data))
+
+        return plan
+
+    def clear_chunk(self):
+        # Objects and pictures are only kept while their chunk is synced,
+        # repeated IDs are found with the IDs in 'seen_ids'
+        self.resolved_persons = {}
+        self.image_prefetcher.clear()
+
+    def plan_person_chunk(self, person_records, website_data, create_and_unpublish=True, seen_ids=None):
+        plan = SyncPlan("persons")
+        for person in person_records:
+            person_operation = plan.add(self.plan_person(person, website_data, create_and_unpublish, seen_ids))
+            if self.dry_run:
+                # Staged changes are only kept to be applied
+                person_operation.changes = None
+        return plan
+
+    def plan_person(self, person_data, website_data, create_and_unpublish=True, seen_ids=None):
+        person_id = str(person_data.get('_id', ''))
+        if not person_id:
+            return SyncOperation(OPERATION_SKIP, person_id, data=person_data, reason="The row has no person ID.")
+
+        # Streamed rows are not merged by ID, so only the first row of an ID is synced
+        if seen_ids is not None:
+            if person_id in seen_ids:
+                logger("[Warning] Person ID '%s' is repeated in the spreadsheet. The row is skipped." %(person_id), "Duplicated ID")
+                return SyncOperation(OPERATION_SKIP, person_id, data=person_data, reason="The person ID is repeated in the spreadsheet.")
+            seen_ids.add(person_id)
+
+        if create_and_unpublish:
+            person_brain = website_data.pop(person_id, None)
+            if person_brain is None:
+                return SyncOperation(OPERATION_CREATE, person_id, data=person_data, diffs=get_creation_diffs(self.field_plan, person_data))
+        else:
+            person_brain = website_data.get(person_id)
+
+        if person_brain is not None and self.is_unchanged_person(person_id, person_data):
+            return SyncOperation(OPERATION_SKIP, person_id, data=person_data, brain=person_brain, reason="The row is unchanged since the last sync.")
+
+        try:
+            person = self.resolve_person(person_id, person_brain)
+            changes = self.stage_all_fields(person, person_data)
+            diffs = changes.get_diffs()
+            diffs.update(self.get_state_diff(person, changes))
+        except Exception as err:
+            return SyncOperation(OPERATION_UPDATE, person_id, data=person_data, brain=person_brain, error=str(err))
+
+        return SyncOperation(OPERATION_UPDATE, person_id, data=person_data, brain=person_brain, changes=changes, diffs=diffs)
+
+    def plan_unpublish_persons(self, website_data):
+        # The persons on the website that are missing in the spreadsheet
+        plan = SyncPlan("persons")
+        unpublished_persons = 0
+        for person_id, person_brain in website_data.items():
+            if not self.is_published_brain(person_brain):
+                unpublished_persons += 1
+                continue
+            plan.add(SyncOperation(OPERATION_UNPUBLISH, person_id, brain=person_brain, diffs={'review_state': ("published", "private")}, reason="The person is not in the spreadsheet."))
+
+        if unpublished_persons:
+            logger("[Status] %s persons that are missing in the spreadsheet are already unpublished." %(unpublished_persons))
+        return plan
+
+    def bulk_unpublish_persons(self, website_data):
+        # State-aware unpublish pass. The review state is read from the brains,
+        # so only the published persons are loaded and transitioned, in the
+        # batches of the committer. The workflow transition reindexes only
+        # review_state and the security indexes.
+        for person_id in website_data.keys():
+            # The row needs a full sync again when it comes back in the spreadsheet
+            self.fingerprints.remove(person_id)
+        return self.apply_plan(self.plan_unpublish_persons(website_data))
+
+    def is_published_brain(self, person_brain):
+        return getattr(person_brain, 'review_state', None) == "published"
+
+    def apply_plan(self, plan):
+        # Runs the planned operations in batches of short write transactions
+        for person_operation in plan:
+            if person_operation.operation != OPERATION_UNPUBLISH:
+                self.progress.increment('seen')
+
+            if person_operation.error:
+                self.progress.increment('failed')
+                logger("[Error] Error while planning the sync for the person ID: '%s'" %(person_operation.item_id), person_operation.error)
+                continue
+
+            if person_operation.operation == OPERATION_SKIP:
+                self.progress.increment('skipped')
+                continue
+
             try:
-                person_data = self.update_person_by_id(person_id, person)
+                self.committer.add(self.apply_person_operation, person_operation)
             except Exception as err:
-                logger("[Error] Error while requesting the sync for the person ID: '%s'" %(person_id), err)
-        
-        return person_list
+                self.progress.increment('failed')
+                logger("[Error] Error while applying the %s of the person ID: '%s'" %(person_operation.operation, person_operation.item_id), err)
+                continue
+
+            if self.committer.is_full():
+                self.commit_batch()
+
+        self.commit_batch()
+        return plan
+
+    def commit_batch(self):
+        # Only the operations of a committed batch are counted as applied
+        committed, failed = self.committer.commit()
+        for operation, args, kwargs in committed:
+            self.progress.increment(OPERATION_COUNTERS[args[0].operation])
+        for operation, args, kwargs in failed:
+            self.progress.increment('failed')
+            logger("[Error] The %s of the person ID '%s' is not committed." %(args[0].operation, args[0].item_id), "Batch not committed")
+        return committed
+
+    def apply_person_operation(self, person_operation):
+        if person_operation.operation == OPERATION_CREATE:
+            return self.create_person(person_operation.item_id, person_operation.data)
+
+        if person_operation.operation == OPERATION_UNPUBLISH:
+            return self.unpublish_missing_person(person_operation.item_id, person_operation.brain)
+
+        # The planned changes are only applied once. A batch that is replayed
+        # after a conflict stages them again, as the images of the planned
+        # changes were created in the aborted transaction.
+        changes, person_operation.changes = person_operation.changes, None
+
+        person = self.resolve_person(person_operation.item_id, person_operation.brain)
+        return self.update_person(person_operation.item_id, person, person_operation.data, changes)
+
+    def is_unchanged_person(self, person_id, person_data):
+        # Compares the row with the fingerprint of the last sync,
+        # without loading the person from the database
+        if not self.skip_unchanged:
+            return False
+        return self.fingerprints.is_unchanged(self.safe_value(person_id), person_data.get('_fingerprint', None))
+
+    def get_person_records(self, person_list):
+        # Spreadsheet data is either a dict by ID or a stream of rows
+        if isinstance(person_list, dict):
+            person_records = person_list.values()
+        else:
+            person_records = person_list
+
+        if self.shard:
+            return (person for person in person_records if is_in_shard(person.get('_id', ''), self.shard))
+        return person_records
+
+    def unpublish_missing_persons(self, person_list=None):
+        # Unpublish pass of a sharded sync, run once after all shards
+        if person_list is None:
+            person_list = self.gsheets_api.get_all_persons()
+
+        website_data = self.build_website_data_dict(self.get_all_persons())
+        for person in self.get_person_records(person_list):
+            website_data.pop(str(person.get('_id', '')), None)
+
+        unpublish_plan = self.bulk_unpublish_persons(website_data)
+        return [person_operation.item_id for person_operation in unpublish_plan]
+
+    def prefetch_person_images(self, person_records, website_data):
+        # Collects the pictures that changed in the spreadsheet
+        # and downloads them at the same time
+        if self.dry_run:
+            return {}
+
+        image_keys = []
+        for person in person_records:
+            person_id = self.safe_value(person.get('_id', ''))
+            person_brain = website_data.get(person_id)
+            url = person.get('picture', '')
+
+            if not url:
+                continue
+
+            if person_brain is not None:
+                if self.is_unchanged_person(person_id, person):
+                    continue
+                try:
+                    current_url = getattr(self.resolve_person(person_id, person_brain), 'pictureUrl', None)
+                except Exception as err:
+                    current_url = None
+                if current_url == url:
+                    continue
+
+            image_keys.append(self.get_drive_file_id(url))
+
+        return self.image_prefetcher.prefetch(image_keys)
 
     # GET
     def get_all_persons(self):
-        results = plone.api.content.find(portal_type=self.DEFAULT_CONTENT_TYPE, Language=self.MAIN_LANGUAGE)
+        with time_phase("catalog_lookup"):
+            results = plone.api.content.find(portal_type=self.DEFAULT_CONTENT_TYPE, Language=self.MAIN_LANGUAGE)
         return results
 
      # FIND
     def find_person(self, person_id):
         person_id = self.safe_value(person_id)
-        result = plone.api.content.find(person_id=person_id, Language=self.MAIN_LANGUAGE)
+        with time_phase("catalog_lookup"):
+            result = plone.api.content.find(person_id=person_id, Language=self.MAIN_LANGUAGE)
 
         if result:
             return result[0].getObject()
         else:
             raise_error("personNotFoundError", "Person with ID '%s' is not found in Plone" %(person_id))
 
+    # RESOLVE
+    def resolve_person(self, person_id, person_brain=None):
+        # Reuses the brain from the full-sync catalog query when available,
+        # so only single person syncs need a catalog search of their own
+        person_id = self.safe_value(person_id)
+
+        if person_id in self.resolved_persons:
+            return self.resolved_persons[person_id]
+
+        if person_brain is not None:
+            person = person_brain.getObject()
+        else:
+            person = self.find_person(person_id)
+
+        self.resolved_persons[person_id] = person
+        return person
+
     # DELETE
     def delete_person_by_id(self, person_id):
         obj = self.find_person(person_id=person_id)
@@ -252,12 +580,31 @@ class SyncManager(object):
         if state != "published":
             if getattr(person, 'preview_image', None):
                 updated_person = self.publish_person(person)
+                self.changed_fields.append('review_state')
         else:
             if not getattr(person, 'preview_image', None):
                 updated_person = self.unpublish_person(person)
+                self.changed_fields.append('review_state')
 
         return person
 
+    def get_planned_state(self, person, changes):
+        # The review state publish_based_on_current_state sets after the update
+        state = plone.api.content.get_state(obj=person)
+        has_image = bool(changes.get('preview_image', None))
+        if state != "published" and has_image:
+            return "published"
+        if state == "published" and not has_image:
+            return "private"
+        return state
+
+    def get_state_diff(self, person, changes):
+        state = plone.api.content.get_state(obj=person)
+        planned_state = self.get_planned_state(person, changes)
+        if planned_state != state:
+            return {'review_state': (state, planned_state)}
+        return {}
+
     def publish_person(self, person):
         plone.api.content.transition(obj=person, to_state="published")
         logger("[Status] Published person with ID: '%s'" %(generate_person_id(getattr(person, 'title', ''))))
@@ -275,6 +622,12 @@ class SyncManager(object):
 
         return person
 
+    def unpublish_missing_person(self, person_id, person_brain):
+        # The row needs a full sync again when it comes back in the spreadsheet
+        self.fingerprints.remove(person_id)
+        unpublished_person = self.unpublish_person(self.resolve_person(person_id, person_brain))
+        return unpublished_person
+
     def unpublish_person_by_id(self, person_id):
         obj = self.find_person(person_id=person_id)
         self.unpublish_person(obj)
@@ -306,44 +659,41 @@ class SyncManager(object):
         return container
 
     # FIELDS
-    def match(self, field):
-        # Find match in the core
-        if field in self.CORE.keys():
-            if self.CORE[field]:
-                return self.CORE[field]
-            else:
-                logger("[Warning] API field '%s' is ignored in the fields mapping" %(field), "Field ignored in mapping.")
-                return False
-        else:
-            # log field not match
-            logger("[Error] API field '%s' does not exist in the fields mapping" %(field), "Field not found in mapping.")
-            return False
-
-    def update_field(self, person, fieldname, fieldvalue):
-        plonefield_match = self.match(fieldname)
-
-        if plonefield_match:
-            try:
-                if not hasattr(person, plonefield_match):
-                    logger("[Error] Plone field '%s' does not exist" %(plonefield_match), "Plone field not found")
-                    return None
+    def update_field(self, changes, fieldname, plonefield, fieldvalue, transform=None):
+        try:
+            if not changes.exists(plonefield):
+                logger("[Error] Plone field '%s' does not exist" %(plonefield), "Plone field not found")
+                return None
 
-                transform_value = self.transform_special_fields(person, fieldname, fieldvalue)
+            if transform:
+                transform_value = transform(changes, fieldname, fieldvalue)
                 if transform_value:
                     return transform_value
-                else:
-                    setattr(person, plonefield_match, self.safe_value(fieldvalue))
-                    return fieldvalue
-                    
-            except Exception as err:
-                logger("[Error] Exception while syncing the API field '%s'" %(fieldname), err)
-                return None
-        else:
+
+            changes.set(plonefield, self.safe_value(fieldvalue))
+            return fieldvalue
+
+        except Exception as err:
+            logger("[Error] Exception while syncing the API field '%s'" %(fieldname), err)
             return None
 
-    def update_all_fields(self, person, person_data):
-        self.clean_all_fields(person)
-        updated_fields = [(self.update_field(person, field, person_data[field]), field) for field in person_data.keys()]
+    def stage_all_fields(self, person, person_data):
+        # Values are only staged, nothing is written to the person
+        changes = FieldChanges(person, self.PRESERVED_SUBJECTS)
+        with time_phase("field_update"):
+            self.clean_all_fields(changes)
+            for fieldname, plonefield, transform in self.field_plan:
+                if fieldname in person_data:
+                    self.update_field(changes, fieldname, plonefield, person_data[fieldname], transform)
+        return changes
+
+    def update_all_fields(self, person, person_data, changes=None):
+        # Only the staged values that differ from the current values
+        # are written to the person
+        if changes is None:
+            changes = self.stage_all_fields(person, person_data)
+        with time_phase("field_update"):
+            self.changed_fields = changes.apply()
         return person
 
     #
@@ -358,46 +708,57 @@ class SyncManager(object):
         else:
             return fieldvalue
 
-    def clean_all_fields(self, person):
+    def clean_all_fields(self, changes):
 
         # get all fields from schema
         for fieldname in self.CORE.values():
-            if fieldname not in ['person_id', 'pictureUrl']: # TODO: required field needs to come from the settings
-                self.clean_field(person, fieldname)
-
-        return person
+            if fieldname and fieldname not in ['person_id', 'pictureUrl']: # TODO: required field needs to come from the settings
+                self.clean_field(changes, fieldname)
 
-    def clean_field(self, person, fieldname):
-        try:
-            setattr(person, fieldname, "")
-        except:
-            logger("[Error] Field '%s' type is not recognised. " %(fieldname), "Field cannot be cleaned before sync.")
+        return changes
 
-        return person
+    def clean_field(self, changes, fieldname):
+        if fieldname == SUBJECTS_FIELD:
+            changes.reset_subjects()
+        else:
+            changes.set(fieldname, "")
+        return changes
 
     def validate_person_data(self, person, person_data):
         validated = True # Needs validation
         if validated:
-            person.reindexObject()
-            transaction.get().commit()
+            # Nothing to reindex or commit when the person did not change
+            if self.changed_fields:
+                with time_phase("reindex"):
+                    if [fieldname for fieldname in self.changed_fields if fieldname in self.FULL_REINDEX_FIELDS]:
+                        person.reindexObject()
+                    else:
+                        # The modification date moves with every changed field
+                        person.notifyModified()
+                        person.reindexObject(idxs=self.get_changed_indexes(self.changed_fields) + ['modified'])
+                if not self.committer.is_running():
+                    with time_phase("commit"):
+                        transaction.get().commit()
             return person
         else:
             raise_error("validationError", "Person is not valid. Do not commit changes to the database.")
 
+    def get_changed_indexes(self, changed_fields):
+        # Only the indexes of the changed fields are reindexed.
+        # An empty list means that no indexed field changed.
+        changed_indexes = []
+        for fieldname in changed_fields:
+            for index_name in self.REINDEX_MAPPING.get(fieldname, []):
+                if index_name not in changed_indexes:
+                    changed_indexes.append(index_name)
+        return changed_indexes
+
     #
     # Transform special fields
     # Special methods
     #
-    def transform_special_fields(self, person, fieldname, fieldvalue):
-
-        special_field_handler = self.get_special_fields_handlers(fieldname)
-        if special_field_handler:
-            special_field_value = special_field_handler(person, fieldname, fieldvalue)
-            return special_field_value
-
-        return False
-
-    def get_special_fields_handlers(self, fieldname):
+    def get_special_fields_handlers(self):
+        # Only used to compile the field plan
         SPECIAL_FIELDS_HANDLERS = {
             "title": self._transform_person_title,
             "type": self._transform_person_type,
@@ -405,65 +766,48 @@ class SyncManager(object):
             "market": self._transform_person_market
         }
 
-        if fieldname in SPECIAL_FIELDS_HANDLERS:
-            return SPECIAL_FIELDS_HANDLERS[fieldname]
-        else:
-            return None
+        return SPECIAL_FIELDS_HANDLERS
 
-    def _transform_person_title(self, person, fieldname, fieldvalue):
-        setattr(person, 'title', fieldvalue)
+    def _transform_person_title(self, changes, fieldname, fieldvalue):
+        changes.set('title', fieldvalue)
         return fieldvalue
 
-    def _transform_person_type(self, person, fieldname, fieldvalue):
-        current_subjects = person.Subject()
-        if 'frontpage' in current_subjects:
-            subjects = ['frontpage', fieldvalue]
-            person.setSubject(subjects)
-        elif 'frontpage-collection' in current_subjects:
-            subjects = ['frontpage-collection', fieldvalue]
-            person.setSubject(subjects)
-        else:
-            person.setSubject([fieldvalue])
-            
+    def _transform_person_type(self, changes, fieldname, fieldvalue):
+        # Preserved flags like 'frontpage' are kept by the subject composer
+        changes.add_subjects([fieldvalue])
         return [fieldvalue]
 
-    def _transform_person_market(self, person, fieldname, fieldvalue):
+    def _transform_person_market(self, changes, fieldname, fieldvalue):
         if fieldvalue:
             all_markets = fieldvalue.split(',')
             all_markets_transform = [market.strip() for market in all_markets]
 
-            current_subjects = person.Subject()
-            current_subjects = list(current_subjects)
-
-            for market in all_markets_transform:
-                current_subjects.append(market)
-
-            person.setSubject(current_subjects)
-            setattr(person, 'market', all_markets_transform)
+            changes.add_subjects(all_markets_transform)
+            changes.set('market', all_markets_transform)
         else:
-            setattr(person, 'market', [])
+            changes.set('market', [])
 
         return [fieldvalue]
 
-    def _transform_person_picture(self, person, fieldname, fieldvalue):
+    def _transform_person_picture(self, changes, fieldname, fieldvalue):
         url = fieldvalue
 
-        current_url = getattr(person, 'pictureUrl', None)
+        current_url = changes.get('pictureUrl', None)
 
         if url:
             if not current_url:
-                image_created_url = self.add_image_to_person(url, person)
-                setattr(person, 'pictureUrl', url)
+                image_created_url = self.add_image_to_person(url, changes)
+                changes.set('pictureUrl', url)
             elif current_url != url:
-                image_created_url = self.add_image_to_person(url, person)
-                setattr(person, 'pictureUrl', url)
+                image_created_url = self.add_image_to_person(url, changes)
+                changes.set('pictureUrl', url)
             else:
-                setattr(person, 'pictureUrl', url)
+                changes.set('pictureUrl', url)
                 return url
 
             return url
         else:
-            setattr(person, 'preview_image', None)
+            changes.set('preview_image', None)
             return url
 
     def get_drive_file_id(self, url):
@@ -489,10 +833,26 @@ class SyncManager(object):
             return None
 
     # Utils
-    def download_image(self, url):
+    def download_image_by_id(self, image_id):
+        if image_id:
+            image_url = self.DOWNLOAD_URL_TEMPLATE %(image_id)
+            with time_phase("image_download"):
+                return self.download_image(image_url, image_id=image_id)
+        else:
+            return None
+
+    def download_image(self, url, image_id=None):
         if url:
             try:
-                img_request = requests.get(url, stream=True)
+                # Cached images are revalidated with ETag/Last-Modified
+                headers = self.image_cache.get_validators(image_id) if image_id else {}
+                img_request = self.http_session.get(url, headers=headers)
+                if img_request.status_code == 304:
+                    cached_data = self.image_cache.get(image_id)
+                    if cached_data is not None:
+                        return cached_data
+                    img_request = self.http_session.get(url)
+
                 if img_request:
                     img_headers = img_request.headers.get('content-type')
 
@@ -500,6 +860,8 @@ class SyncManager(object):
                         # TODO : Log error
                         return None
                     img_data = img_request.content
+                    if image_id:
+                        self.image_cache.set(image_id, img_data, etag=img_request.headers.get('ETag'), last_modified=img_request.headers.get('Last-Modified'))
                     return img_data
                 else:
                     # TODO: log error
@@ -510,8 +872,12 @@ class SyncManager(object):
         else:
             return None
 
-    def get_image_blob(self, img_data):
+    def get_image_blob(self, img_data, current_blob=None):
         if img_data:
+            # Keep the current blob when the bytes are identical
+            if is_same_image(current_blob, img_data):
+                return current_blob
+
             image_data = img_data
             img_blob = NamedBlobImage(data=image_data)
 
@@ -519,16 +885,23 @@ class SyncManager(object):
         else:
             return None
 
-    def add_image_to_person(self, url, person):
-        image_url = self.generate_image_url(url)
-        image_data = self.download_image(image_url)
-        image_blob = self.get_image_blob(image_data)
+    def add_image_to_person(self, url, changes):
+        if self.dry_run:
+            # The current picture is kept in the plan
+            return url
+
+        image_id = self.get_drive_file_id(url)
+        if self.image_prefetcher.has_image(image_id):
+            image_data = self.image_prefetcher.get_image(image_id)
+        else:
+            image_data = self.download_image_by_id(image_id)
+        image_blob = self.get_image_blob(image_data, current_blob=changes.get('preview_image', None))
 
         if image_blob:
-            setattr(person, 'preview_image', image_blob)
+            changes.set('preview_image', image_blob)
             return url
         else:
-            setattr(person, 'preview_image', None)
+            changes.set('preview_image', None)
             return url
 
     def invalidate_cache(self):
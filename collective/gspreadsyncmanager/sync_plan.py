@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Plans of the full syncs.
+# A plan is built read-only: the rows are compared with the website and
+# every row gets a create, update, unpublish or skip operation with its
+# field-level diffs. The sync managers apply the plan afterwards in short
+# write transactions, or only return it for a dry run.
+#
+from datetime import date, datetime
+
+OPERATION_CREATE = "create"
+OPERATION_UPDATE = "update"
+OPERATION_UNPUBLISH = "unpublish"
+OPERATION_SKIP = "skip"
+
+OPERATIONS = (OPERATION_CREATE, OPERATION_UPDATE, OPERATION_UNPUBLISH, OPERATION_SKIP)
+
+# Progress counter of every applied operation
+OPERATION_COUNTERS = {
+    OPERATION_CREATE: 'created',
+    OPERATION_UPDATE: 'updated',
+    OPERATION_UNPUBLISH: 'unpublished',
+    OPERATION_SKIP: 'skipped'
+}
+
+DEFAULT_OPERATIONS_LIMIT = 500 # operations listed by to_dict
+
+
+def format_value(value):
+    # JSON-safe representation of a field value in a diff
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [format_value(item) for item in value]
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, 'raw'):
+        # RichTextValue
+        return value.raw
+    if hasattr(value, 'getSize'):
+        # Blob images and files
+        return "<%s, %s bytes>" %(value.__class__.__name__, value.getSize())
+    return repr(value)
+
+def get_creation_diffs(field_plan, data):
+    # New values of the mapped Plone fields of an object that is created
+    diffs = {}
+    for fieldname, plonefield, transform in field_plan:
+        if fieldname in data:
+            diffs[plonefield] = (None, data[fieldname])
+    return diffs
+
+
+class SyncOperation(object):
+    #
+    # One planned operation. 'changes' are the staged field changes of an
+    # update, 'diffs' are (current value, new value) pairs by Plone field.
+    # Operations with an 'error' could not be planned and are not applied.
+    #
+    __slots__ = ('operation', 'item_id', 'data', 'brain', 'changes', 'diffs', 'reason', 'error')
+
+    def __init__(self, operation, item_id, data=None, brain=None, changes=None, diffs=None, reason=None, error=None):
+        self.operation = operation
+        self.item_id = item_id
+        self.data = data
+        self.brain = brain
+        self.changes = changes
+        self.diffs = diffs or {}
+        self.reason = reason
+        self.error = error
+
+    def to_dict(self):
+        return {
+            'operation': self.operation,
+            'item_id': self.item_id,
+            'url': self.brain.getURL() if self.brain is not None else None,
+            'diffs': dict((fieldname, {'current': format_value(current), 'new': format_value(new)}) for fieldname, (current, new) in self.diffs.items()),
+            'reason': self.reason,
+            'error': self.error
+        }
+
+
+class SyncPlan(object):
+
+    def __init__(self, sync_type):
+        self.sync_type = sync_type
+        self.operations = []
+        self.counts = dict((operation, 0) for operation in OPERATIONS)
+        self.errors = 0
+
+    def add(self, operation):
+        self.operations.append(operation)
+        self.counts[operation.operation] += 1
+        if operation.error:
+            self.errors += 1
+        return operation
+
+    def extend(self, plan):
+        for operation in plan:
+            self.add(operation)
+        return self
+
+    def get_operations(self, operation=None):
+        return [planned for planned in self.operations if operation is None or planned.operation == operation]
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+    def to_dict(self, include_skipped=False, limit=DEFAULT_OPERATIONS_LIMIT):
+        operations = [planned for planned in self.operations if include_skipped or planned.operation != OPERATION_SKIP]
+        listed_operations = operations[:limit] if limit is not None else operations
+
+        return {
+            'sync_type': self.sync_type,
+            'counts': dict(self.counts),
+            'errors': self.errors,
+            'operations': [planned.to_dict() for planned in listed_operations],
+            'truncated': len(listed_operations) < len(operations)
+        }
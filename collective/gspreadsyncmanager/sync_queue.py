@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+import transaction
+
+# Logging module
+from .logging.logging import logger
+
+PRIORITY_SINGLE = 0 # single-item syncs go ahead of full syncs
+PRIORITY_FULL = 10
+
+DEFAULT_WORKERS = 2
+DEFAULT_CONCURRENCY = 1 # running jobs of a type without a limit
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+FINISHED_JOBS_LIMIT = 50
+
+
+class SyncJob(object):
+    #
+    # One sync request. Jobs with the same type, site and item
+    # are identical and only queued once. The job runs as the user with
+    # the login name 'username'. 'headers' authenticate the HTTP requests
+    # of the job and are never listed.
+    #
+    def __init__(self, job_type, site_path, item_id=None, user_id=None, username=None, priority=None, headers=None):
+        self.job_id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.site_path = tuple(site_path)
+        self.item_id = item_id
+        self.user_id = user_id
+        self.username = username
+        self.headers = headers or {}
+
+        if priority is None:
+            priority = PRIORITY_SINGLE if item_id else PRIORITY_FULL
+        self.priority = priority
+
+        self.status = STATUS_QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def get_key(self):
+        return (self.job_type, self.site_path, self.item_id)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'job_type': self.job_type,
+            'site_path': "/".join(self.site_path),
+            'item_id': self.item_id,
+            'user_id': self.user_id,
+            'username': self.username,
+            'priority': self.priority,
+            'status': self.status,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+class SyncQueue(object):
+    #
+    # In-process queue of sync jobs, run by worker threads outside the
+    # request that queued them. Every job opens its own ZODB connection.
+    # Identical jobs are only queued once and are never run at the same time,
+    # job types are limited by 'concurrency' and lower priorities run first.
+    # Without 'runners' the queue runs the sync jobs.
+    #
+    def __init__(self, runners=None, workers=DEFAULT_WORKERS, concurrency=None):
+        self.runners = runners
+        self.workers = max(int(workers or 1), 1)
+        self.concurrency = {}
+
+        if self.runners is None:
+            # The sync jobs load the sync managers and Plone
+            from .sync_jobs import JOB_RUNNERS, JOB_CONCURRENCY
+            self.runners = JOB_RUNNERS
+            self.concurrency.update(JOB_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.pending = []
+        self.pending_keys = {}
+        self.running = {}
+        self.finished = []
+        self.threads = []
+
+    #
+    # Queue operations
+    #
+    def add(self, job):
+        # Returns the queued job, which is the identical pending job if there is one
+        if job.job_type not in self.runners:
+            raise ValueError("Unknown sync job type '%s'" %(job.job_type))
+
+        with self.condition:
+            existing_job = self.pending_keys.get(job.get_key(), None)
+            if existing_job is not None:
+                return existing_job
+
+            heapq.heappush(self.pending, (job.priority, next(self.sequence), job))
+            self.pending_keys[job.get_key()] = job
+            self.start_workers()
+            self.condition.notify()
+
+        logger("[Status] Sync job '%s' is queued. Type: %s" %(job.job_id, job.job_type))
+        return job
+
+    def get_next_job(self):
+        # Called with the condition acquired
+        running_keys = set(job.get_key() for job in self.running.values())
+        for entry in sorted(self.pending):
+            job = entry[2]
+            if job.get_key() in running_keys:
+                continue
+            if self.count_running(job.job_type) >= self.concurrency.get(job.job_type, DEFAULT_CONCURRENCY):
+                continue
+
+            self.pending.remove(entry)
+            heapq.heapify(self.pending)
+            del self.pending_keys[job.get_key()]
+            return job
+
+        return None
+
+    def count_running(self, job_type):
+        return len([job for job in self.running.values() if job.job_type == job_type])
+
+    def get_jobs(self):
+        with self.condition:
+            pending_jobs = [entry[2] for entry in sorted(self.pending)]
+            return {
+                'pending': [job.to_dict() for job in pending_jobs],
+                'running': [job.to_dict() for job in self.running.values()],
+                'finished': [job.to_dict() for job in self.finished]
+            }
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending) + len(self.running)
+
+    #
+    # Workers
+    #
+    def start_workers(self):
+        # Called with the condition acquired
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self.work, name="gspreadsync-worker-%s" %(len(self.threads) + 1))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def work(self):
+        while True:
+            with self.condition:
+                job = self.get_next_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self.get_next_job()
+
+                job.status = STATUS_RUNNING
+                job.started = time.time()
+                self.running[job.job_id] = job
+
+            try:
+                self.run_job(job)
+                job.status = STATUS_DONE
+            except Exception as err:
+                job.status = STATUS_FAILED
+                job.error = str(err)
+                logger("[Error] Sync job '%s' failed. Type: %s" %(job.job_id, job.job_type), err)
+            finally:
+                job.finished = time.time()
+                with self.condition:
+                    del self.running[job.job_id]
+                    self.finished = ([job] + self.finished)[:FINISHED_JOBS_LIMIT]
+                    # Jobs waiting for this type or key can run now
+                    self.condition.notify_all()
+
+    def run_job(self, job):
+        runner = self.runners[job.job_type]
+
+        # Jobs only run as the user that queued them
+        if not job.username:
+            raise ValueError("Sync job '%s' has no user to run as." %(job.job_id))
+
+        # Zope and Plone are only needed by the workers
+        import plone.api
+        import Zope2
+        from Testing.makerequest import makerequest
+        from zope.component.hooks import setSite
+
+        # The worker has its own ZODB connection and request
+        app = makerequest(Zope2.app())
+        try:
+            transaction.begin()
+            site = app.unrestrictedTraverse(job.site_path)
+            setSite(site)
+
+            with plone.api.env.adopt_user(username=job.username):
+                runner(site, job)
+
+            transaction.commit()
+        except Exception:
+            transaction.abort()
+            raise
+        finally:
+            setSite(None)
+            app._p_jar.close()
+
+
+_sync_queue = None
+_sync_queue_lock = threading.Lock()
+
+def get_sync_queue():
+    # One queue per process
+    global _sync_queue
+    with _sync_queue_lock:
+        if _sync_queue is None:
+            _sync_queue = SyncQueue()
+        return _sync_queue
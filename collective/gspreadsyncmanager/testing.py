@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Test layers of the sync. The fixture site has the package profile,
+# person and organization types with the synced fields, their catalog
+# indexes and the folders the sync managers create content in.
+#
+import plone.api
+from plone.app.testing import PLONE_FIXTURE
+from plone.app.testing import PloneSandboxLayer
+from plone.app.testing import FunctionalTesting
+from plone.app.testing import IntegrationTesting
+from plone.app.testing import applyProfile
+from plone.dexterity.fti import DexterityFTI
+from plone.namedfile.field import NamedBlobImage
+from plone.supermodel import model
+from Acquisition import aq_parent
+from plone.dexterity.interfaces import IDexterityContent
+from Products.ZCatalog.Catalog import CatalogError
+from zope import schema
+from zope.component import provideHandler
+from zope.lifecycleevent.interfaces import IObjectAddedEvent
+
+PERSON_TYPE = "person"
+ORGANIZATION_TYPE = "organization"
+
+FIXTURE_BEHAVIORS = ('plone.dublincore',)
+
+# Catalog indexes and metadata columns the sync managers query
+FIXTURE_INDEXES = ('person_id', 'organization_id', 'google_ads_id', 'Language')
+FIXTURE_COLUMNS = ('person_id', 'organization_id', 'google_ads_id')
+
+FIXTURE_FOLDERS = (
+    "/en",
+    "/en/team",
+    "/en/team/colleagues",
+    "/en/team/interns",
+    "/en/organizations"
+)
+
+
+class IFixturePerson(model.Schema):
+    # Fields of CORE in mapping_core
+
+    person_id = schema.TextLine(title=u"Person ID", required=False)
+    pictureUrl = schema.TextLine(title=u"Picture URL", required=False)
+    preview_image = NamedBlobImage(title=u"Picture", required=False)
+    phone = schema.TextLine(title=u"Phone", required=False)
+    email = schema.TextLine(title=u"Email", required=False)
+    colleague = schema.TextLine(title=u"Colleague", required=False)
+    start_date = schema.TextLine(title=u"Start date", required=False)
+    mentor = schema.TextLine(title=u"Mentor", required=False)
+    team = schema.TextLine(title=u"Team", required=False)
+    market = schema.List(title=u"Market", value_type=schema.TextLine(), required=False)
+
+
+class IFixtureOrganization(model.Schema):
+    # Fields of CORE_ORGANIZATIONS in mapping_core
+
+    google_ads_id = schema.TextLine(title=u"Google Ads ID", required=False)
+    pictureUrl = schema.TextLine(title=u"Picture URL", required=False)
+    preview_image = NamedBlobImage(title=u"Picture", required=False)
+    country = schema.TextLine(title=u"Country", required=False)
+    organization_language = schema.TextLine(title=u"Organization language", required=False)
+    city = schema.TextLine(title=u"City", required=False)
+
+
+def set_container_language(obj, event):
+    # New content gets the language of its folder,
+    # like plone.app.multilingual sets it in the synced sites
+    if not obj.Language():
+        obj.setLanguage(aq_parent(obj).Language())
+
+def add_fixture_type(portal, portal_type, schema_interface):
+    fti = DexterityFTI(portal_type)
+    fti.klass = "plone.dexterity.content.Item"
+    fti.schema = schema_interface.__identifier__
+    fti.behaviors = FIXTURE_BEHAVIORS
+    fti.global_allow = True
+    portal.portal_types._setObject(portal_type, fti)
+    return fti
+
+def add_fixture_catalog(portal):
+    catalog = portal.portal_catalog
+    for index_name in FIXTURE_INDEXES:
+        if index_name not in catalog.indexes():
+            catalog.addIndex(index_name, 'FieldIndex')
+    for column_name in FIXTURE_COLUMNS:
+        try:
+            catalog.addColumn(column_name)
+        except CatalogError:
+            # The column exists already
+            pass
+
+def add_fixture_folders(portal):
+    for path in FIXTURE_FOLDERS:
+        parent_path, folder_id = path.rsplit("/", 1)
+        container = plone.api.content.get(path=parent_path or "/")
+        folder = plone.api.content.create(container=container, type="Folder", id=folder_id, title=folder_id)
+        folder.setLanguage("en")
+        folder.reindexObject()
+
+
+class GspreadsyncmanagerLayer(PloneSandboxLayer):
+
+    defaultBases = (PLONE_FIXTURE,)
+
+    def setUpZope(self, app, configurationContext):
+        import plone.app.contenttypes
+        self.loadZCML(package=plone.app.contenttypes)
+
+        import collective.gspreadsyncmanager
+        self.loadZCML(package=collective.gspreadsyncmanager)
+
+        provideHandler(set_container_language, (IDexterityContent, IObjectAddedEvent))
+
+    def setUpPloneSite(self, portal):
+        applyProfile(portal, 'plone.app.contenttypes:default')
+        applyProfile(portal, 'collective.gspreadsyncmanager:default')
+        portal.portal_workflow.setDefaultChain("simple_publication_workflow")
+
+        add_fixture_type(portal, PERSON_TYPE, IFixturePerson)
+        add_fixture_type(portal, ORGANIZATION_TYPE, IFixtureOrganization)
+        add_fixture_catalog(portal)
+
+        with plone.api.env.adopt_roles(['Manager']):
+            add_fixture_folders(portal)
+
+
+GSPREADSYNCMANAGER_FIXTURE = GspreadsyncmanagerLayer()
+
+GSPREADSYNCMANAGER_INTEGRATION_TESTING = IntegrationTesting(
+    bases=(GSPREADSYNCMANAGER_FIXTURE,),
+    name="GspreadsyncmanagerLayer:IntegrationTesting"
+)
+
+# The syncs commit their batches, so they run on the functional layer
+GSPREADSYNCMANAGER_FUNCTIONAL_TESTING = FunctionalTesting(
+    bases=(GSPREADSYNCMANAGER_FIXTURE,),
+    name="GspreadsyncmanagerLayer:FunctionalTesting"
+)
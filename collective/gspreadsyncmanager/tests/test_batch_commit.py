@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+import transaction
+from ZODB.POSException import ConflictError
+
+from collective.gspreadsyncmanager.batch_commit import BatchCommitter
+
+
+class RecordingSavepoint(object):
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.pending = list(data_manager.pending)
+
+    def rollback(self):
+        self.data_manager.pending = list(self.pending)
+
+
+class RecordingDataManager(object):
+    #
+    # Records the values written in every committed transaction.
+    # The first 'conflicts' commits fail with a ConflictError.
+    #
+    transaction_manager = transaction.manager
+
+    def __init__(self, conflicts=0):
+        self.conflicts = conflicts
+        self.committed = []
+        self.pending = []
+        self.joined = False
+
+    def write(self, value):
+        if not self.joined:
+            transaction.get().join(self)
+            self.joined = True
+        self.pending.append(value)
+
+    def reset(self):
+        self.pending = []
+        self.joined = False
+
+    def abort(self, txn):
+        self.reset()
+
+    def tpc_begin(self, txn):
+        pass
+
+    def commit(self, txn):
+        pass
+
+    def tpc_vote(self, txn):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise ConflictError()
+
+    def tpc_finish(self, txn):
+        self.committed.append(self.pending)
+        self.reset()
+
+    def tpc_abort(self, txn):
+        self.reset()
+
+    def sortKey(self):
+        return "recording"
+
+    def savepoint(self):
+        return RecordingSavepoint(self)
+
+
+class TestBatchCommitter(unittest.TestCase):
+
+    def setUp(self):
+        transaction.abort()
+        sleep_patcher = mock.patch('collective.gspreadsyncmanager.batch_commit.time.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.addCleanup(transaction.abort)
+
+    def test_commits_every_batch_size_operations(self):
+        data_manager = RecordingDataManager()
+        committer = BatchCommitter(batch_size=3)
+
+        for value in range(7):
+            committer.run(data_manager.write, value)
+
+        self.assertEqual(data_manager.committed, [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(data_manager.pending, [6])
+
+        committed, failed = committer.commit()
+        self.assertEqual([args for operation, args, kwargs in committed], [(6,)])
+        self.assertEqual(failed, [])
+        self.assertEqual(data_manager.committed[-1], [6])
+        self.assertEqual(committer.operations, [])
+
+    def test_failing_operation_only_rolls_back_itself(self):
+        data_manager = RecordingDataManager()
+        committer = BatchCommitter(batch_size=10)
+
+        def write_and_fail(value):
+            data_manager.write(value)
+            raise ValueError("Invalid row")
+
+        committer.run(data_manager.write, 1)
+        self.assertRaises(ValueError, committer.run, write_and_fail, 2)
+        committer.run(data_manager.write, 3)
+        committer.commit()
+
+        self.assertEqual(data_manager.committed, [[1, 3]])
+
+    def test_is_running_only_inside_an_operation(self):
+        committer = BatchCommitter()
+        self.assertFalse(committer.is_running())
+        self.assertTrue(committer.run(committer.is_running))
+        self.assertFalse(committer.is_running())
+
+    def test_conflict_aborts_and_replays_the_batch(self):
+        data_manager = RecordingDataManager(conflicts=1)
+        committer = BatchCommitter(batch_size=2)
+        calls = []
+
+        def write(value):
+            calls.append(value)
+            data_manager.write(value)
+
+        committer.run(write, 1)
+        committer.run(write, 2)
+
+        self.assertEqual(data_manager.committed, [[1, 2]])
+        self.assertEqual(calls, [1, 2, 1, 2])
+        self.sleep.assert_called_once_with(BatchCommitter.RETRY_DELAY)
+
+    def test_conflict_backoff_gives_up_after_the_retries(self):
+        data_manager = RecordingDataManager(conflicts=10)
+        committer = BatchCommitter(batch_size=5, conflict_retries=2)
+
+        committer.run(data_manager.write, 1)
+        committed, failed = committer.commit()
+
+        self.assertEqual(committed, [])
+        self.assertEqual([args for operation, args, kwargs in failed], [(1,)])
+
+        self.assertEqual(data_manager.committed, [])
+        self.assertEqual(committer.operations, [])
+        self.assertEqual([call[0][0] for call in self.sleep.call_args_list], [BatchCommitter.RETRY_DELAY, BatchCommitter.RETRY_DELAY * 2])
+
+    def test_replayed_operation_that_fails_is_dropped(self):
+        data_manager = RecordingDataManager(conflicts=1)
+        committer = BatchCommitter(batch_size=10)
+        attempts = []
+
+        def write_once(value):
+            attempts.append(value)
+            if len(attempts) > 1:
+                raise ValueError("Row changed")
+            data_manager.write(value)
+
+        committer.run(write_once, 1)
+        committer.run(data_manager.write, 2)
+        committed, failed = committer.commit()
+
+        self.assertEqual([args for operation, args, kwargs in committed], [(2,)])
+        self.assertEqual([args for operation, args, kwargs in failed], [(1,)])
+        self.assertEqual(data_manager.committed, [[2]])
+
+    def test_other_commit_errors_abort_and_raise(self):
+        data_manager = RecordingDataManager()
+        committer = BatchCommitter(batch_size=10)
+
+        def fail_vote(txn):
+            raise IOError("Storage is not available")
+        data_manager.tpc_vote = fail_vote
+
+        committer.run(data_manager.write, 1)
+        self.assertRaises(IOError, committer.commit)
+
+        self.assertEqual(data_manager.committed, [])
+        self.assertEqual(data_manager.pending, [])
+        self.assertEqual(committer.operations, [])
+        self.assertFalse(transaction.get().isDoomed())
+
+    def test_add_does_not_commit(self):
+        data_manager = RecordingDataManager()
+        committer = BatchCommitter(batch_size=1)
+
+        committer.add(data_manager.write, 1)
+
+        self.assertTrue(committer.is_full())
+        self.assertEqual(data_manager.committed, [])
+        self.assertEqual(data_manager.pending, [1])
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+try:
+    from collective.gspreadsyncmanager.benchmarks.helpers import run_benchmarks, load_baseline, get_threshold, get_slowdown
+except ImportError as err:
+    # The ID helpers need plone.i18n
+    raise unittest.SkipTest("Plone is not installed: %s" %(err))
+
+
+class TestHelperBenchmarks(unittest.TestCase):
+    #
+    # Compares the relative cost of the per-row helpers with the baseline
+    # in benchmarks/helpers_baseline.json
+    #
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run_benchmarks()
+        cls.baseline = load_baseline()
+
+    def test_baseline_covers_all_helpers(self):
+        self.assertIsNotNone(self.baseline)
+        self.assertEqual(sorted(self.baseline), sorted(self.results))
+
+    def test_helpers_are_not_slower_than_the_baseline(self):
+        threshold = get_threshold()
+        for name, result in sorted(self.results.items()):
+            with self.subTest(helper=name):
+                slowdown = get_slowdown(result, self.baseline.get(name, None))
+                self.assertIsNotNone(slowdown)
+                self.assertLessEqual(slowdown, threshold, "%s is %.1f%% slower than the baseline" %(name, slowdown))
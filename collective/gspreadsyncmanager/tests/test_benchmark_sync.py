@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+try:
+    from plone.app.testing import setRoles, TEST_USER_ID
+    from collective.gspreadsyncmanager.testing import GSPREADSYNCMANAGER_FUNCTIONAL_TESTING
+except ImportError as err:
+    # The layer needs Plone and the 'test' extra of the package
+    raise unittest.SkipTest("Plone test layers are not installed: %s" %(err))
+
+from collective.gspreadsyncmanager.benchmarks.sync import run_scenario, get_sizes, save_results, SYNC_PERSONS, SYNC_ORGANIZATIONS
+
+# Catalog searches of one full sync, independent of the number of rows
+MAX_CATALOG_QUERIES = 2
+
+# plone.api renames new content from a temporary id and the
+# plone.app.discussion move subscriber searches the catalog for each one
+PLONE_QUERIES_PER_CREATED_ITEM = 1
+
+
+class TestSyncBenchmark(unittest.TestCase):
+    #
+    # Runs the end-to-end benchmark on the test layer and fails on
+    # regressions of the work per row, which does not depend on the machine
+    #
+    layer = GSPREADSYNCMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer['portal']
+        setRoles(self.portal, TEST_USER_ID, ['Manager'])
+
+    def run_benchmark(self, sync_type):
+        scenarios = [run_scenario(self.portal, sync_type, row_count) for row_count in get_sizes()]
+        save_results(sync_type, scenarios)
+        return scenarios
+
+    def check_scenario(self, scenario):
+        initial = scenario['initial']
+        changed = scenario['changed']
+        row_count = scenario['rows']
+        changed_rows = changed['changed_rows']
+
+        self.assertEqual(initial['created'], row_count)
+        self.assertEqual(initial['failed'], 0)
+        self.assertEqual(changed['updated'], changed_rows)
+        self.assertEqual(changed['skipped'], row_count - changed_rows)
+        self.assertEqual(changed['failed'], 0)
+
+        self.assertLessEqual(initial["catalog_queries"], MAX_CATALOG_QUERIES + PLONE_QUERIES_PER_CREATED_ITEM * row_count)
+        self.assertLessEqual(changed['catalog_queries'], MAX_CATALOG_QUERIES)
+
+        # Skipped rows are not written again
+        self.assertLess(changed['zodb_bytes_written'], initial['zodb_bytes_written'] * changed_rows / row_count * 2)
+
+    def test_persons(self):
+        for scenario in self.run_benchmark(SYNC_PERSONS):
+            self.check_scenario(scenario)
+
+    def test_organizations(self):
+        for scenario in self.run_benchmark(SYNC_ORGANIZATIONS):
+            self.check_scenario(scenario)
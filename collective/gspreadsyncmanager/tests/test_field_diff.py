@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from collective.gspreadsyncmanager.field_diff import FieldChanges, SubjectComposer, SUBJECT_FIELD, SUBJECTS_FIELD
+
+PRESERVED_SUBJECTS = ('frontpage', 'frontpage-collection')
+
+
+class FakeContent(object):
+    #
+    # Content object that records the fields that are written
+    #
+    def __init__(self, subjects=(), **fields):
+        object.__setattr__(self, 'written', [])
+        object.__setattr__(self, 'subjects', tuple(subjects))
+        for fieldname, value in fields.items():
+            object.__setattr__(self, fieldname, value)
+
+    def __setattr__(self, fieldname, value):
+        self.written.append(fieldname)
+        object.__setattr__(self, fieldname, value)
+
+    def Subject(self):
+        return self.subjects
+
+    def setSubject(self, subjects):
+        self.written.append(SUBJECT_FIELD)
+        object.__setattr__(self, 'subjects', tuple(subjects))
+
+
+class TestFieldChanges(unittest.TestCase):
+
+    def test_only_changed_fields_are_written(self):
+        obj = FakeContent(title="Ann", phone="0612345678", email="ann@example.com")
+        changes = FieldChanges(obj)
+        changes.set('title', "Ann")
+        changes.set('phone', "0687654321")
+        changes.set('email', "ann@example.com")
+
+        self.assertEqual(changes.apply(), ['phone'])
+        self.assertEqual(obj.written, ['phone'])
+        self.assertEqual(obj.phone, "0687654321")
+        self.assertEqual(changes.staged, {})
+
+    def test_unchanged_object_is_not_written(self):
+        obj = FakeContent(title="Ann")
+        changes = FieldChanges(obj)
+        changes.set('title', "Ann")
+
+        self.assertEqual(changes.apply(), [])
+        self.assertEqual(obj.written, [])
+
+    def test_missing_fields_are_written(self):
+        obj = FakeContent()
+        changes = FieldChanges(obj)
+        changes.set('market', "")
+
+        self.assertEqual(changes.apply(), ['market'])
+        self.assertEqual(obj.market, "")
+
+    def test_staged_values_are_read_before_current_values(self):
+        obj = FakeContent(title="Ann")
+        changes = FieldChanges(obj)
+        self.assertTrue(changes.exists('title'))
+        self.assertFalse(changes.exists('phone'))
+
+        changes.set('title', "Bob")
+        self.assertEqual(changes.get('title'), "Bob")
+        self.assertEqual(changes.get_current('title'), "Ann")
+        self.assertEqual(changes.get('phone', "none"), "none")
+
+    def test_diffs_are_read_only(self):
+        obj = FakeContent(title="Ann", phone="0612345678")
+        changes = FieldChanges(obj)
+        changes.set('title', "Bob")
+        changes.set('phone', "0612345678")
+        changes.set('email', "bob@example.com")
+
+        self.assertEqual(changes.get_diffs(), {'title': ("Ann", "Bob"), 'email': (None, "bob@example.com")})
+        self.assertEqual(obj.written, [])
+
+    def test_failing_field_is_not_changed(self):
+        class ReadOnlyContent(FakeContent):
+            def __setattr__(self, fieldname, value):
+                if fieldname == 'title':
+                    raise AttributeError("read-only")
+                FakeContent.__setattr__(self, fieldname, value)
+
+        obj = ReadOnlyContent(title="Ann", phone="")
+        changes = FieldChanges(obj)
+        changes.set('title', "Bob")
+        changes.set('phone', "0612345678")
+
+        self.assertEqual(changes.apply(), ['phone'])
+
+
+class TestSubjects(unittest.TestCase):
+
+    def test_composed_subjects_are_unique_and_keep_preserved_flags(self):
+        composer = SubjectComposer(("frontpage", "old", "colleague"), PRESERVED_SUBJECTS)
+        composer.add(["colleague", " Dutch market ", "", None])
+        composer.add(["colleague", "Netherlands"])
+
+        self.assertEqual(composer.compose(), ("frontpage", "colleague", "Dutch market", "Netherlands"))
+        self.assertTrue(composer.is_changed())
+
+    def test_same_set_in_another_order_is_unchanged(self):
+        composer = SubjectComposer(("b", "a"))
+        composer.add(["a", "b"])
+        self.assertFalse(composer.is_changed())
+
+    def test_duplicated_current_subjects_are_cleaned_up(self):
+        composer = SubjectComposer(("a", "b", "a"))
+        composer.add(["a", "b"])
+        self.assertTrue(composer.is_changed())
+        self.assertEqual(composer.compose(), ("a", "b"))
+
+    def test_set_subject_only_when_the_set_changed(self):
+        obj = FakeContent(subjects=("intern", "frontpage"))
+        changes = FieldChanges(obj, PRESERVED_SUBJECTS)
+        changes.reset_subjects()
+        changes.add_subjects(["intern"])
+
+        self.assertEqual(changes.apply(), [])
+        self.assertEqual(obj.written, [])
+
+    def test_subjects_are_merged_from_every_contribution(self):
+        obj = FakeContent(subjects=("intern", "frontpage", "old market"))
+        changes = FieldChanges(obj, PRESERVED_SUBJECTS)
+        changes.reset_subjects()
+        changes.set(SUBJECTS_FIELD, "")
+        changes.add_subjects(["colleague"])
+        changes.add_subjects(["Dutch market", "colleague"])
+
+        self.assertEqual(changes.get_subjects(), ("frontpage", "colleague", "Dutch market"))
+        self.assertEqual(changes.apply(), [SUBJECT_FIELD])
+        self.assertEqual(obj.Subject(), ("frontpage", "colleague", "Dutch market"))
+        self.assertEqual(obj.written, [SUBJECT_FIELD])
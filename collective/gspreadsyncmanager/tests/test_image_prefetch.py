@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from collective.gspreadsyncmanager.image_prefetch import ImagePrefetcher
+
+
+class TestImagePrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.downloads = []
+        self.prefetcher = ImagePrefetcher(self.download, max_workers=2)
+
+    def download(self, key):
+        self.downloads.append(key)
+        if key == "broken":
+            raise IOError("Download failed")
+        return ("bytes of %s" %(key)).encode('utf-8')
+
+    def test_shared_images_are_downloaded_once_and_kept(self):
+        self.prefetcher.prefetch(["shared", "other", "shared", None])
+
+        self.assertEqual(sorted(self.downloads), ["other", "shared"])
+        self.assertEqual(self.prefetcher.get_image("shared"), b"bytes of shared")
+        self.assertEqual(self.prefetcher.get_image("shared"), b"bytes of shared")
+        self.assertTrue(self.prefetcher.has_image("shared"))
+
+    def test_prefetched_images_are_not_downloaded_again(self):
+        self.prefetcher.prefetch(["shared"])
+        self.prefetcher.prefetch(["shared", "other"])
+
+        self.assertEqual(self.downloads, ["shared", "other"])
+
+    def test_failed_downloads_are_kept_as_none(self):
+        self.prefetcher.prefetch(["broken"])
+
+        self.assertTrue(self.prefetcher.has_image("broken"))
+        self.assertIsNone(self.prefetcher.get_image("broken"))
+
+    def test_clear_frees_the_chunk(self):
+        self.prefetcher.prefetch(["shared"])
+        self.prefetcher.clear()
+
+        self.assertFalse(self.prefetcher.has_image("shared"))
+        self.assertIsNone(self.prefetcher.get_image("shared"))
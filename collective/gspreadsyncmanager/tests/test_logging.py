@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import logging
+import unittest
+
+from collective.gspreadsyncmanager.logging.logging import logger, get_logger, flush_logs, LOGGER_NAME
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogger(unittest.TestCase):
+    #
+    # The records are caught by a handler of the parent logger,
+    # like the handlers that the instance configures
+    #
+    def setUp(self):
+        # Warnings counted by earlier tests are reported first
+        flush_logs()
+        self.handler = RecordingHandler()
+        self.parent = logging.getLogger(LOGGER_NAME.split(".")[0])
+        self.parent.addHandler(self.handler)
+        self.parent_level = self.parent.level
+        self.parent.setLevel(logging.DEBUG)
+        self.addCleanup(self.parent.removeHandler, self.handler)
+        self.addCleanup(self.parent.setLevel, self.parent_level)
+        self.addCleanup(flush_logs)
+
+    def get_messages(self):
+        return [(record.levelno, record.getMessage()) for record in self.handler.records]
+
+    def test_records_propagate_to_the_instance_handlers(self):
+        log = get_logger()
+        self.assertTrue(log.propagate)
+        self.assertFalse([handler for handler in log.handlers if isinstance(handler, logging.StreamHandler)])
+
+        logger("[Status] Sync of %s rows is started.", "", 3)
+        self.assertEqual(self.get_messages(), [(logging.INFO, "[Status] Sync of 3 rows is started.")])
+
+    def test_level_comes_from_the_prefix(self):
+        logger("[Error] Sheet not found.", "Not found")
+        logger("[Warning] Row is invalid.", "Invalid row")
+
+        self.assertEqual(self.get_messages(), [
+            (logging.ERROR, "[Error] Sheet not found. Exception: Not found"),
+            (logging.WARNING, "[Warning] Row is invalid. Exception: Invalid row")
+        ])
+        self.assertEqual(self.handler.records[0].err, "Not found")
+
+    def test_messages_with_percent_signs(self):
+        logger("[Error] Image 'a%20b' is not found.", "Not found")
+        self.assertEqual(self.get_messages(), [(logging.ERROR, "[Error] Image 'a%20b' is not found. Exception: Not found")])
+
+    def test_repeated_warnings_are_counted(self):
+        for attempt in range(3):
+            logger("[Warning] Person ID '1' is repeated in the spreadsheet.", "Duplicated ID")
+        flush_logs()
+
+        self.assertEqual(self.get_messages(), [
+            (logging.WARNING, "[Warning] Person ID '1' is repeated in the spreadsheet. Exception: Duplicated ID"),
+            (logging.WARNING, "[Warning] Person ID '1' is repeated in the spreadsheet. Exception: Duplicated ID (repeated 2 more times)")
+        ])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import pickle
+import unittest
+
+from collective.gspreadsyncmanager.api_modules.gsheets.records import create_record_type, create_row_extractor
+
+API_MAPPING = {
+    "name": 0,
+    "phone": 3,
+    "type": 1
+}
+
+RowRecord = create_record_type("RowRecord", API_MAPPING, extra_fields=('_id', '_fingerprint'), module=__name__)
+
+
+class RowRecordType(unittest.TestCase):
+
+    def setUp(self):
+        self.record = RowRecord._make(("Ann", "0612345678", "colleague", "ann", "f1"))
+
+    def test_fields_in_mapping_order(self):
+        self.assertEqual(RowRecord._fields, ("name", "phone", "type", "_id", "_fingerprint"))
+        self.assertEqual(list(self.record.keys()), list(RowRecord._fields))
+
+    def test_mapping_access(self):
+        self.assertEqual(self.record['name'], "Ann")
+        self.assertEqual(self.record['_id'], "ann")
+        self.assertEqual(self.record._id, "ann")
+        self.assertEqual(self.record.get('type'), "colleague")
+        self.assertEqual(self.record.get('email', "none"), "none")
+        self.assertIn('phone', self.record)
+        self.assertNotIn('email', self.record)
+        self.assertRaises(KeyError, lambda: self.record['email'])
+        self.assertEqual(len(self.record), 5)
+        self.assertEqual(list(self.record), list(RowRecord._fields))
+        self.assertEqual(self.record.to_dict(), {"name": "Ann", "phone": "0612345678", "type": "colleague", "_id": "ann", "_fingerprint": "f1"})
+
+    def test_records_are_read_only_and_compact(self):
+        self.assertRaises(AttributeError, setattr, self.record, 'name', "Bob")
+        self.assertRaises(AttributeError, setattr, self.record, 'email', "ann@example.com")
+        self.assertFalse(hasattr(self.record, '__dict__'))
+
+    def test_equality_and_hash(self):
+        same_record = RowRecord("Ann", "0612345678", "colleague", "ann", "f1")
+        other_record = RowRecord("Ann", "0612345678", "intern", "ann", "f2")
+        self.assertEqual(self.record, same_record)
+        self.assertNotEqual(self.record, other_record)
+        self.assertEqual(hash(self.record), hash(same_record))
+
+    def test_records_can_be_pickled(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.record)), self.record)
+
+
+class TestRowExtractor(unittest.TestCase):
+
+    def test_values_in_mapping_order(self):
+        extract_row = create_row_extractor(API_MAPPING)
+        self.assertEqual(extract_row(["Ann", "colleague", "unused", "0612345678", "unused"]), ("Ann", "0612345678", "colleague"))
+
+    def test_single_column_mapping_returns_a_tuple(self):
+        extract_row = create_row_extractor({"name": 2})
+        self.assertEqual(extract_row(["a", "b", "c"]), ("c",))
+
+    def test_short_rows_raise_an_index_error(self):
+        extract_row = create_row_extractor(API_MAPPING)
+        self.assertRaises(IndexError, extract_row, ["Ann", "colleague"])
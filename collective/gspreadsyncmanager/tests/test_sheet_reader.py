@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+import unittest
+
+from collective.gspreadsyncmanager.api_modules.gsheets.sheet_reader import get_column_letter, get_column_ranges, get_a1_range, build_rows
+from collective.gspreadsyncmanager.api_modules.gsheets.sheet_reader import fetch_worksheet_values, iter_row_windows, FETCH_MODE_ALL, FETCH_MODE_COLUMNS
+
+A1_RANGE = re.compile(r"^'(?P<sheet>(?:[^']|'')*)'!(?P<first_column>[A-Z]+)(?P<first_row>\d*):(?P<last_column>[A-Z]+)(?P<last_row>\d*)$")
+
+
+def get_column_index(letters):
+    column_number = 0
+    for letter in letters:
+        column_number = column_number * 26 + ord(letter) - 64
+    return column_number - 1
+
+
+class FakeWorksheet(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.row_count = len(rows)
+
+    def get_all_values(self):
+        return [list(row) for row in self.rows]
+
+
+class FakeSpreadsheet(object):
+    #
+    # Serves values:batchGet like the Sheets API: column-major values
+    # without the trailing empty cells of every column.
+    #
+    def __init__(self, rows, worksheet_name="Sheet1", fail_batch_get=False):
+        self.rows = rows
+        self.worksheet_name = worksheet_name
+        self.fail_batch_get = fail_batch_get
+        self.requested_ranges = []
+        self.lock = threading.Lock()
+        self.active_requests = 0
+        self.max_active_requests = 0
+
+    def worksheet(self, worksheet_name):
+        assert worksheet_name == self.worksheet_name
+        return FakeWorksheet(self.rows)
+
+    def values_batch_get(self, ranges, params=None):
+        if self.fail_batch_get:
+            raise IOError("values:batchGet is not available")
+        assert params == {'majorDimension': 'COLUMNS'}
+
+        with self.lock:
+            self.requested_ranges.extend(ranges)
+            self.active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+        try:
+            return {'valueRanges': [self.get_value_range(a1_range) for a1_range in ranges]}
+        finally:
+            with self.lock:
+                self.active_requests -= 1
+
+    def get_value_range(self, a1_range):
+        match = A1_RANGE.match(a1_range)
+        assert match.group('sheet').replace("''", "'") == self.worksheet_name
+
+        first_row = int(match.group('first_row') or 1)
+        last_row = int(match.group('last_row') or len(self.rows))
+        rows = self.rows[first_row - 1:last_row]
+
+        columns = []
+        for column in range(get_column_index(match.group('first_column')), get_column_index(match.group('last_column')) + 1):
+            values = [row[column] if column < len(row) else "" for row in rows]
+            while values and values[-1] == "":
+                values.pop()
+            columns.append(values)
+
+        while columns and not columns[-1]:
+            columns.pop()
+
+        value_range = {'range': a1_range}
+        if columns:
+            value_range['values'] = columns
+        return value_range
+
+
+class TestA1Ranges(unittest.TestCase):
+
+    def test_column_letters(self):
+        self.assertEqual([get_column_letter(index) for index in (0, 25, 26, 27, 51, 52, 701, 702)], ["A", "Z", "AA", "AB", "AZ", "BA", "ZZ", "AAA"])
+
+    def test_contiguous_column_ranges(self):
+        api_mapping = {"name": 0, "fullname": 20, "phone": 26, "picture": 27, "type": 12, "colleague": 0, "start_date": 1}
+        self.assertEqual(get_column_ranges(api_mapping), [(0, 1), (12, 12), (20, 20), (26, 27)])
+
+    def test_a1_range(self):
+        self.assertEqual(get_a1_range("Persons", 0, 1), "'Persons'!A:B")
+        self.assertEqual(get_a1_range("Persons", 26, 27, 1001, 2000), "'Persons'!AA1001:AB2000")
+        self.assertEqual(get_a1_range("Andre's sheet", 2, 2), "'Andre''s sheet'!C:C")
+
+
+class TestBuildRows(unittest.TestCase):
+
+    def test_rows_have_the_mapped_values_at_their_sheet_positions(self):
+        rows = build_rows([(0, 1), (3, 3)], [{'values': [["a1", "a2"], ["b1", "b2"]]}, {'values': [["d1", "d2"]]}])
+        self.assertEqual(rows, [["a1", "b1", "", "d1"], ["a2", "b2", "", "d2"]])
+
+    def test_short_and_ragged_columns_are_padded(self):
+        rows = build_rows([(0, 2)], [{'values': [["a1", "a2", "a3"], ["b1"], ["", "c2"]]}])
+        self.assertEqual(rows, [["a1", "b1", ""], ["a2", "", "c2"], ["a3", "", ""]])
+
+    def test_ranges_without_values(self):
+        self.assertEqual(build_rows([(0, 0), (2, 3)], [{'values': [["a1"]]}, {}]), [["a1", "", "", ""]])
+        self.assertEqual(build_rows([(0, 1)], [{}]), [])
+        self.assertEqual(build_rows([], []), [])
+
+
+class TestFetchWorksheetValues(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            ["Name", "Date", "Unused", "Type"],
+            ["Ann", "2020-01-01", "x", "colleague"],
+            ["Bob", "", "y"],
+            ["Cid", "2020-03-01", "z", "intern"]
+        ]
+        self.api_mapping = {"name": 0, "start_date": 1, "type": 3}
+
+    def test_only_the_mapped_columns_are_requested(self):
+        spreadsheet = FakeSpreadsheet(self.rows)
+        rows = fetch_worksheet_values(spreadsheet, "Sheet1", self.api_mapping, FETCH_MODE_COLUMNS)
+
+        self.assertEqual(spreadsheet.requested_ranges, ["'Sheet1'!A:B", "'Sheet1'!D:D"])
+        self.assertEqual(rows, [
+            ["Name", "Date", "", "Type"],
+            ["Ann", "2020-01-01", "", "colleague"],
+            ["Bob", "", "", ""],
+            ["Cid", "2020-03-01", "", "intern"]
+        ])
+
+    def test_all_values_fetch_mode(self):
+        spreadsheet = FakeSpreadsheet(self.rows)
+        self.assertEqual(fetch_worksheet_values(spreadsheet, "Sheet1", self.api_mapping, FETCH_MODE_ALL), self.rows)
+        self.assertEqual(spreadsheet.requested_ranges, [])
+
+    def test_falls_back_to_all_values(self):
+        spreadsheet = FakeSpreadsheet(self.rows, fail_batch_get=True)
+        self.assertEqual(fetch_worksheet_values(spreadsheet, "Sheet1", self.api_mapping, FETCH_MODE_COLUMNS), self.rows)
+
+
+class TestIterRowWindows(unittest.TestCase):
+
+    def setUp(self):
+        # Column C is empty after row 3 and column B has gaps
+        self.rows = [["r%s" %(row), "b%s" %(row) if row % 2 else "", "c%s" %(row) if row <= 3 else ""] for row in range(1, 11)]
+        self.api_mapping = {"name": 0, "date": 1, "type": 2}
+
+    def test_windows_are_yielded_in_sheet_order(self):
+        spreadsheet = FakeSpreadsheet(self.rows)
+        windows = list(iter_row_windows(spreadsheet, "Sheet1", self.api_mapping, window_size=4, parallel_windows=2))
+
+        self.assertEqual([len(rows) for rows in windows], [4, 4, 2])
+        self.assertEqual([row for rows in windows for row in rows], self.rows)
+        self.assertEqual(spreadsheet.requested_ranges, ["'Sheet1'!A1:C4", "'Sheet1'!A5:C8", "'Sheet1'!A9:C10"])
+
+    def test_short_columns_in_a_window(self):
+        spreadsheet = FakeSpreadsheet(self.rows)
+        windows = list(iter_row_windows(spreadsheet, "Sheet1", self.api_mapping, window_size=3, parallel_windows=1))
+
+        self.assertEqual(windows[1], [["r4", "", ""], ["r5", "b5", ""], ["r6", "", ""]])
+        self.assertEqual(windows[-1], [["r10", "", ""]])
+
+    def test_window_of_empty_rows_is_shorter(self):
+        # Trailing empty rows of a window are not returned by the API
+        rows = self.rows[:4] + [["", "", ""]] * 4
+        spreadsheet = FakeSpreadsheet(rows)
+        windows = list(iter_row_windows(spreadsheet, "Sheet1", self.api_mapping, window_size=3, parallel_windows=2))
+
+        self.assertEqual(windows, [self.rows[:3], [self.rows[3]], []])
+
+    def test_parallel_windows_are_bounded(self):
+        spreadsheet = FakeSpreadsheet(self.rows)
+        windows = iter_row_windows(spreadsheet, "Sheet1", self.api_mapping, window_size=1, parallel_windows=3)
+
+        self.assertEqual(len(list(windows)), 10)
+        self.assertLessEqual(spreadsheet.max_active_requests, 3)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import date, datetime
+
+from collective.gspreadsyncmanager.sync_plan import SyncPlan, SyncOperation, OPERATION_CREATE, OPERATION_UPDATE, OPERATION_UNPUBLISH, OPERATION_SKIP, format_value, get_creation_diffs
+
+
+class FakeBrain(object):
+
+    def __init__(self, url):
+        self.url = url
+
+    def getURL(self):
+        return self.url
+
+
+class FakeRichText(object):
+
+    def __init__(self, raw):
+        self.raw = raw
+
+
+class FakeImage(object):
+
+    def getSize(self):
+        return 1024
+
+
+class FormatValueTest(unittest.TestCase):
+
+    def test_simple_values_are_kept(self):
+        for value in (None, True, 3, 1.5, "name"):
+            self.assertEqual(format_value(value), value)
+
+    def test_sequences_become_lists(self):
+        self.assertEqual(format_value(("a", date(2020, 1, 2))), ["a", "2020-01-02"])
+
+    def test_dates_use_iso_format(self):
+        self.assertEqual(format_value(datetime(2020, 1, 2, 3, 4)), "2020-01-02T03:04:00")
+
+    def test_rich_text_uses_raw_value(self):
+        self.assertEqual(format_value(FakeRichText("<p>text</p>")), "<p>text</p>")
+
+    def test_blobs_show_their_size(self):
+        self.assertEqual(format_value(FakeImage()), "<FakeImage, 1024 bytes>")
+
+
+class CreationDiffsTest(unittest.TestCase):
+
+    def test_only_mapped_fields_in_data(self):
+        field_plan = [('name', 'title', None), ('email', 'email', None), ('phone', 'phone', None)]
+        data = {'name': "Person", 'email': "person@example.com", 'unmapped': "value"}
+
+        self.assertEqual(get_creation_diffs(field_plan, data), {
+            'title': (None, "Person"),
+            'email': (None, "person@example.com")
+        })
+
+
+class SyncOperationTest(unittest.TestCase):
+
+    def test_to_dict(self):
+        operation = SyncOperation(OPERATION_UPDATE, "1", brain=FakeBrain("http://site/person"), diffs={'title': ("Old", "New")})
+
+        self.assertEqual(operation.to_dict(), {
+            'operation': OPERATION_UPDATE,
+            'item_id': "1",
+            'url': "http://site/person",
+            'diffs': {'title': {'current': "Old", 'new': "New"}},
+            'reason': None,
+            'error': None
+        })
+
+    def test_to_dict_without_brain(self):
+        operation = SyncOperation(OPERATION_CREATE, "1")
+
+        self.assertIsNone(operation.to_dict()['url'])
+        self.assertEqual(operation.to_dict()['diffs'], {})
+
+
+class SyncPlanTest(unittest.TestCase):
+
+    def create_plan(self):
+        plan = SyncPlan("persons")
+        plan.add(SyncOperation(OPERATION_CREATE, "1"))
+        plan.add(SyncOperation(OPERATION_UPDATE, "2"))
+        plan.add(SyncOperation(OPERATION_UPDATE, "3"))
+        plan.add(SyncOperation(OPERATION_SKIP, "4", reason="Nothing changed."))
+        plan.add(SyncOperation(OPERATION_SKIP, "5", error="Invalid row."))
+        return plan
+
+    def test_counts_and_errors(self):
+        plan = self.create_plan()
+
+        self.assertEqual(len(plan), 5)
+        self.assertEqual(plan.counts, {OPERATION_CREATE: 1, OPERATION_UPDATE: 2, OPERATION_UNPUBLISH: 0, OPERATION_SKIP: 2})
+        self.assertEqual(plan.errors, 1)
+
+    def test_extend(self):
+        plan = self.create_plan()
+        unpublish_plan = SyncPlan("persons")
+        unpublish_plan.add(SyncOperation(OPERATION_UNPUBLISH, "6"))
+
+        self.assertIs(plan.extend(unpublish_plan), plan)
+        self.assertEqual(len(plan), 6)
+        self.assertEqual(plan.counts[OPERATION_UNPUBLISH], 1)
+
+    def test_get_operations(self):
+        plan = self.create_plan()
+
+        self.assertEqual([planned.item_id for planned in plan.get_operations(OPERATION_UPDATE)], ["2", "3"])
+        self.assertEqual(len(plan.get_operations()), 5)
+
+    def test_to_dict_leaves_out_skipped(self):
+        result = self.create_plan().to_dict()
+
+        self.assertEqual(result['sync_type'], "persons")
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['counts'][OPERATION_SKIP], 2)
+        self.assertEqual([planned['item_id'] for planned in result['operations']], ["1", "2", "3"])
+        self.assertFalse(result['truncated'])
+
+    def test_to_dict_include_skipped(self):
+        result = self.create_plan().to_dict(include_skipped=True)
+
+        self.assertEqual([planned['item_id'] for planned in result['operations']], ["1", "2", "3", "4", "5"])
+
+    def test_to_dict_truncates_operations(self):
+        result = self.create_plan().to_dict(limit=2)
+
+        self.assertEqual([planned['item_id'] for planned in result['operations']], ["1", "2"])
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['counts'][OPERATION_UPDATE], 2)
+
+    def test_to_dict_without_limit(self):
+        result = self.create_plan().to_dict(include_skipped=True, limit=None)
+
+        self.assertEqual(len(result['operations']), 5)
+        self.assertFalse(result['truncated'])
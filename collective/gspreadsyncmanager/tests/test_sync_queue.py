@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from collective.gspreadsyncmanager.sync_queue import SyncQueue, SyncJob, PRIORITY_SINGLE, PRIORITY_FULL, STATUS_FAILED, STATUS_QUEUED
+
+SITE_PATH = ('', 'Plone')
+
+JOB_SINGLE = "single"
+JOB_FULL = "full"
+
+
+def run_nothing(site, job):
+    pass
+
+
+class RecordingSyncQueue(SyncQueue):
+    #
+    # Runs the runners without a ZODB connection
+    #
+    def run_job(self, job):
+        self.runners[job.job_type](None, job)
+
+    def wait_for_jobs(self, count, timeout=5):
+        deadline = time.time() + timeout
+        with self.condition:
+            while len(self.finished) < count and time.time() < deadline:
+                self.condition.wait(0.05)
+            return len(self.finished) >= count
+
+
+class TestSyncJob(unittest.TestCase):
+
+    def test_single_item_jobs_go_first(self):
+        self.assertEqual(SyncJob(JOB_SINGLE, SITE_PATH, item_id="ann").priority, PRIORITY_SINGLE)
+        self.assertEqual(SyncJob(JOB_FULL, SITE_PATH).priority, PRIORITY_FULL)
+        self.assertEqual(SyncJob(JOB_FULL, SITE_PATH, priority=3).priority, 3)
+
+    def test_headers_are_not_listed(self):
+        job = SyncJob(JOB_FULL, SITE_PATH, user_id="editor", username="editor", headers={'Cookie': "__ac=secret"})
+        self.assertEqual(job.headers, {'Cookie': "__ac=secret"})
+        self.assertNotIn('headers', job.to_dict())
+        self.assertNotIn("secret", repr(job.to_dict()))
+
+
+class TestSyncQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = SyncQueue(runners={JOB_SINGLE: run_nothing, JOB_FULL: run_nothing}, concurrency={JOB_SINGLE: 2, JOB_FULL: 1})
+        # Jobs are only taken by the tests
+        self.queue.start_workers = lambda: None
+
+    def add(self, job_type, item_id=None, **kwargs):
+        return self.queue.add(SyncJob(job_type, SITE_PATH, item_id=item_id, user_id="editor", username="editor@example.com", **kwargs))
+
+    def take(self):
+        with self.queue.condition:
+            job = self.queue.get_next_job()
+            if job is not None:
+                self.queue.running[job.job_id] = job
+            return job
+
+    def test_unknown_job_types_are_rejected(self):
+        self.assertRaises(ValueError, self.add, "unknown")
+
+    def test_identical_waiting_jobs_are_queued_once(self):
+        first_job = self.add(JOB_SINGLE, "ann")
+        self.assertIs(self.add(JOB_SINGLE, "ann"), first_job)
+        self.assertIsNot(self.add(JOB_SINGLE, "bob"), first_job)
+        self.assertIsNot(self.add(JOB_FULL), first_job)
+        self.assertEqual(len(self.queue), 3)
+
+    def test_lower_priorities_run_first_in_queue_order(self):
+        full_job = self.add(JOB_FULL)
+        ann_job = self.add(JOB_SINGLE, "ann")
+        bob_job = self.add(JOB_SINGLE, "bob")
+
+        self.assertEqual([self.take(), self.take(), self.take()], [ann_job, bob_job, full_job])
+
+    def test_concurrency_per_job_type(self):
+        jobs = [self.add(JOB_SINGLE, item_id) for item_id in ("a", "b", "c")]
+        self.assertEqual([self.take(), self.take()], jobs[:2])
+        self.assertIsNone(self.take())
+
+        with self.queue.condition:
+            del self.queue.running[jobs[0].job_id]
+        self.assertEqual(self.take(), jobs[2])
+
+    def test_identical_jobs_never_run_at_the_same_time(self):
+        running_job = self.add(JOB_SINGLE, "ann")
+        self.assertEqual(self.take(), running_job)
+
+        # Queued again while the first one runs
+        waiting_job = self.add(JOB_SINGLE, "ann")
+        self.assertIsNot(waiting_job, running_job)
+        self.assertIsNone(self.take())
+
+        with self.queue.condition:
+            del self.queue.running[running_job.job_id]
+        self.assertEqual(self.take(), waiting_job)
+
+    def test_jobs_are_listed(self):
+        full_job = self.add(JOB_FULL)
+        single_job = self.add(JOB_SINGLE, "ann")
+        self.take()
+
+        jobs = self.queue.get_jobs()
+        self.assertEqual([job['job_id'] for job in jobs['running']], [single_job.job_id])
+        self.assertEqual([job['job_id'] for job in jobs['pending']], [full_job.job_id])
+        self.assertEqual(jobs['pending'][0]['status'], STATUS_QUEUED)
+        self.assertEqual(jobs['finished'], [])
+
+    def test_jobs_without_a_user_fail(self):
+        job = SyncJob(JOB_FULL, SITE_PATH)
+        self.assertRaises(ValueError, self.queue.run_job, job)
+
+    def test_jobs_without_a_login_name_fail(self):
+        # Users are adopted by their login name, which can differ from the user ID
+        job = SyncJob(JOB_FULL, SITE_PATH, user_id="editor")
+        self.assertRaises(ValueError, self.queue.run_job, job)
+
+    def test_job_types_without_a_limit_run_one_at_a_time(self):
+        queue = SyncQueue(runners={JOB_SINGLE: run_nothing})
+        queue.start_workers = lambda: None
+        queue.add(SyncJob(JOB_SINGLE, SITE_PATH, item_id="ann", username="editor"))
+        queue.add(SyncJob(JOB_SINGLE, SITE_PATH, item_id="bob", username="editor"))
+
+        with queue.condition:
+            job = queue.get_next_job()
+            queue.running[job.job_id] = job
+            self.assertIsNone(queue.get_next_job())
+
+
+class TestWorkers(unittest.TestCase):
+
+    def test_workers_run_every_job(self):
+        ran_jobs = []
+        lock = threading.Lock()
+
+        def run(site, job):
+            with lock:
+                ran_jobs.append(job.item_id)
+
+        def fail(site, job):
+            raise RuntimeError("Sheet not found")
+
+        queue = RecordingSyncQueue(runners={JOB_SINGLE: run, JOB_FULL: fail}, workers=2)
+        for item_id in ("a", "b", "c"):
+            queue.add(SyncJob(JOB_SINGLE, SITE_PATH, item_id=item_id, user_id="editor", username="editor"))
+        failing_job = queue.add(SyncJob(JOB_FULL, SITE_PATH, user_id="editor", username="editor"))
+
+        self.assertTrue(queue.wait_for_jobs(4))
+        self.assertEqual(sorted(ran_jobs), ["a", "b", "c"])
+        self.assertEqual(failing_job.status, STATUS_FAILED)
+        self.assertEqual(failing_job.error, "Sheet not found")
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# GoogleSheets API sync mechanism by Andre Goncalves
+#
+# Upgrade steps of the default profile
+#
+PROFILE_ID = "profile-collective.gspreadsyncmanager:default"
+
+
+def reimport_registry(context):
+    # Adds the records of new control panel fields.
+    # Existing records keep their values.
+    context.runImportStepFromProfile(PROFILE_ID, 'plone.app.registry')
@@ -5,6 +5,9 @@ from plone.registry.interfaces import IRegistry
 from zope.component import getUtility
 from collective.gspreadsyncmanager.controlpanel.controlpanel import IGSheetsControlPanel
 from datetime import datetime, timedelta
+import hashlib
+import json
+from functools import lru_cache
 
 import plone.api
 import transaction
@@ -40,9 +43,29 @@ def reverse_onsale_value(organization_ids):
     transaction.get().commit()
     return True
 
+# Optional API settings and their control panel fields
+OPTIONAL_API_SETTINGS = (
+    ('cache_ttl', 'api_cache_ttl'),
+    ('shared_cache', 'api_shared_cache'),
+    ('fetch_mode', 'api_fetch_mode'),
+    ('streaming', 'api_streaming'),
+    ('window_size', 'api_window_size'),
+    ('parallel_windows', 'api_parallel_windows')
+)
+
+def get_optional_api_settings(settings):
+    # Settings without a value or without a registry record yet are left out,
+    # so the API connections use their defaults
+    api_settings = {}
+    for setting_name, fieldname in OPTIONAL_API_SETTINGS:
+        value = getattr(settings, fieldname, None)
+        if value is not None:
+            api_settings[setting_name] = value
+    return api_settings
+
 def get_api_settings():
     registry = getUtility(IRegistry)
-    settings = registry.forInterface(IGSheetsControlPanel)
+    settings = registry.forInterface(IGSheetsControlPanel, check=False)
         
     api_settings = {
         'scope': getattr(settings, 'api_scope', None),
@@ -52,12 +75,13 @@ def get_api_settings():
     }   
 
     api_settings['scope'] = api_settings['scope'].split(',')
+    api_settings.update(get_optional_api_settings(settings))
 
     return api_settings
 
 def get_api_settings_persons():
     registry = getUtility(IRegistry)
-    settings = registry.forInterface(IGSheetsControlPanel)
+    settings = registry.forInterface(IGSheetsControlPanel, check=False)
         
     api_settings = {
         'scope': getattr(settings, 'api_scope', None),
@@ -67,6 +91,7 @@ def get_api_settings_persons():
     }   
 
     api_settings['scope'] = api_settings['scope'].split(',')
+    api_settings.update(get_optional_api_settings(settings))
 
     return api_settings
 
@@ -116,15 +141,34 @@ def phonenumber_to_id(phone_number, name=""):
     unique_id = "%s%s" %(name, phone_number)
     return clean_whitespaces(unique_id)
 
+# Normalized IDs are memoized, as full syncs normalize the same names every run
+NORMALIZER_CACHE_SIZE = 131072
+
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
 def generate_person_id(fullname):
     normalizer = getUtility(IIDNormalizer)
     _id = "%s" % normalizer.normalize(fullname)
     return _id
 
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
 def generate_safe_id(fullname):
     normalizer = getUtility(IIDNormalizer)
     _id = "%s" % normalizer.normalize(fullname)
     return _id
-    
-
 
+def iter_chunks(items, chunk_size):
+    # Lists of at most 'chunk_size' items, also for generators
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def generate_row_fingerprint(record, mapping=None):
+    # Content hash of the values of a transformed spreadsheet row.
+    # The mapping is part of the hash, so a new mapping syncs every row again.
+    payload = json.dumps([mapping, record], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
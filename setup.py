@@ -26,6 +26,12 @@ setup(name='collective.gspreadsyncmanager',
           'setuptools',
           # -*- Extra requirements: -*-
       ],
+      extras_require={
+          'test': [
+              'plone.app.testing',
+              'plone.app.contenttypes',
+          ],
+      },
       entry_points="""
       # -*- Entry points: -*-
 